@@ -1,49 +1,140 @@
 import hashlib
 import hmac
 import json
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qsl
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from fastapi import Depends, Header, HTTPException, Query
+
 from config.settings import settings
 
+
+class InitDataVerifier:
+    """
+    Verifies Telegram WebApp initData. The HMAC secret is derived from the bot
+    token once; verified strings are cached (bounded, TTL) by their hash, so
+    repeated calls from the same WebApp session skip parsing and crypto.
+    """
+
+    def __init__(self, bot_token: str, max_age: int, cache_size: int, cache_ttl: int):
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._secret_key = hmac.new(
+            key=b"WebAppData",
+            msg=bot_token.encode(),
+            digestmod=hashlib.sha256
+        ).digest() if bot_token else None
+        self._cache: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def verify(self, init_data: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the user data if `init_data` is authentic and fresh, None otherwise.
+        """
+        if not init_data or self._secret_key is None:
+            return None
+
+        key = hashlib.sha256(init_data.encode()).digest()
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._cache.move_to_end(key)
+                return entry[1]
+            del self._cache[key]
+
+        verified = self._verify(init_data, now)
+        if verified is None:
+            return None
+        user, auth_date = verified
+
+        expires_at = now + self.cache_ttl
+        if self.max_age:
+            expires_at = min(expires_at, auth_date + self.max_age)
+        self._cache[key] = (expires_at, user)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return user
+
+    def _verify(self, init_data: str, now: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        try:
+            parsed_data = dict(parse_qsl(init_data))
+        except ValueError:
+            return None
+
+        received_hash = parsed_data.pop("hash", None)
+        if not received_hash:
+            return None
+
+        # Data-check-string is a chain of all received fields, sorted alphabetically
+        data_check_string = "\n".join(
+            f"{k}={v}" for k, v in sorted(parsed_data.items())
+        )
+        calculated_hash = hmac.new(
+            key=self._secret_key,
+            msg=data_check_string.encode(),
+            digestmod=hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(calculated_hash, received_hash):
+            return None
+
+        try:
+            auth_date = float(parsed_data.get("auth_date", 0))
+        except ValueError:
+            return None
+        if self.max_age and now - auth_date > self.max_age:
+            return None
+
+        if "user" in parsed_data:
+            try:
+                return json.loads(parsed_data["user"]), auth_date
+            except ValueError:
+                return None
+        return parsed_data, auth_date
+
+
+init_data_verifier = InitDataVerifier(
+    settings.BOT_TOKEN,
+    max_age=settings.INIT_DATA_MAX_AGE,
+    cache_size=settings.INIT_DATA_CACHE_SIZE,
+    cache_ttl=settings.INIT_DATA_CACHE_TTL,
+)
+
+
 def validate_init_data(init_data: str) -> Optional[Dict[str, Any]]:
     """
     Validates the initData string from Telegram WebApp.
     Returns the user data if valid, None otherwise.
     """
-    if not settings.BOT_TOKEN:
-        return None
-
-    try:
-        parsed_data = dict(parse_qsl(init_data))
-    except ValueError:
-        return None
-
-    if "hash" not in parsed_data:
-        return None
-
-    received_hash = parsed_data.pop("hash")
-    
-    # Data-check-string is a chain of all received fields, sorted alphabetically
-    data_check_string = "\n".join(
-        f"{k}={v}" for k, v in sorted(parsed_data.items())
-    )
-
-    secret_key = hmac.new(
-        key=b"WebAppData", 
-        msg=settings.BOT_TOKEN.encode(), 
-        digestmod=hashlib.sha256
-    ).digest()
-
-    calculated_hash = hmac.new(
-        key=secret_key, 
-        msg=data_check_string.encode(), 
-        digestmod=hashlib.sha256
-    ).hexdigest()
-
-    if calculated_hash == received_hash:
-        # Valid! Return user info
-        if "user" in parsed_data:
-            return json.loads(parsed_data["user"])
-        return parsed_data
-    
-    return None
+    return init_data_verifier.verify(init_data)
+
+
+async def current_user(
+    authorization: Optional[str] = Header(None),
+    auth: Optional[str] = Query(None, include_in_schema=False),
+) -> Optional[Dict[str, Any]]:
+    """
+    FastAPI dependency: the WebApp user from 'Authorization: Bearer <initData>'
+    (or the `auth` query parameter, for EventSource which cannot set headers).
+    Raises 401 when WEBAPP_AUTH_REQUIRED; otherwise unauthenticated calls get None.
+    Resolved once per request, so routers and endpoints can both depend on it.
+    """
+    token = auth or ""
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+
+    user = validate_init_data(token)
+    if user is None and settings.WEBAPP_AUTH_REQUIRED:
+        raise HTTPException(status_code=401, detail="Missing or invalid initData")
+    return user
+
+
+async def require_user(user: Optional[Dict[str, Any]] = Depends(current_user)) -> Dict[str, Any]:
+    """
+    Like current_user, but always requires a valid user with an id.
+    """
+    if not user or "id" not in user:
+        raise HTTPException(status_code=401, detail="Missing or invalid initData")
+    return user
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Awaitable, TypeVar
+
+from aiogram import Bot
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Non-standard "Client Closed Request" status (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+
+
+def get_bot(request: Request) -> Bot:
+    """
+    Returns the process-wide Bot created in the app lifespan.
+    """
+    return request.app.state.bot
+
+
+async def run_until_disconnect(request: Request, coro: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Awaits `coro` while watching the HTTP client. If the client goes away, the
+    upstream coroutine is cancelled (CancelledError propagates through the service
+    layer, releasing limiter slots and abandoning thread-backed polling loops)
+    and HTTP 499 is raised so callers can roll back reserved resources.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected from %s; cancelling upstream call", request.url.path)
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
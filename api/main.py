@@ -1,14 +1,104 @@
-from fastapi import FastAPI
+import logging
+import math
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from config.settings import settings
-from api.routers import chat, enhance, generate, config
+from config.logging_setup import bind_correlation_id, correlation_id, setup_logging, stop_logging
+from api.routers import chat, enhance, generate, config, media, telegram, gallery
+from api.auth import current_user, validate_init_data
+from bot.client import create_bot
+from services.outbound import outbound
+from services.limits import Overloaded
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    if settings.BOT_MODE == "webhook" and not settings.WEBHOOK_SECRET:
+        # The webhook endpoint rejects every update without it; Telegram would retry, then drop them
+        raise RuntimeError("BOT_MODE=webhook requires WEBHOOK_SECRET to be set")
+    # One pooled Bot session per worker process
+    app.state.bot = create_bot()
+    app.state.dispatcher = None
+    app.state.worker_tasks = []
+
+    if settings.BOT_MODE == "webhook":
+        from bot.dispatcher import create_dispatcher
+        from database.db import init_db
+        await init_db()
+        app.state.dispatcher = create_dispatcher()
+        # Idempotent, so every replica may register the same URL on startup
+        await app.state.bot.set_webhook(
+            url=settings.webhook_url,
+            secret_token=settings.WEBHOOK_SECRET,
+            allowed_updates=app.state.dispatcher.resolve_used_update_types()
+        )
+        logger.info("Webhook registered at %s", settings.webhook_url)
+
+        from bot.update_queue import MemoryUpdateQueue, get_update_queue
+        queue = get_update_queue()
+        if isinstance(queue, MemoryUpdateQueue):
+            # Local stand-in: consume the in-process queue right here
+            from bot.worker import start_workers
+            app.state.worker_tasks = start_workers(app.state.bot, app.state.dispatcher, queue, list(range(queue.shards)))
+
+    # Runs while the server already accepts requests
+    from services.container import container
+    container.start_warm_up()
+
+    try:
+        yield
+    finally:
+        await telegram.drain_updates(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        if app.state.worker_tasks:
+            from bot.worker import stop_workers
+            await stop_workers(app.state.worker_tasks)
+        # Let queued notifications go out before the session is closed
+        await outbound.stop(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await app.state.bot.session.close()
+        logger.info("Bot session closed")
+        from services.history import drain_history
+        await drain_history(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        from services.rate_limit import rate_limiter
+        await rate_limiter.close()
+        if app.state.dispatcher is not None:
+            from services.semantic_cache import faq_cache
+            await faq_cache.save()
+        stop_logging()
 
 app = FastAPI(
     title="Project_RM API",
     description="Backend API for Project_RM WebApp (Gemini 3)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    # Starlette runs middleware registered later as the outer layer. CORSMiddleware
+    # is added below, so it wraps this one and adds CORS headers to the 429s
+    # returned here. Otherwise the browser would hide the 429 as a CORS error.
+    if settings.RATE_LIMIT_ENABLED and request.method != "OPTIONS":
+        from services.rate_limit import client_key, rate_limiter
+        rule = rate_limiter.match(request.method, request.url.path)
+        if rule is not None:
+            authorization = request.headers.get("Authorization") or ""
+            token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else request.query_params.get("auth", "")
+            # Cached verification: the auth dependency reuses the result
+            user = validate_init_data(token)
+            wait = await rate_limiter.hit(rule, client_key(user, request.client.host if request.client else None))
+            if wait > 0:
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests"},
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))}
+                )
+    return await call_next(request)
+
 # CORS Configuration
 origins = [
     "http://localhost:5173",  # Vite default
@@ -24,11 +114,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include Routers
-app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
-app.include_router(enhance.router, prefix="/api/enhance-prompt", tags=["enhance"])
-app.include_router(generate.router, prefix="/api/generate", tags=["generate"])
-app.include_router(config.router, prefix="/api/config", tags=["config"])
+@app.middleware("http")
+async def correlation_middleware(request: Request, call_next):
+    # Background tasks started by the request inherit the id
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = bind_correlation_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        correlation_id.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Fast rejection instead of queueing behind an exhausted quota
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Include Routers. WebApp routers require initData; media links are signed
+# and the webhook checks its secret token instead.
+webapp_auth = [Depends(current_user)]
+app.include_router(chat.router, prefix="/api/chat", tags=["chat"], dependencies=webapp_auth)
+app.include_router(enhance.router, prefix="/api/enhance-prompt", tags=["enhance"], dependencies=webapp_auth)
+app.include_router(generate.router, prefix="/api/generate", tags=["generate"], dependencies=webapp_auth)
+app.include_router(config.router, prefix="/api/config", tags=["config"], dependencies=webapp_auth)
+app.include_router(media.router, prefix="/api/media", tags=["media"])
+app.include_router(gallery.router, prefix="/api/gallery", tags=["gallery"], dependencies=webapp_auth)
+app.include_router(telegram.router, prefix="/telegram", tags=["telegram"])
 
 @app.get("/health")
 async def health_check():
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 
@@ -15,6 +16,15 @@ class EnhanceRequest(BaseModel):
 class EnhanceResponse(BaseModel):
     enhanced_prompt: str
 
+class CompilePromptRequest(BaseModel):
+    fields: Dict[str, Any]
+    enhance: bool = False  # additionally rewrite the compiled prompt with the LLM
+
+class CompilePromptResponse(BaseModel):
+    prompt: str
+    negative_prompt: str = ""
+    untranslated: List[str] = []
+
 class GenerateImageRequest(BaseModel):
     prompt: str
     params: Dict[str, Any] = {}
@@ -32,3 +42,28 @@ class StatusResponse(BaseModel):
     status: str
     message: Optional[str] = None
     video_uri: Optional[str] = None
+    job_id: Optional[str] = None
+
+class JobResponse(BaseModel):
+    id: str
+    type: str
+    stage: str
+    message: Optional[str] = None
+    result: Dict[str, Any] = {}
+    error: Optional[str] = None
+    version: int
+    created_at: float
+    updated_at: float
+
+class GalleryItem(BaseModel):
+    id: int
+    type: str
+    prompt: str
+    model: Optional[str] = None
+    created_at: datetime
+    url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+
+class GalleryPage(BaseModel):
+    items: List[GalleryItem]
+    next_cursor: Optional[str] = None
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
-from sqlalchemy import select
+import asyncio
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request
+from sqlalchemy import select, update
 from api.models import ChatRequest, ChatResponse
-from services.gemini import gemini_service
-from api.auth import validate_init_data
+from services.container import container
+from services.limits import model_limiter
+from services.routing import route
+from services.sessions import chat_sessions
+from api.auth import current_user
+from api.deps import run_until_disconnect
 from database.db import get_db
 from database.models import User, Transaction
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,30 +18,28 @@ router = APIRouter()
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest, 
-    authorization: str = Header(None),
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    user_data: Optional[Dict[str, Any]] = Depends(current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Process a chat message using Gemini.
-    Requires 'Authorization: Bearer <initData>' header.
+    Requires 'Authorization: Bearer <initData>' header (unless WEBAPP_AUTH_REQUIRED is off).
+    Authenticated users get a server-side session; `history` only seeds a new one.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        # For development/testing without Telegram (optional bypass)
-        # raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-        pass # Allow bypass for now if you want to test locally without initData
-
-    token = authorization.split(" ")[1] if authorization else ""
-    user_data = validate_init_data(token)
-    
-    # If validation fails and we are not in dev mode (you can add a flag), reject
-    # For this MVP, if validation fails, we might fallback or error.
-    # Let's assume strict mode for SaaS.
-    
     user_id = None
     if user_data:
         user_id = user_data.get("id")
     
+    if not request.message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+
+    # Reject before charging if the model queue is already too long
+    model_limiter(route("chat").model).check()
+
     # If we have a user_id (from auth), check balance
+    charged = False
     if user_id:
         result = await db.execute(select(User).where(User.id == user_id))
         user = result.scalar_one_or_none()
@@ -48,18 +52,39 @@ async def chat(
         if user.balance <= 0:
             raise HTTPException(status_code=402, detail="Insufficient funds")
             
-        # Deduct balance
+        # Reserve the credit; it is refunded if generation fails or the client leaves
         user.balance -= 1
         transaction = Transaction(user_id=user_id, amount=-1, description="WebApp Text Generation")
         db.add(transaction)
         await db.commit()
+        charged = True
 
-    if not request.message:
-        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    prefix, history = [], []
+    if user_id:
+        prefix, history = await chat_sessions.context(user_id, seed=request.history)
 
-    response_text = await gemini_service.generate_text(request.message)
-    
-    if not response_text:
-        raise HTTPException(status_code=500, detail="Failed to generate response from Gemini")
-        
+    try:
+        response_text = await run_until_disconnect(
+            http_request,
+            (await container.aget("gemini")).generate_text(
+                request.message, history=history, prefix=prefix, cache_slot=f"chat:{user_id}" if user_id else None
+            ),
+        )
+        if not response_text:
+            raise HTTPException(status_code=500, detail="Failed to generate response from Gemini")
+    except BaseException:
+        if charged:
+            # Shielded so a cancelled request still gets its refund committed
+            await asyncio.shield(refund_credit(db, user_id, "Refund: WebApp Text Generation"))
+        raise
+
+    if user_id:
+        # Summarizing old turns must not delay the response
+        background_tasks.add_task(chat_sessions.record, user_id, request.message, response_text)
     return ChatResponse(response=response_text)
+
+
+async def refund_credit(db: AsyncSession, user_id: int, description: str):
+    await db.execute(update(User).where(User.id == user_id).values(balance=User.balance + 1))
+    db.add(Transaction(user_id=user_id, amount=1, description=description))
+    await db.commit()
@@ -1,26 +1,52 @@
-from fastapi import APIRouter, HTTPException
-from api.models import EnhanceRequest, EnhanceResponse
-from services.gemini import gemini_service
+from fastapi import APIRouter, HTTPException, Request
+from api.models import EnhanceRequest, EnhanceResponse, CompilePromptRequest, CompilePromptResponse
+from services.container import container
+from services.limits import Overloaded, model_limiter
+from services.routing import route
+from services.prompt_compiler import prompt_compiler
+from api.deps import run_until_disconnect
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=EnhanceResponse)
-async def enhance_prompt(request: EnhanceRequest):
+async def enhance_prompt(request: EnhanceRequest, http_request: Request):
+    # Lightweight route: fast model, short instruction, small output budget
+    model_limiter(route("enhance").model).check()
     try:
-        enhancement_instruction = f"""
-        Act as a professional {request.type} prompt engineer. 
-        Enhance the following user prompt to be more cinematic, detailed, and artistic.
-        Keep it concise but descriptive.
-        User Prompt: "{request.prompt}"
-        """
-        
-        enhanced_prompt = await gemini_service.generate_text(enhancement_instruction)
+        enhanced_prompt = await run_until_disconnect(
+            http_request,
+            (await container.aget("gemini")).generate_text(f"Type: {request.type}\nUser prompt: {request.prompt}", task="enhance")
+        )
         if not enhanced_prompt:
              raise HTTPException(status_code=500, detail="Failed to enhance prompt")
              
         return EnhanceResponse(enhanced_prompt=enhanced_prompt)
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
-        logger.error(f"Error in enhance_prompt: {e}")
+        logger.error("Error in enhance_prompt: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/compile", response_model=CompilePromptResponse)
+async def compile_prompt(request: CompilePromptRequest, http_request: Request):
+    """
+    Builds a prompt from UI_CONFIG selections locally; the LLM rewrite is opt-in.
+    """
+    compiled = prompt_compiler.compile(request.fields)
+    prompt = compiled.prompt
+    if request.enhance:
+        model_limiter(route("enhance").model).check()
+        enhanced = await run_until_disconnect(
+            http_request,
+            (await container.aget("gemini")).generate_text(f"Type: image\nUser prompt: {prompt}", task="enhance")
+        )
+        if enhanced:
+            prompt = enhanced.strip()
+    return CompilePromptResponse(
+        prompt=prompt,
+        negative_prompt=compiled.negative_prompt,
+        untranslated=compiled.untranslated,
+    )
@@ -0,0 +1,77 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.auth import require_user
+from api.models import GalleryItem, GalleryPage
+from database.db import get_db
+from database.models import Generation
+from services.storage import blob_store
+
+router = APIRouter()
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/", response_model=GalleryPage)
+async def gallery(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(30, ge=1, le=100),
+    user_data: Dict[str, Any] = Depends(require_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    The user's generations, newest first. Keyset pagination on (created_at, id)
+    keeps every page an index range scan, however deep the history is.
+    """
+    query = (
+        select(
+            Generation.id,
+            Generation.type,
+            Generation.prompt,
+            Generation.model,
+            Generation.artifact_id,
+            Generation.thumbnail_id,
+            Generation.created_at,
+        )
+        .where(Generation.user_id == user_data["id"])
+        .order_by(Generation.created_at.desc(), Generation.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(Generation.created_at, Generation.id) < tuple_(created_at, row_id))
+
+    rows = (await db.execute(query)).all()
+    page, more = rows[:limit], len(rows) > limit
+
+    items = [
+        GalleryItem(
+            id=row.id,
+            type=row.type,
+            prompt=(row.prompt or "")[:120],
+            model=row.model,
+            created_at=row.created_at,
+            url=blob_store.signed_url(row.artifact_id) if row.artifact_id else None,
+            thumbnail_url=blob_store.signed_url(row.thumbnail_id) if row.thumbnail_id else None,
+        )
+        for row in page
+    ]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if more else None
+    return GalleryPage(items=items, next_cursor=next_cursor)
@@ -1,8 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from api.models import GenerateImageRequest, GenerateVideoRequest, GenerateRequest, StatusResponse
-from services.gemini import gemini_service
-from services.veo import veo_service
+import html
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from api.models import GenerateImageRequest, GenerateVideoRequest, GenerateRequest, StatusResponse, JobResponse
+from services.image_router import ImageRequest, image_router
+from services.container import container
+from services.storage import blob_store
+from services.outbound import outbound
+from services.media import prepare_images, variant_count
+from services.fair_queue import generation_scheduler, user_weight
+from services.limits import Overloaded, model_limiter
+from services.jobs import get_job_registry
+from services.history import record_generations_later
+from services.job_specs import JobSpec, job_specs
 from config.settings import settings
+from bot.handlers.delivery import deliver_images
+from api.deps import get_bot, run_until_disconnect
+from api.auth import current_user
 from aiogram import Bot
 from aiogram.types import BufferedInputFile
 import logging
@@ -10,90 +26,166 @@ import logging
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize Bot for sending notifications
-# Note: In a production environment with high load, you might want to use a shared connection or a different architecture.
-bot = Bot(token=settings.BOT_TOKEN)
-
-async def process_generation_task(user_id: int, action_type: str, prompt: str, params: dict):
+async def process_generation_task(bot: Bot, user_id: int, action_type: str, prompt: str, params: dict, job_id: Optional[str] = None):
     """
     Background task to handle heavy generation and notify user via Telegram.
+    Stage transitions are recorded in the job registry for the WebApp.
     """
+    jobs = get_job_registry()
+    submitted = time.monotonic()
+    status_key = f"job:{job_id}" if job_id else None
+
+    async def stage(name: str, **fields):
+        if job_id:
+            await jobs.update(job_id, stage=name, **fields)
+
+    async def fail(error: str):
+        if job_id:
+            await jobs.fail(job_id, error)
+
     try:
-        logger.info(f"Starting background generation for user {user_id}: {action_type}")
+        logger.info("Starting background generation for user %s: %s", user_id, action_type)
         
-        if action_type == 'image':
-            model_id = "gemini-3-pro-image-preview"
-            await bot.send_message(chat_id=user_id, text=f"🎨 {model_id} рисует...")
+        async def notify_queued(position: int):
+            await stage("queued", message=f"Позиция в очереди: {position}")
+            await outbound.status(user_id, lambda: bot.send_message(chat_id=user_id, text=f"⏳ Задача в очереди. Ваша позиция: {position}"), key=status_key)
+
+        async with generation_scheduler.slot(user_id, weight=await user_weight(user_id), on_queued=notify_queued):
+            started = time.monotonic()
+            queue_ms = int((started - submitted) * 1000)
+            if action_type == 'image':
+                await stage("generating", message=None)
+                await outbound.status(user_id, lambda: bot.send_message(chat_id=user_id, text="🎨 Рисую..."), key=status_key)
             
-            aspect_ratio = params.get('aspectRatio', '1:1')
-            image_bytes = await gemini_service.generate_image(prompt, aspect_ratio=aspect_ratio)
+                aspect_ratio = params.get('aspectRatio', '1:1')
+                variants = variant_count(params.get('variants'))
+                result = await image_router.generate(ImageRequest(prompt, aspect_ratio=aspect_ratio, n=variants))
             
-            if image_bytes:
-                photo_file = BufferedInputFile(image_bytes, filename="generated_image.png")
-                await bot.send_photo(chat_id=user_id, photo=photo_file, caption=f"✨ Generated by {model_id}\nPrompt: {prompt}")
-            else:
-                await bot.send_message(chat_id=user_id, text="❌ Не удалось сгенерировать изображение.")
+                if result.images:
+                    generation_ms = int((time.monotonic() - started) * 1000)
+                    await stage("uploading")
+                    deliveries = await prepare_images(result.images, name="generated_image")
+                    spec = await job_specs.save(JobSpec(
+                        user_id, action_type, prompt, aspect_ratio=aspect_ratio, n=variants,
+                        output_ids=[d.original_id for d in deliveries]
+                    ))
+                    await deliver_images(
+                        bot, user_id, deliveries,
+                        caption=f"✨ Generated by {result.model}\nPrompt: {html.escape(prompt)}",
+                        spec_id=spec.id
+                    )
+                    record_generations_later(
+                        user_id, action_type, prompt, params, result.model,
+                        [{"artifact_id": d.original_id, "thumbnail_id": d.thumbnail_id} for d in deliveries],
+                        queue_ms=queue_ms, generation_ms=generation_ms
+                    )
+                    await stage("done", result={
+                        "model": result.model,
+                        "images": [blob_store.signed_url(d.original_id) for d in deliveries],
+                        "thumbnails": [blob_store.signed_url(d.thumbnail_id) for d in deliveries],
+                    })
+                else:
+                    await fail("Image generation failed")
+                    await outbound.result(user_id, lambda: bot.send_message(chat_id=user_id, text="❌ Не удалось сгенерировать изображение."))
 
-        elif action_type == 'video':
-            model_id = "veo-3.1-fast-generate-001"
-            await bot.send_message(chat_id=user_id, text=f"🎥 {model_id} начала рендеринг...")
+            elif action_type == 'video':
+                model_id = settings.MODELS["video"]
+                await stage("generating", message=None)
+                await outbound.status(user_id, lambda: bot.send_message(chat_id=user_id, text=f"🎥 {model_id} начала рендеринг..."), key=status_key)
             
-            video_uri = await veo_service.generate_video(prompt)
+                video_bytes = await (await container.aget("veo")).generate_video(prompt)
             
-            if video_uri:
-                 await bot.send_message(chat_id=user_id, text=f"🎬 Готово! Результат: {video_uri}")
+                if video_bytes:
+                     generation_ms = int((time.monotonic() - started) * 1000)
+                     await stage("uploading")
+                     blob_id = await blob_store.put(video_bytes, "mp4")
+                     video_file = BufferedInputFile(video_bytes, filename="generated_video.mp4")
+                     await outbound.result(user_id, lambda: bot.send_video(chat_id=user_id, video=video_file, caption="🎬 Готово!"))
+                     record_generations_later(
+                         user_id, action_type, prompt, params, model_id,
+                         [{"artifact_id": blob_id, "thumbnail_id": None}],
+                         queue_ms=queue_ms, generation_ms=generation_ms
+                     )
+                     await stage("done", result={"model": model_id, "video": blob_store.signed_url(blob_id)})
+                     logger.info("Video for user %s stored as %s", user_id, blob_id)
+                else:
+                     await fail("Video generation failed")
+                     await outbound.result(user_id, lambda: bot.send_message(chat_id=user_id, text="❌ Не удалось сгенерировать видео (возможно, превышена квота)."))
+
             else:
-                 await bot.send_message(chat_id=user_id, text="❌ Не удалось сгенерировать видео (возможно, превышена квота).")
+                await fail(f"Unsupported type: {action_type}")
 
+    except Overloaded as e:
+        logger.warning("Generation for user %s rejected: %s", user_id, e)
+        await fail(str(e))
+        retry_after = e.retry_after
+        await outbound.result(user_id, lambda: bot.send_message(chat_id=user_id, text=f"⏳ Сервис перегружен. Попробуйте через {retry_after} сек."))
     except Exception as e:
-        logger.error(f"Error in process_generation_task: {e}")
+        logger.error("Error in process_generation_task: %s", e)
         try:
-            await bot.send_message(chat_id=user_id, text=f"❌ Ошибка генерации: {str(e)}")
+            await fail(str(e))
+            # The send may run after this block exits (retries), when `e` is already unbound
+            error_text = f"❌ Ошибка генерации: {html.escape(str(e))}"
+            await outbound.result(user_id, lambda: bot.send_message(chat_id=user_id, text=error_text))
         except Exception as send_err:
-             logger.error(f"Failed to send error message to user: {send_err}")
-    finally:
-        # We don't close the bot session here because we reuse it? 
-        # Actually aiogram Bot session is connection pooled. 
-        # But if we create a new instance globally, we should manage its lifecycle.
-        # For simple use case, letting it manage itself is okay, but explicit close on app shutdown is better.
-        pass
+             logger.error("Failed to send error message to user: %s", send_err)
 
 @router.post("/image/", response_model=StatusResponse)
 async def generate_image(request: GenerateImageRequest):
     # Mock generation endpoint from original code
-    logger.info(f"IMAGE GEN REQUEST: {request}")
+    logger.info("IMAGE GEN REQUEST", extra={"prompt": request.prompt})
     return StatusResponse(status='success', message=f'Image generation started for: {request.prompt}')
 
 @router.post("/video/", response_model=StatusResponse)
-async def generate_video(request: GenerateVideoRequest):
+async def generate_video(request: GenerateVideoRequest, http_request: Request):
     # This was originally blocking or half-blocking.
     # We will try to generate immediately or delegates.
     # Replicating original logic: await generation and return URI if successful.
     
     try:
-        video_uri = await veo_service.generate_video(request.prompt)
-        if video_uri:
-             return StatusResponse(status='success', video_uri=video_uri)
+        video_bytes = await run_until_disconnect(http_request, (await container.aget("veo")).generate_video(request.prompt))
+        if video_bytes:
+             # Persist the result and hand out a signed, range-capable link
+             blob_id = await blob_store.put(video_bytes, "mp4")
+             return StatusResponse(status='success', video_uri=blob_store.signed_url(blob_id))
         else:
              raise HTTPException(status_code=500, detail="Generation failed or quota exceeded")
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
-        logger.error(f"Error in generate_video: {e}")
+        logger.error("Error in generate_video: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=StatusResponse)
-async def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
+async def generate(
+    request: GenerateRequest,
+    background_tasks: BackgroundTasks,
+    bot: Bot = Depends(get_bot),
+    user_data: Optional[Dict[str, Any]] = Depends(current_user)
+):
     """
     Main entry point for WebApp generation.
     Starts a background task and notifies user via Telegram Bot.
     """
     if not request.user_id:
          raise HTTPException(status_code=400, detail="user_id is required")
+    if user_data and request.user_id != user_data.get("id"):
+         raise HTTPException(status_code=403, detail="user_id does not match initData")
+
+    # Fast 503 while the target model is saturated
+    if request.type == 'image':
+        image_router.check(ImageRequest(request.prompt, aspect_ratio=request.params.get('aspectRatio', '1:1')))
+    elif request.type == 'video':
+        model_limiter(settings.MODELS["video"]).check()
+
+    # Created first, so the "queued" stage covers the whole path from submission
+    job = await get_job_registry().create(request.user_id, request.type)
 
     # Notify user immediately
     try:
-        await bot.send_message(chat_id=request.user_id, text=f"✅ Задача получена: {request.type.upper()}\nПромт: {request.prompt[:50]}...")
+        await outbound.status(request.user_id, lambda: bot.send_message(chat_id=request.user_id, text=f"✅ Задача получена: {request.type.upper()}\nПромт: {html.escape(request.prompt[:50])}..."))
     except Exception as e:
-         logger.error(f"Failed to send initial confirmation: {e}")
+         logger.error("Failed to send initial confirmation: %s", e)
          # Continue anyway to process task? Or fail? 
          # Likely fail if bot can't reach user.
          pass
@@ -101,10 +193,64 @@ async def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
     # Add background task
     background_tasks.add_task(
         process_generation_task, 
+        bot,
         request.user_id, 
         request.type, 
         request.prompt, 
-        request.params
+        request.params,
+        job.id
     )
     
-    return StatusResponse(status='success', message='Task started')
+    return StatusResponse(status='success', message='Task started', job_id=job.id)
+
+
+def _owns(user_data: Optional[Dict[str, Any]], user_id: int) -> bool:
+    # Without auth (WEBAPP_AUTH_REQUIRED off) job ids are the only capability
+    return user_data is None or user_data.get("id") == user_id
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Long-poll: seconds to wait for a change"),
+    after: int = Query(-1, description="Return once the job version exceeds this"),
+    user_data: Optional[Dict[str, Any]] = Depends(current_user),
+):
+    """
+    Job status. With `wait`, blocks until the job changes past version `after`
+    (or finishes) instead of returning immediately.
+    """
+    jobs = get_job_registry()
+    job = await jobs.get(job_id)
+    if job is None or not _owns(user_data, job.user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait:
+        job = await jobs.wait(job_id, after, timeout=min(wait, settings.JOB_MAX_WAIT)) or job
+    return JobResponse(**asdict(job))
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request, user_data: Optional[Dict[str, Any]] = Depends(current_user)):
+    """
+    Server-Sent Events stream of stage transitions until the job is done or failed.
+    EventSource cannot send headers: pass initData as the `auth` query parameter.
+    """
+    jobs = get_job_registry()
+    job = await jobs.get(job_id)
+    if job is None or not _owns(user_data, job.user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for job in jobs.watch(job_id):
+            if await request.is_disconnected():
+                return
+            if job is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {job.version}\nevent: {job.stage}\ndata: {JobResponse(**asdict(job)).model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
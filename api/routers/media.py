@@ -0,0 +1,103 @@
+import os
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from services.storage import blob_store
+
+router = APIRouter()
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single "bytes=" range into inclusive (start, end) offsets.
+    Returns None when the header should be ignored (multiple or foreign ranges).
+    Raises ValueError when the range is not satisfiable.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    start_s, _, end_s = spec.strip().partition("-")
+    if not start_s:
+        # Suffix range: last N bytes
+        if not end_s.isdigit() or int(end_s) == 0:
+            raise ValueError("Invalid suffix range")
+        start = max(size - int(end_s), 0)
+        end = size - 1
+    else:
+        if not start_s.isdigit() or (end_s and not end_s.isdigit()):
+            raise ValueError("Invalid range")
+        start = int(start_s)
+        end = min(int(end_s), size - 1) if end_s else size - 1
+
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+async def iter_file_range(path: str, start: int, end: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.api_route("/{blob_id}", methods=["GET", "HEAD"])
+async def get_media(blob_id: str, expires: int, sig: str, request: Request):
+    """
+    Serves a stored artifact by signed, short-lived URL.
+    Supports ETag revalidation and single HTTP Range requests for video seeking.
+    """
+    if not blob_store.verify(blob_id, expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+
+    path = blob_store.path(blob_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    size = os.path.getsize(path)
+    etag = blob_store.etag(blob_id)
+    media_type = blob_store.content_type(blob_id)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600, immutable",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                headers=headers,
+                media_type=media_type,
+            )
+
+    # Full body: FileResponse lets the ASGI server use zero-copy sending where supported
+    return FileResponse(path, media_type=media_type, headers=headers, method=request.method)
@@ -0,0 +1,61 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional, Set
+
+from aiogram.types import Update
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from bot.update_queue import get_update_queue
+from config.settings import settings
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Updates are processed in the background so Telegram gets a fast 200
+_update_tasks: Set[asyncio.Task] = set()
+
+
+@router.post("/webhook")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """
+    Receives Telegram updates in webhook mode and feeds them to the Dispatcher.
+    """
+    dispatcher = getattr(request.app.state, "dispatcher", None)
+    if dispatcher is None:
+        raise HTTPException(status_code=404, detail="Webhook mode is disabled")
+
+    if not settings.WEBHOOK_SECRET or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token or "", settings.WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=401, detail="Invalid secret token")
+
+    queue = get_update_queue()
+    if queue is not None:
+        # Stateless ingest: shard workers run the handlers
+        await queue.publish(await request.json())
+        return {"ok": True}
+
+    bot = request.app.state.bot
+    update = Update.model_validate(await request.json(), context={"bot": bot})
+
+    task = asyncio.create_task(dispatcher.feed_update(bot, update))
+    _update_tasks.add(task)
+    task.add_done_callback(_update_tasks.discard)
+
+    return {"ok": True}
+
+
+async def drain_updates(timeout: float):
+    """
+    Waits for in-flight updates to finish before shutdown.
+    """
+    if not _update_tasks:
+        return
+    logger.info("Waiting for %s in-flight updates", len(_update_tasks))
+    _, pending = await asyncio.wait(set(_update_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
@@ -0,0 +1,51 @@
+import ssl
+from typing import Optional
+
+import certifi
+from aiohttp import ClientSession, TCPConnector
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+
+from config.settings import settings
+
+
+class KeepAliveSession(AiohttpSession):
+    """
+    AiohttpSession with a pooled connector that keeps idle connections to
+    api.telegram.org warm between bursts of sends.
+    """
+
+    def __init__(self, limit: int, keepalive_timeout: float):
+        super().__init__(limit=limit)
+        self.pool_size = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._client: Optional[ClientSession] = None
+
+    async def create_session(self) -> ClientSession:
+        if self._client is None or self._client.closed:
+            connector = TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+            )
+            self._client = ClientSession(connector=connector)
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+        await super().close()
+
+
+def create_bot() -> Bot:
+    """
+    Creates a Bot with a pooled, keep-alive HTTP session.
+    One instance should be shared per process and closed on shutdown.
+    """
+    return Bot(
+        token=settings.BOT_TOKEN,
+        session=KeepAliveSession(limit=settings.BOT_HTTP_POOL_SIZE, keepalive_timeout=settings.BOT_HTTP_KEEPALIVE),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
@@ -0,0 +1,46 @@
+import logging
+
+from aiogram import Dispatcher
+
+from config.logging_setup import bind_correlation_id, correlation_id
+
+logger = logging.getLogger(__name__)
+
+
+def create_dispatcher() -> Dispatcher:
+    """
+    Builds the Dispatcher with all routers.
+    Shared by polling mode (bot/main.py) and webhook mode (API process).
+    """
+    dp = Dispatcher()
+
+    @dp.update.outer_middleware
+    async def log_update_middleware(handler, event, data):
+        # Everything logged while handling this update carries its id
+        token = bind_correlation_id(f"u{event.update_id}")
+        try:
+            if event.message and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "Received message: %s", event.message.content_type,
+                    extra={"chat_id": event.message.chat.id, "webapp_data_len": len(event.message.web_app_data.data) if event.message.web_app_data else None}
+                )
+            return await handler(event, data)
+        finally:
+            correlation_id.reset(token)
+
+    from bot.handlers.admin import router as admin_router
+    dp.include_router(admin_router)
+
+    from bot.handlers.webapp_data import router as webapp_data_router
+    dp.include_router(webapp_data_router)
+
+    from bot.handlers.delivery import router as delivery_router
+    dp.include_router(delivery_router)
+
+    from bot.handlers.reruns import router as reruns_router
+    dp.include_router(reruns_router)
+
+    from bot.handlers.common import router as common_router
+    dp.include_router(common_router)
+
+    return dp
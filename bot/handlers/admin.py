@@ -12,3 +12,13 @@ class IsAdmin(Filter):
 @router.message(Command("admin"), IsAdmin())
 async def admin_start(message: Message):
     await message.answer("Welcome, Admin! You have access to the admin panel.")
+
+@router.message(Command("faqstats"), IsAdmin())
+async def faq_stats(message: Message):
+    from services.semantic_cache import faq_cache
+    stats = faq_cache.stats()
+    await message.answer(
+        f"FAQ cache: {stats['entries']} entries ({stats['confirmed']} confirmed), "
+        f"{stats['hits']}/{stats['lookups']} hits "
+        f"({stats['hit_rate']:.0%})"
+    )
@@ -1,12 +1,16 @@
 from aiogram import Router, types
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandStart
 from aiogram.enums import ParseMode
 from aiogram.utils.markdown import hbold
 from aiogram.types import WebAppInfo
 from sqlalchemy import select
 from database.db import get_db
 from database.models import User
+from aiogram.exceptions import TelegramBadRequest
 from config.settings import settings
+from services.outbound import outbound, PRIORITY_STATUS
+from services.limits import Overloaded
+from services.sessions import chat_sessions
 
 router = Router()
 
@@ -54,38 +58,69 @@ async def command_start_handler(message: types.Message) -> None:
                 reply_markup=kb
             )
 
+@router.message(Command("new"))
+async def new_chat_handler(message: types.Message) -> None:
+    """
+    Starts a new conversation: forgets the chat session of the user.
+    """
+    await chat_sessions.reset(message.from_user.id)
+    await message.answer("🧹 Начинаем новый диалог.")
+
 @router.message(lambda message: message.text and not message.text.startswith('/'))
 async def chat_handler(message: types.Message) -> None:
     """
-    Handler for text messages. Checks balance, deducts credit, and sends to Gemini.
+    Handler for text messages. Sends the message to Gemini with the user's chat session.
     """
-    from services.gemini import gemini_service
+    from services.container import container
+    from services.semantic_cache import faq_cache
     
-    # user_id = message.from_user.id
-    
-    # user_id = message.from_user.id
-    
-    wait_message = await message.answer("Думаю...")
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    wait_message = await outbound.submit(chat_id, lambda: message.answer("Думаю..."), priority=PRIORITY_STATUS)
     
     try:
-        response = await gemini_service.generate_text(message.text)
+        gemini_service = await container.aget("gemini")
+        prefix, history = await chat_sessions.context(user_id)
+
+        # First turns are mostly FAQ: answer near-duplicates from the semantic cache
+        match, response = None, None
+        if settings.FAQ_CACHE_ENABLED and not prefix and not history and faq_cache.eligible(message.text):
+            match = await faq_cache.lookup(message.text, user_id)
+            response = match.answer
+
+        if response is None:
+            response = await gemini_service.generate_text(
+                message.text, history=history, prefix=prefix, cache_slot=f"chat:{user_id}"
+            )
+            if response and match:
+                await faq_cache.remember(match, response, user_id)
+
         if response:
-            try:
-                await wait_message.edit_text(response, parse_mode=ParseMode.HTML)
-            except Exception:
-                # Fallback if HTML parsing fails
-                await wait_message.edit_text(response, parse_mode=None)
+            async def deliver():
+                try:
+                    return await wait_message.edit_text(response, parse_mode=ParseMode.HTML)
+                except TelegramBadRequest:
+                    # Fallback if HTML parsing fails
+                    return await wait_message.edit_text(response, parse_mode=None)
+
+            await outbound.result(chat_id, deliver)
+            await chat_sessions.record(user_id, message.text, response)
         else:
-            await wait_message.edit_text("Извините, не удалось сгенерировать ответ.")
+            await outbound.result(chat_id, lambda: wait_message.edit_text("Извините, не удалось сгенерировать ответ."))
+    except Overloaded as e:
+        retry_after = e.retry_after
+        await outbound.result(chat_id, lambda: wait_message.edit_text(f"⏳ Сервис перегружен. Попробуйте через {retry_after} сек."))
     except Exception as e:
-        await wait_message.edit_text(f"Произошла ошибка: {str(e)}", parse_mode=None)
+        # The send may run after this block exits (retries), when `e` is already unbound
+        error_text = f"Произошла ошибка: {str(e)}"
+        await outbound.result(chat_id, lambda: wait_message.edit_text(error_text, parse_mode=None))
 
 @router.message(lambda message: message.photo)
 async def photo_handler(message: types.Message) -> None:
     """
     Handler for photo messages. Checks balance, deducts credit, and sends to Gemini.
     """
-    from services.gemini import gemini_service
+    from services.container import container
     from PIL import Image
 
     if not message.caption:
@@ -94,7 +129,8 @@ async def photo_handler(message: types.Message) -> None:
 
 
 
-    wait_message = await message.answer("Analyzing image...")
+    chat_id = message.chat.id
+    wait_message = await outbound.submit(chat_id, lambda: message.answer("Analyzing image..."), priority=PRIORITY_STATUS)
 
     try:
         # Download the largest photo
@@ -105,11 +141,13 @@ async def photo_handler(message: types.Message) -> None:
         
         image = Image.open(file_content)
         
+        gemini_service = await container.aget("gemini")
         response = await gemini_service.generate_multimodal(message.caption, [image])
         
         if response:
-            await wait_message.edit_text(response, parse_mode=ParseMode.HTML)
+            await outbound.result(chat_id, lambda: wait_message.edit_text(response, parse_mode=ParseMode.HTML))
         else:
-            await wait_message.edit_text("Sorry, I couldn't generate a response.")
+            await outbound.result(chat_id, lambda: wait_message.edit_text("Sorry, I couldn't generate a response."))
     except Exception as e:
-        await wait_message.edit_text(f"An error occurred: {str(e)}")
+        error_text = f"An error occurred: {str(e)}"
+        await outbound.result(chat_id, lambda: wait_message.edit_text(error_text))
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from aiogram import Bot, Router, F, types
+from aiogram.types import BufferedInputFile, InputMediaPhoto
+
+from bot.keyboards import download_keyboard, variants_download_keyboard
+from services.media import DeliveryImage
+from services.outbound import outbound
+from services.storage import blob_store
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+def _load_original(short_id: str) -> Tuple[Optional[str], Optional[bytes]]:
+    blob_id = blob_store.resolve(short_id)
+    return blob_id, blob_store.read(blob_id) if blob_id else None
+
+
+@router.callback_query(F.data.startswith("dl:"))
+async def download_original(callback: types.CallbackQuery):
+    """
+    Sends the lossless original of a delivered image as a document (no Telegram compression).
+    """
+    blob_id, data = await asyncio.to_thread(_load_original, callback.data[3:])
+
+    if not data:
+        await callback.answer("Файл больше недоступен.", show_alert=True)
+        return
+
+    await callback.answer()
+    ext = blob_id.rsplit(".", 1)[-1]
+    await callback.message.answer_document(
+        document=BufferedInputFile(data, filename=f"original.{ext}"),
+        caption="📥 Оригинал без сжатия"
+    )
+
+
+async def deliver_images(bot: Bot, chat_id: int, images: List[DeliveryImage], caption: str, spec_id: Optional[str] = None):
+    """
+    Sends generated images: a single photo with the download button, or one media
+    group for several variants followed by their download buttons. With `spec_id`
+    the buttons also offer rerun and variation.
+    """
+    if len(images) == 1:
+        image = images[0]
+        photo = BufferedInputFile(image.photo, filename=image.photo_filename)
+        await outbound.result(chat_id, lambda: bot.send_photo(
+            chat_id=chat_id,
+            photo=photo,
+            caption=caption,
+            reply_markup=download_keyboard(image.original_id, spec_id)
+        ))
+        return
+
+    media = [
+        InputMediaPhoto(
+            media=BufferedInputFile(image.photo, filename=image.photo_filename),
+            caption=caption if i == 0 else None
+        )
+        for i, image in enumerate(images)
+    ]
+    await outbound.result(chat_id, lambda: bot.send_media_group(chat_id=chat_id, media=media))
+    await outbound.result(chat_id, lambda: bot.send_message(
+        chat_id=chat_id,
+        text="📥 Оригиналы без сжатия:",
+        reply_markup=variants_download_keyboard([image.original_id for image in images], spec_id)
+    ))
@@ -0,0 +1,102 @@
+import logging
+import time
+from dataclasses import replace
+
+from aiogram import Router, F, types
+
+from services.outbound import outbound
+from services.fair_queue import generation_scheduler, user_weight
+from services.limits import Overloaded
+from services.history import record_generations_later
+from services.job_specs import job_specs
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+VARIATION_PROMPT = (
+    "Create a variation of the provided image: keep the subject, style and palette, "
+    "change the composition, pose and details. Original request: "
+)
+
+
+@router.callback_query(F.data.startswith("rr:") | F.data.startswith("vr:"))
+async def rerun_handler(callback: types.CallbackQuery):
+    """
+    "🔁 Повторить" runs the stored job spec again; "🎲 Вариация" uses a delivered
+    result as the reference. Both skip downloads and prompt synthesis.
+    """
+    kind, _, rest = callback.data.partition(":")
+    spec_id, _, index = rest.partition(":")
+    user_id = callback.from_user.id
+    chat_id = callback.message.chat.id
+
+    spec = await job_specs.get(spec_id)
+    if spec is None or spec.user_id != user_id:
+        await callback.answer("Задача устарела, отправьте запрос заново.", show_alert=True)
+        return
+
+    if kind == "vr":
+        try:
+            source_id = spec.output_ids[int(index or 0)]
+        except (ValueError, IndexError):
+            await callback.answer("Изображение больше недоступно.", show_alert=True)
+            return
+        action_type = "reference"
+        child = replace(spec, type=action_type, variation=True, n=1,
+                        reference_ids=[source_id], output_ids=[], id="", created_at=time.time())
+        await callback.answer("🎲 Делаю вариацию...")
+    else:
+        action_type = spec.type
+        child = replace(spec, output_ids=[], id="", created_at=time.time())
+        await callback.answer("🔁 Повторяю...")
+
+    async def notify_queued(position: int):
+        await outbound.status(chat_id, lambda: callback.message.answer(f"⏳ Задача в очереди. Ваша позиция: {position}"), key=f"cb:{callback.id}")
+
+    try:
+        submitted = time.monotonic()
+        async with generation_scheduler.slot(user_id, weight=await user_weight(user_id), on_queued=notify_queued):
+            started = time.monotonic()
+            from services.image_router import ImageRequest, image_router
+            references = await job_specs.references(child.reference_ids)
+            if child.reference_ids and not references:
+                await outbound.result(chat_id, lambda: callback.message.answer("❌ Референсы больше недоступны, отправьте запрос заново."))
+                return
+
+            # Added per call, so variations of variations don't nest the instruction
+            prompt = VARIATION_PROMPT + child.prompt if child.variation else child.prompt
+            result = await image_router.generate(ImageRequest(
+                prompt,
+                aspect_ratio=child.aspect_ratio,
+                n=child.n,
+                references=references,
+                resolution=child.resolution,
+            ))
+            if not result.images:
+                await outbound.result(chat_id, lambda: callback.message.answer("❌ Ошибка: Не удалось сгенерировать изображение."))
+                return
+
+            generation_ms = int((time.monotonic() - started) * 1000)
+            from services.media import prepare_images
+            from bot.handlers.delivery import deliver_images
+            deliveries = await prepare_images(result.images, name="generated")
+            child.output_ids = [d.original_id for d in deliveries]
+            await job_specs.save(child)
+            caption = "🎲 Вариация готова!" if kind == "vr" else "🔁 Готово!"
+            await deliver_images(callback.bot, chat_id, deliveries, caption=f"{caption} Модель: {result.model}", spec_id=child.id)
+            record_generations_later(
+                user_id, action_type, child.prompt,
+                {"aspectRatio": child.aspect_ratio, "resolution": child.resolution, "variants": child.n, "parent": spec.id},
+                result.model,
+                [{"artifact_id": d.original_id, "thumbnail_id": d.thumbnail_id} for d in deliveries],
+                queue_ms=int((started - submitted) * 1000), generation_ms=generation_ms
+            )
+
+    except Overloaded as e:
+        # The send may run after this block exits (retries), when `e` is already unbound
+        retry_after = e.retry_after
+        await outbound.result(chat_id, lambda: callback.message.answer(f"⏳ Сервис перегружен. Попробуйте через {retry_after} сек."))
+    except Exception as e:
+        logger.exception("Error in rerun handler")
+        error_text = f"❌ Системная ошибка: {str(e)}"
+        await outbound.result(chat_id, lambda: callback.message.answer(error_text))
@@ -1,12 +1,22 @@
+import contextlib
 import json
 import logging
+import time
 from aiogram import Router, F, types
 
 from config.settings import settings
+from services.outbound import outbound
+from services.fair_queue import generation_scheduler, user_weight
+from services.limits import Overloaded
+from services.history import record_generations_later
+from services.job_specs import JobSpec, job_specs
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Actions that start an upstream generation and go through fair admission
+GENERATION_TYPES = ('image', 'reference', 'video')
+
 @router.message(F.web_app_data)
 async def handle_web_app_data(message: types.Message):
     """
@@ -21,116 +31,180 @@ async def handle_web_app_data(message: types.Message):
         params = data.get('params', {})
 
         safe_prompt = str(prompt)[:50] if prompt else "None"
-        print(f"DEBUG REBOOT: Processing WebApp data: {action_type} | {safe_prompt}...")
-        logger.info(f"Processing WebApp data: {action_type} | {safe_prompt}...")
+        # One request: its progress messages may supersede each other
+        status_key = f"msg:{message.message_id}"
+        logger.info("Processing WebApp data: %s", action_type, extra={"prompt": prompt})
 
-        if action_type == 'image':
-            from services.gemini import gemini_service
-            
-            model_id = settings.MODELS['image']
-            aspect_ratio = params.get('aspectRatio', '1:1')
-            
-            await message.answer(f"🎨 Рисую изображение ({aspect_ratio})...\nПромт: <i>{safe_prompt}</i>")
-            
-            # Generate image
-            image_bytes = await gemini_service.generate_image(prompt, aspect_ratio=aspect_ratio)
-            
-            if image_bytes:
-                from aiogram.types import BufferedInputFile
-                photo_file = BufferedInputFile(image_bytes, filename="generated.png")
-                await message.answer_photo(photo=photo_file, caption=f"✨ Готово! Модель: {model_id}")
-            else:
-                await message.answer("❌ Ошибка: Не удалось сгенерировать изображение.")
-
-        elif action_type == 'reference':
-            from services.gemini import gemini_service
-            import aiohttp
-            import io
-            from PIL import Image
-            
-            main_prompt = data.get('mainPrompt', '')
-            references = data.get('references', [])
-            
-            # Отладочное логирование
-            logger.info(f"[REFERENCE] Received {len(references)} references")
-            for i, ref in enumerate(references):
-                logger.info(f"[REFERENCE] Ref {i}: hasFile={ref.get('hasFile')}, url={ref.get('url')}, description={ref.get('description')}")
-            
-            await message.answer("🔄 Загружаю и обрабатываю референсы... Пожалуйста, подождите.")
-            
-            images = []
-            async with aiohttp.ClientSession() as session:
-                for i, ref in enumerate(references):
-                    if ref.get('url'):
-                        try:
-                            logger.info(f"[REFERENCE] Downloading image {i} from {ref['url'][:50]}...")
-                            async with session.get(ref['url']) as resp:
-                                if resp.status == 200:
-                                    img_data = await resp.read()
-                                    img = Image.open(io.BytesIO(img_data))
-                                    images.append(img)
-                                    logger.info(f"[REFERENCE] Successfully loaded image {i}, size: {img.size}")
-                                else:
-                                    logger.error(f"[REFERENCE] HTTP {resp.status} for image {i}")
-                        except Exception as e:
-                            logger.error(f"Error downloading image {ref['url']}: {e}")
-                    else:
-                        logger.warning(f"[REFERENCE] Ref {i} has no URL (hasFile={ref.get('hasFile')}), skipping")
-
-            logger.info(f"[REFERENCE] Successfully loaded {len(images)} images out of {len(references)} references")
-
-            if not images and not main_prompt:
-                await message.answer("❌ Недостаточно данных для генерации.")
-                return
-
-            # Build prompt from main_prompt and reference descriptions
-            prompt_parts = []
-            if main_prompt:
-                prompt_parts.append(main_prompt)
-            
-            for ref in references:
-                if ref.get('description') and ref.get('url'):
-                    prompt_parts.append(f"From reference image: {ref['description']}")
-            
-            final_prompt = ". ".join(prompt_parts) if prompt_parts else "Generate an image based on the provided references"
-            
-            await message.answer(f"🎨 Генерирую изображение по {len(images)} референсам...")
-            
-            # Generate with references using new API
-            aspect_ratio = params.get('aspectRatio', '9:16')
-            resolution = params.get('resolution', '1K')
-            image_bytes = await gemini_service.generate_image_with_references(
-                prompt=final_prompt,
-                reference_images=images,
-                aspect_ratio=aspect_ratio,
-                resolution=resolution
-            )
-            
-            if image_bytes:
-                from aiogram.types import BufferedInputFile
-                photo_file = BufferedInputFile(image_bytes, filename="ref_generated.png")
-                await message.answer_photo(
-                    photo=photo_file, 
-                    caption=f"✨ Готово по референсам!\nИзображений: {len(images)}\nСоотношение: {aspect_ratio}\nРазрешение: {resolution}"
-                )
-            else:
-                await message.answer("❌ Не удалось сгенерировать финальное изображение.")
-
-        elif action_type == 'video':
-            from services.veo import veo_service
-            
-            model_id = settings.MODELS['video']
-            await message.answer("🎥 Запускаю видео-генерацию (Veo)...\nЭто займет 1-2 минуты. Пожалуйста, подождите.")
-            
-            video_bytes = await veo_service.generate_video(prompt)
-            
-            if video_bytes:
-                from aiogram.types import BufferedInputFile
-                video_file = BufferedInputFile(video_bytes, filename="generated_video.mp4")
-                await message.answer_video(video=video_file, caption=f"🎬 Ваше видео готово!\nПромт: <i>{safe_prompt}</i>")
-            else:
-                await message.answer("❌ Не удалось сгенерировать видео. \nВозможно, временная ошибка API или лимит генераций.")
+        async def notify_queued(position: int):
+            await outbound.status(message.chat.id, lambda: message.answer(f"⏳ Задача в очереди. Ваша позиция: {position}"), key=status_key)
+
+        user_id = message.from_user.id
+        submitted = time.monotonic()
+        if action_type in GENERATION_TYPES:
+            slot = generation_scheduler.slot(user_id, weight=await user_weight(user_id), on_queued=notify_queued)
+        else:
+            slot = contextlib.nullcontext()
+
+        async with slot:
+            started = time.monotonic()
+            queue_ms = int((started - submitted) * 1000)
+
+            def generation_ms() -> int:
+                return int((time.monotonic() - started) * 1000)
+
+            if action_type == 'image':
+                aspect_ratio = params.get('aspectRatio', '1:1')
+
+                if params.get('fields'):
+                    # Structured selections compile locally into an English prompt
+                    from services.prompt_compiler import prompt_compiler
+                    prompt = prompt_compiler.compile(params['fields']).text()
+                    safe_prompt = prompt[:50]
+            
+                from services.media import variant_count
+                variants = variant_count(params.get('variants'))
+                counter = f", вариантов: {variants}" if variants > 1 else ""
+                await outbound.status(message.chat.id, lambda: message.answer(f"🎨 Рисую изображение ({aspect_ratio}{counter})...\nПромт: <i>{safe_prompt}</i>"), key=status_key)
+            
+                # Generate image(s) on the fastest healthy backend
+                from services.image_router import ImageRequest, image_router
+                result = await image_router.generate(ImageRequest(prompt, aspect_ratio=aspect_ratio, n=variants))
+            
+                if result.images:
+                    from services.media import prepare_images
+                    from bot.handlers.delivery import deliver_images
+                    elapsed = generation_ms()
+                    deliveries = await prepare_images(result.images, name="generated")
+                    spec = await job_specs.save(JobSpec(
+                        user_id, action_type, prompt, aspect_ratio=aspect_ratio, n=variants,
+                        output_ids=[d.original_id for d in deliveries]
+                    ))
+                    await deliver_images(message.bot, message.chat.id, deliveries, caption=f"✨ Готово! Модель: {result.model}", spec_id=spec.id)
+                    record_generations_later(
+                        user_id, action_type, prompt, params, result.model,
+                        [{"artifact_id": d.original_id, "thumbnail_id": d.thumbnail_id} for d in deliveries],
+                        queue_ms=queue_ms, generation_ms=elapsed
+                    )
+                else:
+                    await outbound.result(message.chat.id, lambda: message.answer("❌ Ошибка: Не удалось сгенерировать изображение."))
+
+            elif action_type == 'reference':
+                import aiohttp
+            
+                main_prompt = data.get('mainPrompt', '')
+                references = data.get('references', [])
+            
+                # Отладочное логирование
+                logger.info("[REFERENCE] Received %d references", len(references))
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, ref in enumerate(references):
+                        logger.debug("[REFERENCE] Ref %d: hasFile=%s, url=%s, description=%s", i, ref.get('hasFile'), ref.get('url'), ref.get('description'))
+            
+                await outbound.status(message.chat.id, lambda: message.answer("🔄 Загружаю и обрабатываю референсы... Пожалуйста, подождите."), key=status_key)
+            
+                downloads = []
+                async with aiohttp.ClientSession() as session:
+                    for i, ref in enumerate(references):
+                        if ref.get('url'):
+                            try:
+                                logger.debug("[REFERENCE] Downloading image %d from %.50s", i, ref['url'])
+                                async with session.get(ref['url']) as resp:
+                                    if resp.status == 200:
+                                        downloads.append(await resp.read())
+                                        logger.debug("[REFERENCE] Downloaded image %d, %d bytes", i, len(downloads[-1]))
+                                    else:
+                                        logger.error("[REFERENCE] HTTP %s for image %d", resp.status, i)
+                            except Exception as e:
+                                logger.error("Error downloading image %s: %s", ref['url'], e)
+                        else:
+                            logger.warning("[REFERENCE] Ref %d has no URL (hasFile=%s), skipping", i, ref.get('hasFile'))
+
+                # Normalized once and kept for reruns
+                reference_ids, images = await job_specs.store_references(downloads)
+                logger.info("[REFERENCE] Successfully loaded %d images out of %d references", len(images), len(references))
+
+                if not images and not main_prompt:
+                    await outbound.result(message.chat.id, lambda: message.answer("❌ Недостаточно данных для генерации."))
+                    return
+
+                # Build prompt from main_prompt and reference descriptions
+                prompt_parts = []
+                if main_prompt:
+                    prompt_parts.append(main_prompt)
+            
+                for ref in references:
+                    if ref.get('description') and ref.get('url'):
+                        prompt_parts.append(f"From reference image: {ref['description']}")
+            
+                final_prompt = ". ".join(prompt_parts) if prompt_parts else "Generate an image based on the provided references"
+            
+                await outbound.status(message.chat.id, lambda: message.answer(f"🎨 Генерирую изображение по {len(images)} референсам..."), key=status_key)
+            
+                # Generate with references using new API
+                aspect_ratio = params.get('aspectRatio', '9:16')
+                resolution = params.get('resolution', '1K')
+                from services.image_router import ImageRequest, image_router
+                result = await image_router.generate(ImageRequest(
+                    final_prompt,
+                    aspect_ratio=aspect_ratio,
+                    references=images,
+                    resolution=resolution
+                ))
+                image_bytes = result.images[0] if result.images else None
+            
+                if image_bytes:
+                    from aiogram.types import BufferedInputFile
+                    from services.media import prepare_image
+                    from bot.keyboards import download_keyboard
+                    elapsed = generation_ms()
+                    delivery = await prepare_image(image_bytes, name="ref_generated")
+                    spec = await job_specs.save(JobSpec(
+                        user_id, action_type, final_prompt, aspect_ratio=aspect_ratio, resolution=resolution,
+                        reference_ids=reference_ids, output_ids=[delivery.original_id]
+                    ))
+                    photo_file = BufferedInputFile(delivery.photo, filename=delivery.photo_filename)
+                    await outbound.result(message.chat.id, lambda: message.answer_photo(
+                        photo=photo_file, 
+                        caption=f"✨ Готово по референсам!\nИзображений: {len(images)}\nСоотношение: {aspect_ratio}\nРазрешение: {resolution}",
+                        reply_markup=download_keyboard(delivery.original_id, spec.id)
+                    ))
+                    record_generations_later(
+                        user_id, action_type, final_prompt, params, result.model,
+                        [{"artifact_id": delivery.original_id, "thumbnail_id": delivery.thumbnail_id}],
+                        queue_ms=queue_ms, generation_ms=elapsed
+                    )
+                else:
+                    await outbound.result(message.chat.id, lambda: message.answer("❌ Не удалось сгенерировать финальное изображение."))
+
+            elif action_type == 'video':
+                from services.container import container
+                veo_service = await container.aget("veo")
+            
+                model_id = settings.MODELS['video']
+                await outbound.status(message.chat.id, lambda: message.answer("🎥 Запускаю видео-генерацию (Veo)...\nЭто займет 1-2 минуты. Пожалуйста, подождите."), key=status_key)
+            
+                video_bytes = await veo_service.generate_video(prompt)
+            
+                if video_bytes:
+                    from aiogram.types import BufferedInputFile
+                    from services.storage import blob_store
+                    elapsed = generation_ms()
+                    blob_id = await blob_store.put(video_bytes, "mp4")
+                    video_file = BufferedInputFile(video_bytes, filename="generated_video.mp4")
+                    await outbound.result(message.chat.id, lambda: message.answer_video(video=video_file, caption=f"🎬 Ваше видео готово!\nПромт: <i>{safe_prompt}</i>"))
+                    record_generations_later(
+                        user_id, action_type, prompt, params, model_id,
+                        [{"artifact_id": blob_id, "thumbnail_id": None}],
+                        queue_ms=queue_ms, generation_ms=elapsed
+                    )
+                else:
+                    await outbound.result(message.chat.id, lambda: message.answer("❌ Не удалось сгенерировать видео. \nВозможно, временная ошибка API или лимит генераций."))
 
+    except Overloaded as e:
+        retry_after = e.retry_after
+        await outbound.result(message.chat.id, lambda: message.answer(f"⏳ Сервис перегружен. Попробуйте через {retry_after} сек."))
     except Exception as e:
         logger.exception("Error in webapp_data handler")
-        await message.answer(f"❌ Системная ошибка: {str(e)}")
+        # The send may run after this block exits (retries), when `e` is already unbound
+        error_text = f"❌ Системная ошибка: {str(e)}"
+        await outbound.result(message.chat.id, lambda: message.answer(error_text))
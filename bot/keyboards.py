@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from services.storage import blob_store
+
+
+def _rerun_button(spec_id: str) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text="🔁 Повторить", callback_data=f"rr:{spec_id}")
+
+
+def download_keyboard(original_id: str, spec_id: Optional[str] = None) -> InlineKeyboardMarkup:
+    """
+    Inline keyboard under a delivered image with the "download original" action
+    and, when the job spec is stored, rerun / variation actions.
+    """
+    rows = [[InlineKeyboardButton(text="📥 Скачать оригинал", callback_data=f"dl:{blob_store.short_id(original_id)}")]]
+    if spec_id:
+        rows.append([_rerun_button(spec_id), InlineKeyboardButton(text="🎲 Вариация", callback_data=f"vr:{spec_id}:0")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def variants_download_keyboard(original_ids: List[str], spec_id: Optional[str] = None) -> InlineKeyboardMarkup:
+    """
+    One "download original" button per variant of a media group
+    (media groups cannot carry a keyboard themselves), plus rerun and
+    per-variant variation buttons when the job spec is stored.
+    """
+    rows = [[
+        InlineKeyboardButton(text=f"📥 {i}", callback_data=f"dl:{blob_store.short_id(original_id)}")
+        for i, original_id in enumerate(original_ids, 1)
+    ]]
+    if spec_id:
+        rows.append([
+            InlineKeyboardButton(text=f"🎲 {i}", callback_data=f"vr:{spec_id}:{i - 1}")
+            for i in range(1, len(original_ids) + 1)
+        ])
+        rows.append([_rerun_button(spec_id)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -1,13 +1,16 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
+from aiogram import Dispatcher
 
+from bot.client import create_bot
+from bot.dispatcher import create_dispatcher
+from bot.update_queue import MemoryUpdateQueue, get_update_queue
+from bot.worker import start_workers, stop_workers
 from config.settings import settings
+from config.logging_setup import setup_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 async def main():
@@ -17,42 +20,56 @@ async def main():
         logger.error("BOT_TOKEN is not set!")
         return
 
-    bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher()
+    if settings.BOT_MODE == "webhook":
+        logger.error("BOT_MODE is 'webhook': updates are served by the API process (api/main.py).")
+        return
 
-    @dp.update.outer_middleware
-    async def log_update_middleware(handler, event, data):
-        if event.message:
-            print(f"DEBUG: Received message: {event.message.content_type}")
-            if event.message.web_app_data:
-                print(f"DEBUG: WebApp Data: {event.message.web_app_data.data}")
-        return await handler(event, data)
+    bot = create_bot()
+    dp = create_dispatcher()
 
-    from bot.handlers.admin import router as admin_router
-    dp.include_router(admin_router)
+    worker_tasks = []
+    queue = get_update_queue()
+    if queue is not None:
+        # Ingest mode: this process only polls and publishes; shard workers run the handlers
+        ingest = Dispatcher()
 
-    from bot.handlers.webapp_data import router as webapp_data_router
-    dp.include_router(webapp_data_router)
+        @ingest.update.outer_middleware
+        async def publish_update_middleware(handler, event, data):
+            await queue.publish(event.model_dump(mode="json", by_alias=True, exclude_none=True))
 
-    from bot.handlers.common import router as common_router
-    dp.include_router(common_router)
+        if isinstance(queue, MemoryUpdateQueue):
+            worker_tasks = start_workers(bot, dp, queue, list(range(queue.shards)))
+        polling_dp = ingest
+    else:
+        polling_dp = dp
 
     from database.db import init_db
     await init_db()
 
     try:
-        # Drops pending updates and ensures the bot starts fresh
+        # Drops pending updates and ensures the bot starts fresh (polling mode for development)
         await bot.delete_webhook(drop_pending_updates=True)
         
         # Note: We are using sendData which requires the ReplyKeyboardMarkup from common.py
         # This is the primary and only interactive entry point for the Mini App.
 
+        # Build provider clients in the background while updates are already served
+        from services.container import container
+        container.start_warm_up()
+
     # Start polling
         logger.info("Start polling")
-        await dp.start_polling(bot)
+        await polling_dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     except Exception as e:
-        logger.error(f"Error starting bot: {e}")
+        logger.error("Error starting bot: %s", e)
     finally:
+        from services.outbound import outbound
+        from services.semantic_cache import faq_cache
+        from services.history import drain_history
+        await stop_workers(worker_tasks)
+        await outbound.stop(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await drain_history(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await faq_cache.save()
         await bot.session.close()
 
 if __name__ == "__main__":
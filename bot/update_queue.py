@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Extends or deletes a shard lease only while it still holds our token
+_RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def update_chat_id(update: dict) -> int:
+    """
+    Extracts the partition key (chat id, or user id for chatless events) from a raw update.
+    """
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+        user = event.get("from") or event.get("user")
+        if user and "id" in user:
+            return int(user["id"])
+    return 0
+
+
+class UpdateQueue(ABC):
+    """
+    Queue of raw Telegram updates partitioned by chat id.
+    All updates of one chat land in the same shard, so per-chat ordering is kept.
+    """
+
+    def __init__(self, shards: int):
+        self.shards = shards
+
+    def shard_for(self, update: dict) -> int:
+        return abs(update_chat_id(update)) % self.shards
+
+    @abstractmethod
+    async def publish(self, update: dict):
+        ...
+
+    @abstractmethod
+    async def get(self, shard: int, timeout: float = 5.0) -> Optional[Tuple[dict, Any]]:
+        """
+        Returns (update, receipt) for the next update of a shard, or None after `timeout` seconds.
+        """
+
+    async def ack(self, shard: int, receipt: Any):
+        """
+        Marks an update as processed.
+        """
+
+    async def acquire(self, shard: int) -> bool:
+        """
+        Claims exclusive ownership of a shard. False if another worker holds it.
+        """
+        return True
+
+    async def renew(self, shard: int) -> bool:
+        """
+        Extends the ownership of a shard. False if it has been lost.
+        """
+        return True
+
+    async def release(self, shard: int):
+        """
+        Gives up the ownership of a shard.
+        """
+
+    async def recover(self, shard: int):
+        """
+        Requeues updates left unacknowledged by a previous worker of this shard.
+        Only called by the worker holding the shard.
+        """
+
+
+class MemoryUpdateQueue(UpdateQueue):
+    """
+    In-process stand-in for development and tests. Nothing survives the process:
+    updates still queued, or cancelled in flight when a worker stops, are lost.
+    """
+
+    def __init__(self, shards: int):
+        super().__init__(shards)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(shards)]
+        self._owned: Set[int] = set()
+
+    async def publish(self, update: dict):
+        await self._queues[self.shard_for(update)].put(update)
+
+    async def get(self, shard: int, timeout: float = 5.0) -> Optional[Tuple[dict, Any]]:
+        try:
+            return await asyncio.wait_for(self._queues[shard].get(), timeout), None
+        except TimeoutError:
+            return None
+
+    async def acquire(self, shard: int) -> bool:
+        if shard in self._owned:
+            return False
+        self._owned.add(shard)
+        return True
+
+    async def release(self, shard: int):
+        self._owned.discard(shard)
+
+
+class RedisUpdateQueue(UpdateQueue):
+    """
+    Redis lists per shard. Items are moved to a processing list while handled
+    and removed on ack, so a crashed worker's updates are redelivered on restart.
+    A shard is owned through a lease key (SET NX PX, renewed by the worker), so
+    two workers never consume, or recover, the same shard at once.
+    """
+
+    def __init__(self, shards: int, lease_ttl: float, prefix: str = "rm:updates"):
+        super().__init__(shards)
+        self.lease_ttl = lease_ttl
+        self.prefix = prefix
+        self.owner = uuid.uuid4().hex
+        self._renew_script = None
+        self._release_script = None
+
+    def _key(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}"
+
+    def _processing_key(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}:processing"
+
+    def _lease_key(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}:lease"
+
+    async def publish(self, update: dict):
+        from database.redis import get_redis
+        await get_redis().lpush(self._key(self.shard_for(update)), json.dumps(update))
+
+    async def get(self, shard: int, timeout: float = 5.0) -> Optional[Tuple[dict, Any]]:
+        from database.redis import get_redis
+        raw = await get_redis().blmove(
+            self._key(shard), self._processing_key(shard), timeout, "RIGHT", "LEFT"
+        )
+        if raw is None:
+            return None
+        return json.loads(raw), raw
+
+    async def ack(self, shard: int, receipt: Any):
+        from database.redis import get_redis
+        await get_redis().lrem(self._processing_key(shard), 1, receipt)
+
+    async def acquire(self, shard: int) -> bool:
+        from database.redis import get_redis
+        return bool(await get_redis().set(
+            self._lease_key(shard), self.owner, nx=True, px=int(self.lease_ttl * 1000)
+        ))
+
+    async def renew(self, shard: int) -> bool:
+        if self._renew_script is None:
+            from database.redis import get_redis
+            self._renew_script = get_redis().register_script(_RENEW_LEASE_LUA)
+        return bool(await self._renew_script(
+            keys=[self._lease_key(shard)], args=[self.owner, int(self.lease_ttl * 1000)]
+        ))
+
+    async def release(self, shard: int):
+        if self._release_script is None:
+            from database.redis import get_redis
+            self._release_script = get_redis().register_script(_RELEASE_LEASE_LUA)
+        await self._release_script(keys=[self._lease_key(shard)], args=[self.owner])
+
+    async def recover(self, shard: int):
+        from database.redis import get_redis
+        redis = get_redis()
+        count = 0
+        while await redis.lmove(self._processing_key(shard), self._key(shard), "LEFT", "RIGHT"):
+            count += 1
+        if count:
+            logger.warning("Requeued %s unacknowledged updates for shard %s", count, shard)
+
+
+_queues: Dict[str, UpdateQueue] = {}
+
+
+def get_update_queue() -> Optional[UpdateQueue]:
+    """
+    Returns the configured update queue, or None when updates are processed inline.
+    """
+    backend = settings.UPDATE_QUEUE
+    if not backend:
+        return None
+    if backend not in _queues:
+        if backend == "redis":
+            _queues[backend] = RedisUpdateQueue(settings.UPDATE_SHARDS, lease_ttl=settings.WORKER_LEASE_TTL)
+        elif backend == "memory":
+            _queues[backend] = MemoryUpdateQueue(settings.UPDATE_SHARDS)
+        else:
+            raise ValueError(f"Unknown UPDATE_QUEUE backend: {backend}")
+    return _queues[backend]
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set
+
+from aiogram import Bot, Dispatcher
+
+from bot.update_queue import UpdateQueue, get_update_queue, update_chat_id
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ShardWorker:
+    """
+    Consumes one shard of the update queue and runs the regular Dispatcher on it.
+    Updates of the same chat are handled strictly in order; different chats run
+    concurrently (up to WORKER_CONCURRENCY), so a long generation in one chat
+    does not stall the rest of the shard.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, queue: UpdateQueue, shard: int):
+        self.bot = bot
+        self.dp = dp
+        self.queue = queue
+        self.shard = shard
+        self._lanes: Dict[int, asyncio.Queue] = {}
+        self._lane_tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(settings.WORKER_CONCURRENCY)
+        self._stopping = False
+
+    async def run(self):
+        if not await self.queue.acquire(self.shard):
+            logger.error("Shard %s is owned by another worker; not consuming it", self.shard)
+            return
+        try:
+            # Safe only while we hold the shard: the processing list is ours alone
+            await self.queue.recover(self.shard)
+            logger.info("Worker for shard %s started", self.shard)
+            renew_at = time.monotonic() + settings.WORKER_LEASE_TTL / 3
+            while not self._stopping:
+                if time.monotonic() >= renew_at:
+                    if not await self.queue.renew(self.shard):
+                        logger.error("Lost the lease on shard %s; stopping its worker", self.shard)
+                        # Another worker may already be recovering the shard: drop in-flight work now
+                        await self._stop_lanes(timeout=0)
+                        return
+                    renew_at = time.monotonic() + settings.WORKER_LEASE_TTL / 3
+                item = await self.queue.get(self.shard, timeout=min(5.0, settings.WORKER_LEASE_TTL / 3))
+                if item is None:
+                    continue
+                update, receipt = item
+                chat_id = update_chat_id(update)
+
+                lane = self._lanes.get(chat_id)
+                if lane is None:
+                    lane = self._lanes[chat_id] = asyncio.Queue()
+                    task = asyncio.create_task(self._run_lane(chat_id, lane))
+                    self._lane_tasks.add(task)
+                    task.add_done_callback(self._lane_tasks.discard)
+                await lane.put((update, receipt))
+        finally:
+            # No lane may ack after the shard is released and possibly recovered elsewhere
+            await self._stop_lanes(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+            await self.queue.release(self.shard)
+
+    async def _stop_lanes(self, timeout: float):
+        """
+        Lets in-flight lanes finish for up to `timeout` seconds, then cancels the rest.
+        Cancelled updates stay unacknowledged, so the next owner of the shard redelivers them.
+        """
+        if not self._lane_tasks:
+            return
+        lanes = set(self._lane_tasks)
+        if timeout > 0:
+            _, lanes = await asyncio.wait(lanes, timeout=timeout)
+        for task in lanes:
+            task.cancel()
+        await asyncio.gather(*lanes, return_exceptions=True)
+        self._lanes.clear()
+
+    async def _run_lane(self, chat_id: int, lane: asyncio.Queue):
+        async with self._slots:
+            while not lane.empty():
+                update, receipt = lane.get_nowait()
+                try:
+                    await self.dp.feed_raw_update(self.bot, update)
+                except Exception:
+                    logger.exception("Failed to process update %s", update.get("update_id"))
+                # Not acknowledged when cancelled: the update is redelivered after recovery
+                await self.queue.ack(self.shard, receipt)
+        self._lanes.pop(chat_id, None)
+
+    def stop(self):
+        self._stopping = True
+
+
+def start_workers(bot: Bot, dp: Dispatcher, queue: UpdateQueue, shards: List[int]) -> List[asyncio.Task]:
+    """
+    Starts shard workers inside the current process.
+    """
+    return [asyncio.create_task(ShardWorker(bot, dp, queue, shard).run()) for shard in shards]
+
+
+async def stop_workers(tasks: List[asyncio.Task]):
+    """
+    Cancels workers started by start_workers and waits until their shards are released.
+    """
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main(shards: Optional[List[int]] = None):
+    from bot.client import create_bot
+    from bot.dispatcher import create_dispatcher
+    from database.db import init_db
+    from services.outbound import outbound
+
+    queue = get_update_queue()
+    if queue is None:
+        logger.error("UPDATE_QUEUE is not set; nothing to consume.")
+        return
+
+    shards = shards if shards is not None else list(range(queue.shards))
+    bot = create_bot()
+    dp = create_dispatcher()
+    await init_db()
+
+    from services.container import container
+    container.start_warm_up()
+
+    try:
+        await asyncio.gather(*start_workers(bot, dp, queue, shards))
+    finally:
+        from services.history import drain_history
+        await outbound.stop(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await drain_history(timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await bot.session.close()
+
+
+def _parse_shards(value: str) -> Optional[List[int]]:
+    if value == "all":
+        return None
+    return [int(s) for s in value.split(",")]
+
+
+if __name__ == "__main__":
+    from config.logging_setup import setup_logging
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Project_RM update worker")
+    parser.add_argument("--shards", default="all", help="Comma-separated shard ids or 'all'")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(_parse_shards(args.shards)))
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")
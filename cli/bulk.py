@@ -0,0 +1,363 @@
+"""
+Bulk generation from a JSONL manifest.
+
+Each line is one job:
+    {"id": "promo-01", "type": "image", "prompt": "...", "params": {"aspectRatio": "9:16"}}
+    {"type": "image", "fields": {"subject": "Кот в костюме", "style": "Киберпанк"}}
+    {"type": "reference", "prompt": "...", "references": [{"path": "ref.jpg", "description": "character"}]}
+    {"type": "video", "prompt": "..."}
+    {"type": "text", "prompt": "..."}
+
+Results are written to the output directory; finished ids are appended to
+checkpoint.jsonl there, so re-running the same command resumes the batch.
+
+    python -m cli.bulk campaign.jsonl --out out/campaign --concurrency 4 --rate 0.5
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from services.limits import Overloaded
+from services.outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPES = ("text", "image", "reference", "video")
+CHECKPOINT_FILE = "checkpoint.jsonl"
+REPORT_FILE = "report.json"
+
+
+def job_id(job: Dict[str, Any]) -> str:
+    """
+    Explicit "id", or a hash of the job, so ids survive edits elsewhere in the manifest.
+    """
+    if job.get("id"):
+        return str(job["id"])
+    payload = json.dumps(job, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def read_manifest(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line_no, json.loads(line)
+
+
+def load_checkpoint(path: str, retry_failed: bool) -> Set[str]:
+    """
+    Ids already finished by a previous run.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn last line of an interrupted run
+                continue
+            if record["status"] == "ok" or not retry_failed:
+                done.add(record["id"])
+            else:
+                done.discard(record["id"])
+    return done
+
+
+def _image_ext(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+async def _load_references(references: List[dict], base_dir: str) -> Tuple[list, List[dict]]:
+    import aiohttp
+    from PIL import Image
+
+    images, used = [], []
+    async with aiohttp.ClientSession() as session:
+        for ref in references:
+            try:
+                if ref.get("path"):
+                    data = await asyncio.to_thread(_read_file, os.path.join(base_dir, ref["path"]))
+                elif ref.get("url"):
+                    async with session.get(ref["url"]) as resp:
+                        resp.raise_for_status()
+                        data = await resp.read()
+                else:
+                    continue
+            except Exception as e:
+                logger.error("Failed to load reference %s: %s", ref, e)
+                continue
+            images.append(Image.open(io.BytesIO(data)))
+            used.append(ref)
+    return images, used
+
+
+async def run_job(job: Dict[str, Any], out_dir: str, name: str, base_dir: str) -> str:
+    """
+    Runs one job and returns the output file name. Raises on failure.
+    """
+    from services.container import container
+    from services.image_router import ImageRequest, image_router
+
+    action_type = job.get("type")
+    params = job.get("params", {})
+    prompt = job.get("prompt") or ""
+    if job.get("fields"):
+        from services.prompt_compiler import prompt_compiler
+        prompt = prompt_compiler.compile(job["fields"]).text()
+
+    if action_type == "text":
+        result = await (await container.aget("gemini")).generate_text(prompt, task=job.get("task", "chat"))
+        data, ext = (result.encode("utf-8"), "txt") if result else (None, None)
+
+    elif action_type == "image":
+        result = await image_router.generate(ImageRequest(prompt, aspect_ratio=params.get("aspectRatio", "1:1")))
+        data = result.images[0] if result.images else None
+        ext = _image_ext(data) if data else None
+
+    elif action_type == "reference":
+        images, used = await _load_references(job.get("references", []), base_dir)
+        if not images and not prompt:
+            raise ValueError("No references could be loaded and no prompt given")
+        parts = [prompt] if prompt else []
+        parts += [f"From reference image: {ref['description']}" for ref in used if ref.get("description")]
+        result = await image_router.generate(ImageRequest(
+            ". ".join(parts) or "Generate an image based on the provided references",
+            aspect_ratio=params.get("aspectRatio", "9:16"),
+            references=images,
+            resolution=params.get("resolution", "1K"),
+        ))
+        data = result.images[0] if result.images else None
+        ext = _image_ext(data) if data else None
+
+    elif action_type == "video":
+        data = await (await container.aget("veo")).generate_video(prompt)
+        ext = "mp4"
+
+    else:
+        raise ValueError(f"Unknown job type: {action_type!r} (expected one of {', '.join(JOB_TYPES)})")
+
+    if not data:
+        raise RuntimeError("Generation returned no result")
+
+    filename = f"{name}.{ext}"
+    path = os.path.join(out_dir, filename)
+    await asyncio.to_thread(_write_atomic, path, data)
+    return filename
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _safe_name(value: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in value)[:80]
+
+
+class BulkRunner:
+    """
+    Streams the manifest through `concurrency` workers. Job starts are spaced by a
+    token bucket (`rate` per second); jobs rejected with Overloaded are retried
+    after the suggested delay.
+    """
+
+    def __init__(self, manifest: str, out_dir: str, concurrency: int, rate: float,
+                 max_attempts: int = 3, retry_failed: bool = True):
+        self.manifest = manifest
+        self.out_dir = out_dir
+        self.base_dir = os.path.dirname(os.path.abspath(manifest))
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.max_attempts = max_attempts
+        self.retry_failed = retry_failed
+        self.checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self._rate_lock = asyncio.Lock()
+        self._checkpoint = None
+        self.results: List[dict] = []
+        self.skipped = 0
+
+    async def _throttle(self):
+        async with self._rate_lock:
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.bucket.consume()
+
+    def _append_checkpoint(self, line: str):
+        self._checkpoint.write(line)
+        self._checkpoint.flush()
+
+    async def _record(self, record: dict):
+        await asyncio.to_thread(self._append_checkpoint, json.dumps(record, ensure_ascii=False) + "\n")
+        self.results.append(record)
+
+    async def _process(self, item_id: str, job: Dict[str, Any]):
+        started = time.monotonic()
+        output, error = None, None
+        for attempt in range(1, self.max_attempts + 1):
+            await self._throttle()
+            try:
+                output = await run_job(job, self.out_dir, _safe_name(item_id), self.base_dir)
+                break
+            except Overloaded as e:
+                error = str(e)
+                if attempt < self.max_attempts:
+                    logger.warning("%s: overloaded, retrying in %ss (%s/%s)", item_id, e.retry_after, attempt, self.max_attempts)
+                    await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                error = str(e)
+                break
+
+        latency = round(time.monotonic() - started, 3)
+        status = "ok" if output else "failed"
+        await self._record({
+            "id": item_id,
+            "type": job.get("type"),
+            "status": status,
+            "output": output,
+            "latency": latency,
+            "error": None if output else error,
+        })
+        logger.info("%s: %s in %.1fs%s", item_id, status, latency, "" if output else f" ({error})")
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                await self._process(*item)
+            finally:
+                queue.task_done()
+
+    async def run(self) -> dict:
+        # File I/O goes through threads so a slow disk doesn't stall the workers' API calls
+        await asyncio.to_thread(os.makedirs, self.out_dir, exist_ok=True)
+        done = await asyncio.to_thread(load_checkpoint, self.checkpoint_path, self.retry_failed)
+        if done:
+            logger.info("Resuming: %s items already finished", len(done))
+
+        # Bounded, so the manifest is streamed rather than loaded at once
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.monotonic()
+        self._checkpoint = await asyncio.to_thread(open, self.checkpoint_path, "a", encoding="utf-8")
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            seen: Set[str] = set()
+            for line_no, job in read_manifest(self.manifest):
+                item_id = job_id(job)
+                if item_id in seen:
+                    logger.warning("Line %s: duplicate id %s, skipped", line_no, item_id)
+                    continue
+                seen.add(item_id)
+                if item_id in done:
+                    self.skipped += 1
+                    continue
+                await queue.put((item_id, job))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await asyncio.to_thread(self._checkpoint.close)
+
+        report = build_report(self.results, self.skipped, time.monotonic() - started)
+        data = json.dumps(report, indent=2).encode("utf-8")
+        await asyncio.to_thread(_write_atomic, os.path.join(self.out_dir, REPORT_FILE), data)
+        return report
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 3)
+
+
+def build_report(results: List[dict], skipped: int, elapsed: float) -> dict:
+    ok = [r for r in results if r["status"] == "ok"]
+    by_type: Dict[str, dict] = {}
+    for action_type in sorted({r["type"] or "?" for r in results}):
+        latencies = [r["latency"] for r in ok if (r["type"] or "?") == action_type]
+        by_type[action_type] = {
+            "ok": len(latencies),
+            "failed": sum(1 for r in results if (r["type"] or "?") == action_type and r["status"] != "ok"),
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "max": max(latencies) if latencies else None,
+        }
+    return {
+        "processed": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "skipped": skipped,
+        "elapsed": round(elapsed, 1),
+        "throughput_per_min": round(len(ok) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "latency": by_type,
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"\nProcessed {report['processed']} items in {report['elapsed']}s "
+        f"({report['ok']} ok, {report['failed']} failed, {report['skipped']} already done)"
+    )
+    print(f"Throughput: {report['throughput_per_min']} items/min")
+    for action_type, stats in report["latency"].items():
+        print(
+            f"  {action_type:<10} ok={stats['ok']:<4} failed={stats['failed']:<4} "
+            f"p50={stats['p50']}s p95={stats['p95']}s max={stats['max']}s"
+        )
+
+
+async def main(args: argparse.Namespace):
+    runner = BulkRunner(
+        args.manifest,
+        args.out,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        max_attempts=args.attempts,
+        retry_failed=not args.skip_failed,
+    )
+    print_report(await runner.run())
+
+
+if __name__ == "__main__":
+    from config.logging_setup import setup_logging
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Project_RM bulk generation")
+    parser.add_argument("manifest", help="JSONL file with one job per line")
+    parser.add_argument("--out", required=True, help="Output directory (holds the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Jobs in flight")
+    parser.add_argument("--rate", type=float, default=1.0, help="Job starts per second")
+    parser.add_argument("--attempts", type=int, default=3, help="Attempts per job when overloaded")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry items that failed in a previous run")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        logger.info("Interrupted; re-run the same command to resume")
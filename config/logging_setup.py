@@ -0,0 +1,174 @@
+"""
+Process-wide logging: records go through a bounded queue to a background
+writer thread, so a log call on the event loop never waits for I/O.
+
+- Messages are formatted in the writer thread (use %-style arguments:
+  ``logger.info("Stored %s", blob_id)``), so the caller only builds the record.
+- Output is one JSON object per line (LOG_FORMAT="json") or plain text.
+- Records carry the correlation id of the update / request being handled.
+- Records below WARNING can be sampled per logger prefix (LOG_SAMPLING) and
+  every message and extra field is truncated to LOG_MAX_FIELD_CHARS.
+- When the queue is full, records are dropped and counted instead of blocking.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar, Token
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config.settings import settings
+
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "correlation_id"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def bind_correlation_id(value) -> Token:
+    """
+    Tags records logged from the current task (and tasks it spawns) with `value`.
+    """
+    return correlation_id.set(str(value))
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit})"
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a share of sub-WARNING records per logger prefix, e.g. {"aiogram.event": 0.1}.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            # Longest matching prefix wins
+            for prefix in sorted(self.rates, key=len, reverse=True):
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = self.rates[prefix]
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueues records unformatted (formatting happens in the writer thread)
+    and drops them when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.correlation_id = correlation_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _truncate(record.getMessage(), self.max_chars),
+        }
+        if getattr(record, "correlation_id", None):
+            payload["cid"] = record.correlation_id
+        for key, value in record.__dict__.items():
+            if key in _STANDARD_ATTRS or key.startswith("_"):
+                continue
+            if value is None or isinstance(value, (bool, int, float)):
+                payload[key] = value
+            else:
+                payload[key] = _truncate(str(value), self.max_chars)
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, max_chars: int):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+        self.max_chars = max_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _truncate(record.message, self.max_chars)
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = None
+        return super().formatMessage(record)
+
+
+def setup_logging():
+    """
+    Routes the root logger through the queue. Idempotent; call once at process start.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter(settings.LOG_MAX_FIELD_CHARS))
+    else:
+        stream.setFormatter(TextFormatter(settings.LOG_MAX_FIELD_CHARS))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(settings.LOG_LEVEL)
+    # SQL statements are logged only when explicitly enabled (see DB_ECHO)
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if settings.DB_ECHO else logging.WARNING)
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Flushes queued records and stops the writer thread.
+    """
+    global _listener
+    if _listener is None:
+        return
+    if _handler is not None and _handler.dropped:
+        logging.getLogger(__name__).warning("Dropped %d log records (queue full)", _handler.dropped)
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,112 @@
+# Local prompt compilation for UI_CONFIG selections (services/prompt_compiler.py)
+
+# Order of fields in the compiled prompt and the phrase each value is placed into.
+# Fields of UI_CONFIG that are missing here fail validation at startup.
+FIELD_TEMPLATES = {
+    "subject": "{}",
+    "action": "{}",
+    "environment": "{}",
+    "time_of_day": "{}",
+    "style": "{} style",
+    "atmosphere": "{} atmosphere",
+    "materials": "{} texture",
+    "lighting": "{} lighting",
+    "colors": "{} color palette",
+    "camera_angle": "{} shot",
+    "shot_size": "{}",
+    "focus": "{}",
+}
+
+# Multi-select fields whose values form the negative prompt
+NEGATIVE_FIELDS = {"negative_prompt"}
+
+QUALITY_SUFFIX = "high quality, highly detailed"
+
+# Per-field translations, for options whose phrasing depends on the field
+# ("Золотой час" is a time of day here and a lighting setup elsewhere)
+FIELD_TRANSLATIONS = {
+    "time_of_day": {
+        "Рассвет (Dawn)": "at dawn",
+        "Утро (Morning)": "in the morning",
+        "Золотой час (Golden Hour)": "during golden hour",
+        "Полдень (Noon)": "at noon",
+        "Закат (Sunset)": "at sunset",
+        "Синий час (Blue Hour)": "during blue hour",
+        "Сумерки (Twilight)": "at twilight",
+        "Ночь (Night)": "at night",
+    },
+}
+
+# English for option values. Options like "Глянцевый пластик (Glossy Plastic)" are
+# translated automatically from the Latin part; entries here override that or cover
+# options without one.
+OPTION_TRANSLATIONS = {
+    # subject
+    "Портрет девушки": "portrait of a young woman",
+    "Футуристический автомобиль": "a futuristic car",
+    "Кот в костюме": "a cat wearing a suit",
+    # action
+    "Стоит": "standing",
+    "Бежит": "running",
+    "Летит": "flying",
+    "Сидит": "sitting",
+    "Танцует": "dancing",
+    # environment
+    "Студийный фон": "against a seamless studio backdrop",
+    "Улица": "on a city street",
+    "Космос": "in outer space",
+    "Интерьер": "in a stylish interior",
+    "Природа": "surrounded by nature",
+    # style
+    "Фотореализм": "photorealistic",
+    "Студийное фото": "professional studio photography",
+    "3D Рендер (Pixar / Disney)": "3D render, Pixar / Disney",
+    "Киберпанк": "cyberpunk",
+    "Аниме / Манга": "anime / manga",
+    "Масляная живопись": "oil painting",
+    "Акварельный рисунок": "watercolor",
+    "Карандашный набросок": "pencil sketch",
+    "Векторная иллюстрация": "flat vector illustration",
+    "Полароид (Винтаж)": "vintage Polaroid photo",
+    # atmosphere
+    "Фэнтези": "fantasy",
+    "Минимализм": "minimalist",
+    "Ретрофутуризм": "retro-futuristic",
+    "Постапокалипсис": "post-apocalyptic",
+    "Сказочный": "fairytale",
+    # materials
+    "Реалистичная кожа (Human Skin)": "realistic human skin",
+    "Неоновые трубки (Neon Tubes)": "glowing neon tube",
+    "Мех / Пух (Fur/Fluffy)": "soft fluffy fur",
+    # lighting
+    "Объемные лучи (God Rays)": "volumetric god rays",
+    "Кинематографичное (Cinematic/Low key)": "cinematic low-key",
+    # colors
+    "Готическая (Черный/Красный)": "gothic black and red",
+    "Землистая (Коричневый/Зеленый)": "earthy brown and green",
+    "Vaporwave (Розовый/Бирюзовый)": "vaporwave pink and teal",
+    # camera_angle
+    "Вид из глаз (POV)": "first-person POV",
+    "Голландский угол (Dutch Angle/Tilt)": "Dutch angle",
+    # shot_size
+    "Экстремально крупный (Macro/Eye detail)": "extreme close-up, macro detail",
+    "Крупный план (Close-up Face)": "close-up of the face",
+    "Портрет по плечи (Portrait)": "head-and-shoulders portrait",
+    "Средний план (Medium Shot / Waist up)": "medium shot, waist up",
+    "Ковбойский план (Knees up)": "cowboy shot, knees up",
+    "Полный рост (Full Body)": "full body shot",
+    "Общий план (Wide Shot)": "wide shot",
+    "Дальний план (Extreme Long Shot)": "extreme long shot",
+    # focus
+    "Размытый фон (Bokeh / f1.8)": "shallow depth of field, bokeh background, f/1.8",
+    "Всё в резкости (Deep Focus / f22)": "deep focus, everything sharp, f/22",
+    "Тилт-шифт (Tilt-Shift / Miniature effect)": "tilt-shift miniature effect",
+    # negative_prompt
+    "Стандартный фильтр (Убрать уродства, мусор, артефакты)": "deformed, ugly, disfigured, clutter, artifacts",
+    "Без текста (Убрать водяные знаки, подписи, логотипы)": "text, watermark, signature, logo",
+    "Только HD (Убрать размытие, шум, низкое качество)": "blurry, noise, low quality, jpeg artifacts",
+    "Анатомический фильтр (Исправить пальцы, лишние конечности — для людей)": "bad hands, extra fingers, extra limbs, malformed anatomy",
+    "Композиционный (Без обрезки головы, объект в центре)": "cropped head, out of frame, off-center subject",
+    "Без людей (Только пейзаж/фон)": "people, person, humans",
+    "Без 3D/Мультяшности (Только фотореализм)": "3d render, cartoon, cgi, illustration",
+}
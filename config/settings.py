@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, List, Union
 
 class Settings(BaseSettings):
     BOT_TOKEN: str
@@ -17,22 +17,165 @@ class Settings(BaseSettings):
     
     WEBAPP_URL: Optional[str] = None
 
+    # WebApp initData auth for the /api routers (api/auth.py)
+    WEBAPP_AUTH_REQUIRED: bool = True  # False lets unauthenticated calls through (local development)
+    INIT_DATA_MAX_AGE: int = 86400  # seconds since auth_date; 0 disables the check
+    INIT_DATA_CACHE_SIZE: int = 10000
+    INIT_DATA_CACHE_TTL: int = 300  # seconds a verified initData string is trusted without re-checking
+
+    # Per-user, per-endpoint API rate limits (services/rate_limit.py), checked before
+    # any DB or upstream work. "redis" shares the buckets across API workers and
+    # falls back to per-worker buckets while Redis is unreachable; "memory" is per worker.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.05  # seconds (socket timeout); slower Redis answers fall back to local buckets
+    # "METHOD /path-prefix" (or "/path-prefix" for any method) -> requests/second and burst
+    RATE_LIMITS: Dict[str, Dict[str, float]] = {
+        "POST /api/chat": {"rate": 0.5, "burst": 5},
+        "POST /api/generate": {"rate": 0.1, "burst": 3},
+        "POST /api/enhance-prompt": {"rate": 0.5, "burst": 5},
+        "GET /api/gallery": {"rate": 2.0, "burst": 10},
+    }
+
+    # Public base URL of the API (used to build absolute media links)
+    PUBLIC_API_URL: Optional[str] = None
+
+    # Generated media storage
+    MEDIA_ROOT: str = "media"
+    MEDIA_URL_SECRET: Optional[str] = None
+    MEDIA_URL_TTL: int = 3600  # seconds
+
+    # Image delivery (chat photo / thumbnail encoding)
+    IMAGE_DELIVERY_FORMAT: str = "jpeg"  # "jpeg" or "webp"
+    IMAGE_DELIVERY_QUALITY: int = 85
+    IMAGE_DELIVERY_MAX_SIDE: int = 2560
+    THUMBNAIL_SIZE: int = 320
+    IMAGE_MAX_VARIANTS: int = 4  # variants per image request (Telegram media groups allow up to 10)
+    # Image backends in routing order of preference (services/image_router.py)
+    IMAGE_BACKENDS: List[str] = ["gemini", "imagen"]
+    IMAGE_ROUTER_EXPLORE: float = 0.05  # share of requests sent to a non-best backend
+    IMAGE_BACKEND_COOLDOWN: float = 60.0  # seconds a failing backend is skipped
+    MEDIA_WORKERS: int = 2
+    REFERENCE_MAX_SIDE: int = 1536  # downloaded references are normalized to this size
+
+    # Rerun / variation buttons: stored job specs ("memory" or "redis") and
+    # a per-process cache of decoded reference images
+    JOB_SPEC_STORE: str = "memory"
+    JOB_SPEC_TTL: int = 86400  # seconds the buttons under a result keep working
+    ARTIFACT_CACHE_SIZE: int = 64  # decoded images
+    ARTIFACT_CACHE_TTL: int = 1800  # seconds
+
+    # Outbound Telegram rate limits (messages per second). The global rate is
+    # enforced per process: split Telegram's 30/s across all sending processes
+    TG_GLOBAL_RATE: float = 30.0
+    TG_CHAT_RATE: float = 1.0
+    TG_CHAT_BURST: float = 3.0
+
+    # Bot HTTP client
+    BOT_HTTP_POOL_SIZE: int = 100
+    BOT_HTTP_KEEPALIVE: float = 60.0  # seconds
+    SHUTDOWN_DRAIN_TIMEOUT: float = 10.0  # seconds
+
+    # Update delivery: "polling" (bot/main.py, development) or "webhook" (served by the API)
+    BOT_MODE: str = "polling"
+    WEBHOOK_SECRET: Optional[str] = None
+
+    # Sharded update processing: None (inline), "memory" (local stand-in) or "redis"
+    UPDATE_QUEUE: Optional[str] = None
+    UPDATE_SHARDS: int = 4
+    WORKER_CONCURRENCY: int = 32  # concurrent chats per worker process
+    WORKER_LEASE_TTL: float = 30.0  # seconds; a dead worker's shards are free again after this
+
+    # Generation admission (per process): total slots, per-user in-flight limit
+    GENERATION_CAPACITY: int = 8
+    GENERATION_PER_USER: int = 1
+    # Weight > 1 gives users with balance >= threshold a larger fair share
+    PAID_PRIORITY_WEIGHT: float = 1.0
+    PAID_BALANCE_THRESHOLD: int = 100
+
+    # Adaptive (AIMD) concurrency per upstream model
+    MODEL_CONCURRENCY_INITIAL: int = 4
+    MODEL_CONCURRENCY_MIN: int = 1
+    MODEL_CONCURRENCY_MAX: int = 32
+    MODEL_MAX_QUEUE_WAIT: float = 60.0  # seconds; longer estimated waits get 503
+
+    # Text generation resilience
+    TEXT_DEADLINE: float = 60.0  # seconds, across all attempts
+    TEXT_RETRIES: int = 2
+    TEXT_HEDGING: bool = False  # fire a second request after the p95 latency
+    HEDGE_DEFAULT_DELAY: float = 8.0  # seconds, until enough latency samples exist
+    RETRY_BASE_BACKOFF: float = 0.5
+    RETRY_MAX_BACKOFF: float = 8.0
+    BREAKER_FAILURES: int = 5
+    BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # Upstream context caching of static prompt prefixes
+    CONTEXT_CACHE_ENABLED: bool = True
+    CONTEXT_CACHE_PROVIDER: str = "gemini"  # "gemini" or "fake" (local, for tests)
+    CONTEXT_CACHE_TTL: int = 3600  # seconds
+    CONTEXT_CACHE_MIN_TOKENS: int = 1024  # smaller prefixes are rejected upstream
+
+    # Generation job status (GET /api/generate/{job_id}): "memory" (single process) or "redis"
+    JOB_REGISTRY: str = "memory"
+    JOB_TTL: int = 3600  # seconds after the last update
+    JOB_MAX_WAIT: float = 30.0  # longest accepted long-poll, seconds
+
+    # Server-side chat sessions: "memory" (single process) or "redis"
+    CHAT_SESSION_STORE: str = "memory"
+    CHAT_SESSION_IDLE_TTL: int = 3600  # seconds without messages before a session expires
+    CHAT_CONTEXT_BUDGET: int = 4000  # tokens of recent turns sent with each message
+    CHAT_SESSION_MAX_TURNS: int = 100
+
+    # Semantic FAQ cache for first chat turns
+    FAQ_CACHE_ENABLED: bool = True
+    FAQ_CACHE_SIZE: int = 2000  # entries; least recently used are evicted
+    FAQ_SIMILARITY_THRESHOLD: float = 0.92  # cosine similarity for a hit
+    FAQ_MIN_CONFIRMATIONS: int = 3  # distinct users asking before an answer is served to others
+    FAQ_MAX_QUESTION_CHARS: int = 300
+    FAQ_CACHE_PATH: Optional[str] = "media/faq_cache.npz"
+    FAQ_SAVE_EVERY: int = 20  # new entries between saves
+    EMBEDDING_MODEL: str = "models/text-embedding-004"
+
+    # Services built in the background right after startup (services/container.py);
+    # add "redis" when a Redis backend is configured. Empty disables warm-up.
+    WARMUP_SERVICES: List[str] = ["gemini", "veo", "vertex_image", "faq_cache", "database"]
+
+    # Logging (config/logging_setup.py): queued, non-blocking writer
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped rather than blocking
+    LOG_MAX_FIELD_CHARS: int = 500  # prompts and payloads are truncated to this
+    # Share of sub-WARNING records kept per logger prefix
+    LOG_SAMPLING: Dict[str, float] = {"aiogram.event": 0.1}
+    DB_ECHO: bool = False  # log every SQL statement
+
     # Vertex AI
     VERTEX_PROJECT_ID: str = "marketing-469506"
     VERTEX_LOCATION: str = "us-central1"
     VERTEX_CREDENTIALS_PATH: str = "marketing-469506-95611014aab8.json"
 
-    # Models
-    MODELS: Dict[str, str] = {
+    # Models. Text tasks map to a route: model tier, named system instruction
+    # (config/prompts.py) and generation config (see services/routing.py)
+    MODELS: Dict[str, Union[str, Dict[str, Any]]] = {
         "text": "gemini-3-pro-preview",
         "image": "gemini-3-pro-image-preview",
-        "video": "veo-3.1-fast-generate-001"
+        "imagen": "imagen-3.0-generate-002",
+        "video": "veo-3.1-fast-generate-001",
+        "chat": {"model": "gemini-3-pro-preview", "instruction": "persona", "max_output_tokens": 2048},
+        "multimodal": {"model": "gemini-3-pro-preview", "instruction": "persona", "max_output_tokens": 2048},
+        "reference": {"model": "gemini-3-pro-preview", "instruction": "reference", "max_output_tokens": 512},
+        "enhance": {"model": "gemini-2.5-flash", "instruction": "enhance", "max_output_tokens": 300, "temperature": 0.7},
+        "summary": {"model": "gemini-2.5-flash", "instruction": "summary", "max_output_tokens": 512, "temperature": 0.2},
     }
 
     @property
     def database_url(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def webhook_url(self) -> str:
+        return f"{(self.PUBLIC_API_URL or '').rstrip('/')}/telegram/webhook"
+
     @property
     def redis_url(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
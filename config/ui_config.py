@@ -25,6 +25,22 @@ UI_CONFIG = {
                     "type": "select-or-type",
                     "placeholder": "Где находится?",
                     "options": ["Студийный фон", "Улица", "Космос", "Интерьер", "Природа"]
+                },
+                {
+                    "id": "time_of_day",
+                    "label": "Время суток",
+                    "type": "select-or-type",
+                    "placeholder": "Когда происходит действие?",
+                    "options": [
+                        "Рассвет (Dawn)",
+                        "Утро (Morning)",
+                        "Золотой час (Golden Hour)",
+                        "Полдень (Noon)",
+                        "Закат (Sunset)",
+                        "Синий час (Blue Hour)",
+                        "Сумерки (Twilight)",
+                        "Ночь (Night)"
+                    ]
                 }
             ]
         },
@@ -49,6 +65,22 @@ UI_CONFIG = {
                         "Полароид (Винтаж)"
                     ]
                 },
+                {
+                    "id": "atmosphere",
+                    "label": "Сеттинг/Атмосфера",
+                    "type": "select-or-type",
+                    "placeholder": "Какое настроение?",
+                    "options": [
+                        "Киберпанк",
+                        "Нуар (Noir)",
+                        "Фэнтези",
+                        "Минимализм",
+                        "Ретрофутуризм",
+                        "Уютный (Cozy)",
+                        "Постапокалипсис",
+                        "Сказочный"
+                    ]
+                },
                 {
                     "id": "materials",
                     "label": "Материалы",
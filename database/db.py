@@ -3,7 +3,9 @@ from sqlalchemy.orm import DeclarativeBase
 
 from config.settings import settings
 
-engine = create_async_engine(settings.database_url, echo=True)
+# SQL logging goes through the regular (queued) logging pipeline when DB_ECHO is set,
+# instead of echo=True, which attaches a synchronous stream handler
+engine = create_async_engine(settings.database_url)
 
 async_session_factory = async_sessionmaker(
     engine, 
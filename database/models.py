@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, BigInteger
+from sqlalchemy import Column, String, DateTime, BigInteger, Integer, Text, JSON, Index
 from sqlalchemy.sql import func
 from database.db import Base
 
@@ -19,3 +19,21 @@ class Transaction(Base):
     amount = Column(BigInteger)
     description = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Generation(Base):
+    __tablename__ = "generations"
+    # Gallery pages are read newest-first per user (keyset on created_at, id)
+    __table_args__ = (Index("ix_generations_user_created_id", "user_id", "created_at", "id"),)
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    type = Column(String(16), nullable=False)  # image / reference / video
+    prompt = Column(Text, nullable=True)
+    prompt_hash = Column(String(64), index=True)
+    params = Column(JSON, nullable=True)
+    model = Column(String, nullable=True)
+    artifact_id = Column(String, nullable=True)  # Original in the blob store
+    thumbnail_id = Column(String, nullable=True)
+    queue_ms = Column(Integer, nullable=True)
+    generation_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
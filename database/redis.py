@@ -0,0 +1,24 @@
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from config.settings import settings
+
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    """
+    Returns the process-wide Redis client (connection pooled, created on first use).
+    """
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.redis_url)
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
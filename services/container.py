@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Service singletons built on first use instead of at import time, so importing
+    a handler does not pull in every provider SDK or block on network calls.
+    `start_warm_up` builds them in parallel worker threads (plus async hooks such
+    as opening pooled connections) once the process already accepts work.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._hooks: Dict[str, Callable[[], Awaitable[None]]] = {}
+        self._pending: Set[str] = set()
+        self._failed: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def register_hook(self, name: str, hook: Callable[[], Awaitable[None]]):
+        """
+        Async warm-up step without an instance (e.g. pre-opening a connection pool).
+        """
+        self._hooks[name] = hook
+
+    def ready(self, name: str) -> bool:
+        return name in self._instances
+
+    def failed(self, name: str) -> bool:
+        """
+        True if the last warm-up of `name` raised; it is not retried automatically.
+        """
+        return name in self._failed
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the service, constructing it on first use. Thread-safe: concurrent
+        callers (request path and warm-up) wait for a single construction.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"Unknown service: {name}")
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.monotonic()
+                instance = self._factories[name]()
+                self._instances[name] = instance
+                logger.info("Service %s built in %.2fs", name, time.monotonic() - started)
+        return instance
+
+    async def aget(self, name: str) -> Any:
+        """
+        get() for the event loop: a service that is not built yet is built (or its
+        warm-up in progress awaited) in a worker thread, never on the loop itself.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get, name)
+
+    async def _warm(self, name: str):
+        started = time.monotonic()
+        try:
+            if name in self._hooks:
+                await self._hooks[name]()
+            else:
+                await asyncio.to_thread(self.get, name)
+        except Exception as e:
+            self._failed.add(name)
+            logger.warning("Warm-up of %s failed: %s", name, e)
+        else:
+            self._failed.discard(name)
+            logger.info("Warmed up %s in %.2fs", name, time.monotonic() - started)
+        finally:
+            self._pending.discard(name)
+
+    def start_warm_up(self, names: Optional[Iterable[str]] = None) -> List[asyncio.Task]:
+        """
+        Schedules warm-up of `names` (default: WARMUP_SERVICES) on the running loop
+        and returns immediately. Already built or warming services are skipped.
+        """
+        names = settings.WARMUP_SERVICES if names is None else names
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return []
+        tasks = []
+        for name in names:
+            if self.ready(name) or name in self._pending:
+                continue
+            if name not in self._factories and name not in self._hooks:
+                logger.warning("Unknown warm-up target: %s", name)
+                continue
+            self._pending.add(name)
+            task = asyncio.create_task(self._warm(name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            tasks.append(task)
+        return tasks
+
+
+def _gemini():
+    from services.gemini import GeminiService
+    return GeminiService()
+
+
+def _veo():
+    from services.veo import VeoService
+    return VeoService()
+
+
+def _vertex_image():
+    from services.vertex_image import VertexImageService
+    return VertexImageService()
+
+
+def _faq_cache():
+    from services.semantic_cache import faq_cache
+    return faq_cache
+
+
+async def _redis():
+    from database.redis import get_redis
+    await get_redis().ping()
+
+
+async def _database():
+    from sqlalchemy import text
+    from database.db import engine
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+container = ServiceContainer()
+container.register("gemini", _gemini)
+container.register("veo", _veo)
+container.register("vertex_image", _vertex_image)
+container.register("faq_cache", _faq_cache)
+container.register_hook("redis", _redis)
+container.register_hook("database", _database)
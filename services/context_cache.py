@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheHandle:
+    key: str
+    name: str
+    content: Any          # Provider object, used by CacheProvider.model
+    expires_at: float     # time.time()
+
+
+class CacheProvider(ABC):
+    """
+    Backend that stores a static prompt prefix upstream and returns a handle to it.
+    """
+
+    @abstractmethod
+    async def create(self, model: str, system_instruction: Optional[str], contents: List[Any], ttl: int) -> CacheHandle:
+        ...
+
+    @abstractmethod
+    async def refresh(self, handle: CacheHandle, ttl: int):
+        ...
+
+    @abstractmethod
+    async def delete(self, handle: CacheHandle):
+        ...
+
+    @abstractmethod
+    def model(self, handle: CacheHandle, generation_config: Optional[dict]) -> Any:
+        """
+        Builds a model bound to the cached prefix of `handle`.
+        """
+
+
+class GeminiCacheProvider(CacheProvider):
+    """
+    Gemini explicit context caching (google.generativeai.caching).
+    """
+
+    async def create(self, model, system_instruction, contents, ttl):
+        from google.generativeai import caching
+        cached = await asyncio.to_thread(
+            caching.CachedContent.create,
+            model=model,
+            system_instruction=system_instruction,
+            contents=contents or None,
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return CacheHandle(key="", name=cached.name, content=cached, expires_at=time.time() + ttl)
+
+    async def refresh(self, handle, ttl):
+        await asyncio.to_thread(handle.content.update, ttl=datetime.timedelta(seconds=ttl))
+        handle.expires_at = time.time() + ttl
+
+    async def delete(self, handle):
+        await asyncio.to_thread(handle.content.delete)
+
+    def model(self, handle, generation_config):
+        import google.generativeai as genai
+        return genai.GenerativeModel.from_cached_content(
+            cached_content=handle.content,
+            generation_config=generation_config,
+        )
+
+
+@dataclass
+class FakeCachedContent:
+    model: str
+    system_instruction: Optional[str]
+    contents: List[Any]
+
+
+class FakeCachedModel:
+    """
+    Regular model that sends the "cached" contents in front of every request,
+    so callers behave exactly as with a real cached-content model.
+    """
+
+    def __init__(self, cached: FakeCachedContent, generation_config: Optional[dict]):
+        import google.generativeai as genai
+        self.cached = cached
+        self._model = genai.GenerativeModel(
+            cached.model,
+            system_instruction=cached.system_instruction,
+            generation_config=generation_config,
+        )
+
+    async def generate_content_async(self, contents, **kwargs):
+        if isinstance(contents, str):
+            contents = [{"role": "user", "parts": [contents]}]
+        return await self._model.generate_content_async(list(self.cached.contents) + list(contents), **kwargs)
+
+
+class FakeCacheProvider(CacheProvider):
+    """
+    Local stand-in that records calls instead of contacting the API.
+    """
+
+    def __init__(self):
+        self.created: List[CacheHandle] = []
+        self.refreshed: List[str] = []
+        self.deleted: List[str] = []
+
+    async def create(self, model, system_instruction, contents, ttl):
+        handle = CacheHandle(
+            key="",
+            name=f"cachedContents/fake-{len(self.created)}",
+            content=FakeCachedContent(model, system_instruction, list(contents)),
+            expires_at=time.time() + ttl,
+        )
+        self.created.append(handle)
+        return handle
+
+    async def refresh(self, handle, ttl):
+        handle.expires_at = time.time() + ttl
+        self.refreshed.append(handle.name)
+
+    async def delete(self, handle):
+        self.deleted.append(handle.name)
+
+    def model(self, handle, generation_config):
+        return FakeCachedModel(handle.content, generation_config)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting decisions
+    return len(text) // 4
+
+
+class ContextCache:
+    """
+    Keeps upstream cached-content handles for static prompt prefixes (the persona
+    instruction, long conversation prefixes). Handles are keyed by a hash of model,
+    instruction and contents, so a config change produces a new key; the handle
+    previously used by the same slot is then deleted. Handles are refreshed before
+    their TTL runs out while in use.
+    """
+
+    def __init__(self, provider: CacheProvider, ttl: int, min_tokens: int, refresh_margin: int = 300):
+        self.provider = provider
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self._handles: Dict[str, CacheHandle] = {}
+        self._slots: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._failed_until: Dict[str, float] = {}
+
+    @staticmethod
+    def make_key(model: str, system_instruction: Optional[str], contents: List[Any]) -> str:
+        payload = json.dumps([model, system_instruction, contents], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(
+        self,
+        slot: str,
+        model: str,
+        system_instruction: Optional[str],
+        contents: Optional[List[Any]] = None,
+    ) -> Optional[CacheHandle]:
+        """
+        Returns a live handle for the prefix, creating or refreshing it as needed.
+        Returns None when the prefix is too small to cache or the provider fails.
+        """
+        contents = contents or []
+        size = estimate_tokens((system_instruction or "") + json.dumps(contents, default=str))
+        if size < self.min_tokens:
+            return None
+
+        key = self.make_key(model, system_instruction, contents)
+        if self._failed_until.get(key, 0) > time.time():
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            handle = self._handles.get(key)
+            try:
+                if handle is None or handle.expires_at <= time.time():
+                    self._purge_expired()
+                    handle = await self.provider.create(model, system_instruction, contents, self.ttl)
+                    handle.key = key
+                    self._handles[key] = handle
+                    logger.info("Created context cache %s for %s (~%s tokens)", handle.name, slot, size)
+                elif handle.expires_at - time.time() < self.refresh_margin:
+                    await self.provider.refresh(handle, self.ttl)
+            except Exception as e:
+                logger.warning("Context cache unavailable for %s: %s", slot, e)
+                self._failed_until[key] = time.time() + 300
+                self._handles.pop(key, None)
+                return None
+
+        previous = self._slots.get(slot)
+        self._slots[slot] = key
+        if previous and previous != key and previous not in self._slots.values():
+            await self._drop(previous)
+        return handle
+
+    def model(self, handle: CacheHandle, generation_config: Optional[dict] = None) -> Any:
+        """
+        Builds a model bound to a handle returned by get().
+        """
+        return self.provider.model(handle, generation_config)
+
+    def _purge_expired(self):
+        now = time.time()
+        for key in [k for k, h in self._handles.items() if h.expires_at <= now]:
+            self._handles.pop(key, None)
+            self._locks.pop(key, None)
+        for key in [k for k, until in self._failed_until.items() if until <= now]:
+            del self._failed_until[key]
+
+    async def invalidate(self, slot: str):
+        key = self._slots.pop(slot, None)
+        if key and key not in self._slots.values():
+            await self._drop(key)
+
+    async def _drop(self, key: str):
+        handle = self._handles.pop(key, None)
+        self._locks.pop(key, None)
+        if handle and handle.expires_at > time.time():
+            try:
+                await self.provider.delete(handle)
+            except Exception as e:
+                logger.warning("Failed to delete context cache %s: %s", handle.name, e)
+
+
+def _create_provider() -> CacheProvider:
+    if settings.CONTEXT_CACHE_PROVIDER == "fake":
+        return FakeCacheProvider()
+    return GeminiCacheProvider()
+
+
+context_cache = ContextCache(
+    _create_provider(),
+    ttl=settings.CONTEXT_CACHE_TTL,
+    min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS,
+)
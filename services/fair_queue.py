@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+QueuedCallback = Callable[[int], Awaitable[None]]
+
+
+@dataclass
+class _Ticket:
+    user_id: int
+    start_tag: float
+    seq: int
+    future: asyncio.Future
+
+
+class FairScheduler:
+    """
+    Admission control for expensive generations.
+    At most `per_user` jobs run per user and `capacity` in total. Waiting jobs are
+    ordered by start-time fair queueing over virtual time: each job of a user is
+    tagged `cost / weight` after that user's previous one, so ten queued jobs of
+    one user interleave with everyone else's instead of running ahead of them.
+    """
+
+    def __init__(self, capacity: int, per_user: int):
+        self.capacity = capacity
+        self.per_user = per_user
+        self._virtual_time = 0.0
+        self._last_finish: Dict[int, float] = {}
+        self._waiting: List[_Ticket] = []
+        self._running: Dict[int, int] = {}
+        self._running_total = 0
+        self._seq = itertools.count()
+
+    def position(self, ticket: _Ticket) -> int:
+        """
+        1-based position of a waiting ticket in service order.
+        """
+        key = (ticket.start_tag, ticket.seq)
+        return 1 + sum(1 for t in self._waiting if (t.start_tag, t.seq) < key)
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, weight: float = 1.0, cost: float = 1.0, on_queued: Optional[QueuedCallback] = None):
+        """
+        Waits for a free slot for `user_id`. `on_queued` is awaited with the queue position
+        if the job cannot start immediately.
+        """
+        start_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+        self._last_finish[user_id] = start_tag + cost / max(weight, 0.01)
+
+        ticket = _Ticket(user_id, start_tag, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiting.append(ticket)
+        self._dispatch()
+
+        if not ticket.future.done():
+            if on_queued:
+                try:
+                    await on_queued(self.position(ticket))
+                except Exception as e:
+                    logger.error("Failed to report queue position: %s", e)
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                else:
+                    # Slot was granted concurrently with the cancellation
+                    self._release(user_id)
+                raise
+
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def _release(self, user_id: int):
+        self._running_total -= 1
+        self._running[user_id] -= 1
+        if not self._running[user_id]:
+            del self._running[user_id]
+        if not self._waiting and not self._running:
+            # Idle: reset virtual time so tags don't grow without bound
+            self._virtual_time = 0.0
+            self._last_finish.clear()
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._running_total < self.capacity:
+            eligible = [t for t in self._waiting if self._running.get(t.user_id, 0) < self.per_user]
+            if not eligible:
+                return
+            ticket = min(eligible, key=lambda t: (t.start_tag, t.seq))
+            self._waiting.remove(ticket)
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            self._running[ticket.user_id] = self._running.get(ticket.user_id, 0) + 1
+            self._running_total += 1
+            ticket.future.set_result(None)
+
+
+async def user_weight(user_id: int) -> float:
+    """
+    Scheduling weight of a user: paid balances get PAID_PRIORITY_WEIGHT when enabled.
+    """
+    if settings.PAID_PRIORITY_WEIGHT == 1.0:
+        return 1.0
+
+    from sqlalchemy import select
+    from database.db import async_session_factory
+    from database.models import User
+
+    async with async_session_factory() as session:
+        balance = await session.scalar(select(User.balance).where(User.id == user_id))
+    if balance is not None and balance >= settings.PAID_BALANCE_THRESHOLD:
+        return settings.PAID_PRIORITY_WEIGHT
+    return 1.0
+
+
+generation_scheduler = FairScheduler(
+    capacity=settings.GENERATION_CAPACITY,
+    per_user=settings.GENERATION_PER_USER,
+)
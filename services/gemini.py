@@ -1,12 +1,18 @@
 # Старый API используется только для обратной совместимости в некоторых методах
-from typing import Optional, List, TYPE_CHECKING
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, TYPE_CHECKING
 import logging
-from PIL import Image
 
 if TYPE_CHECKING:
     from google.generativeai.types import GenerateContentResponse
+    from PIL import Image
 
 from config.settings import settings
+from services.limits import Overloaded, is_quota_error, model_limiter
+from services.resilience import resilient
+from services.routing import TaskRoute, route
+from services.context_cache import context_cache
 
 logger = logging.getLogger(__name__)
 
@@ -20,60 +26,129 @@ class GeminiService:
         import google.generativeai as genai_old
         genai_old.configure(api_key=settings.GEMINI_API_KEY)
         
-        # System instruction for the bot's persona
-        system_instruction = """
-You are Project_RM, an intelligent AI Consultant and Creative Guide.
-Your primary goal is to help users utilize the "Project_RM" Telegram Bot to create stunning marketing content.
-
-**YOUR KNOWLEDGE BASE (How this bot works):**
-1.  **Mini App (The "Open App" button):** This is where the magic happens.
-    *   **Image Gen:** Users can generate AI art. They can upload reference images and choose aspect ratios.
-    *   **Video Gen:** Users can generate videos from text or reference images.
-    *   **Magic Enhance (✨):** Inside the app, there is a "Magic Wand" button that uses YOU to rewrite simple prompts into professional cinematic ones.
-2.  **Chat (Here):** You are chatting with the user right now. You can answer questions, write scripts, and help them brainstorm ideas.
-
-**YOUR ROLE:**
-*   **Be a Guide:** If a user asks "How do I make a video?", explain: "Open the Mini App, go to the Video tab, upload a reference or type a prompt, and hit Generate."
-*   **Be a Creative Partner:** If a user sends a photo, analyze it and suggest: "This is great lighting! To make it more cinematic, try adding 'volumetric fog' and 'anamorphic lens flares' to your prompt."
-*   **Be Proactive:** Always suggest the next step. "Would you like me to write a prompt for this idea?"
-
-**TONE:**
-Professional, enthusiastic, and helpful. Speak in Russian unless asked otherwise.
-
-**FORMATTING:**
-Format your response using **HTML tags** supported by Telegram: <b>bold</b>, <i>italic</i>, <code>code</code>, <pre>pre</pre>, <a href='...'>link</a>.
-Do NOT use Markdown (asterisks like **text** or *text*). Use <b>text</b> for bold.
-"""
-        self.model = genai_old.GenerativeModel(settings.MODELS['text'], system_instruction=system_instruction) 
-        self.vision_model = genai_old.GenerativeModel(settings.MODELS['text'], system_instruction=system_instruction)
+        self._genai = genai_old
+        # One GenerativeModel per task route, built on first use
+        self._models: Dict[str, Any] = {}
+        # Models bound to upstream cached content, by cache name (LRU)
+        self._cached_models: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _model_for(self, task_route: TaskRoute):
+        model = self._models.get(task_route.task)
+        if model is None:
+            model = self._genai.GenerativeModel(
+                task_route.model,
+                system_instruction=task_route.system_instruction,
+                generation_config=task_route.generation_config or None,
+            )
+            self._models[task_route.task] = model
+        return model
+
+    async def _resolve_model(self, task_route: TaskRoute, prefix: Optional[List[Any]] = None, slot: Optional[str] = None):
+        """
+        Returns (model, prefix_cached). Uses a cached-content handle for the system
+        instruction (and `prefix`, if given) when context caching is available.
+        """
+        if settings.CONTEXT_CACHE_ENABLED:
+            handle = await context_cache.get(
+                slot or task_route.task, task_route.model, task_route.system_instruction, prefix
+            )
+            if handle:
+                model = self._cached_models.get(handle.name)
+                if model is None:
+                    model = context_cache.model(handle, task_route.generation_config or None)
+                    self._cached_models[handle.name] = model
+                    if len(self._cached_models) > 256:
+                        self._cached_models.popitem(last=False)
+                else:
+                    self._cached_models.move_to_end(handle.name)
+                return model, True
+        return self._model_for(task_route), False
 
-    async def generate_text(self, prompt: str) -> Optional[str]:
+    async def generate_text(
+        self,
+        prompt: str,
+        task: str = "chat",
+        history: Optional[List[dict]] = None,
+        prefix: Optional[List[dict]] = None,
+        cache_slot: Optional[str] = None,
+    ) -> Optional[str]:
         """
         Generates text based on the provided prompt.
+        `task` selects the model tier, system instruction and config (see services/routing.py).
+        `prefix` (e.g. a session summary) and `history` are prior contents; the prefix is
+        context-cached under `cache_slot` when large enough.
+        Raises Overloaded when the request is rejected without calling the model
+        (saturated limiter, or CircuitOpen while the model's breaker is open).
+        Returns None only if the model was called and failed or answered nothing.
         """
-        try:
-            response: GenerateContentResponse = await self.model.generate_content_async(prompt)
+        task_route = route(task)
+
+        async def attempt() -> str:
+            model, prefix_cached = await self._resolve_model(task_route, prefix, cache_slot)
+            contents = prompt
+            if prefix or history:
+                contents = ([] if prefix_cached else list(prefix or [])) + list(history or [])
+                contents.append({"role": "user", "parts": [prompt]})
+            async with model_limiter(task_route.model).acquire():
+                response: GenerateContentResponse = await model.generate_content_async(contents)
             return response.text
+
+        try:
+            return await resilient(task_route.model).call(
+                attempt,
+                deadline=settings.TEXT_DEADLINE,
+                retries=settings.TEXT_RETRIES,
+                hedge=settings.TEXT_HEDGING,
+            )
+        except Overloaded:
+            # Includes CircuitOpen: callers answer "try again later", not "no answer"
+            raise
         except Exception as e:
-            logger.error(f"Error generating text: {e}")
+            logger.error("Error generating text: %s", e)
             return None
 
-    async def generate_multimodal(self, prompt: str, images: List[Image.Image]) -> Optional[str]:
+    async def embed(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Returns one embedding per text (settings.EMBEDDING_MODEL), or None on failure.
+        """
+        model_name = settings.EMBEDDING_MODEL
+        try:
+            async with model_limiter(model_name).acquire():
+                result = await asyncio.to_thread(
+                    self._genai.embed_content,
+                    model=model_name,
+                    content=texts,
+                    task_type="retrieval_query",
+                )
+            return result["embedding"]
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error("Error embedding text: %s", e)
+            return None
+
+    async def generate_multimodal(self, prompt: str, images: List["Image.Image"], task: str = "multimodal") -> Optional[str]:
         """
         Generates content based on text prompt and images.
         """
+        task_route = route(task)
         try:
             inputs = [prompt] + images
-            response: GenerateContentResponse = await self.vision_model.generate_content_async(inputs)
+            model, _ = await self._resolve_model(task_route)
+            async with model_limiter(task_route.model).acquire():
+                response: GenerateContentResponse = await model.generate_content_async(inputs)
             return response.text
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error generating multimodal content: {e}")
+            logger.error("Error generating multimodal content: %s", e)
             return None
 
-    async def synthesize_reference_prompt(self, main_prompt: str, references: List[dict], images: List[Image.Image]) -> Optional[str]:
+    async def synthesize_reference_prompt(self, main_prompt: str, references: List[dict], images: List["Image.Image"]) -> Optional[str]:
         """
         Analyzes multiple reference images and their descriptions to create a single master prompt.
         """
+        task_route = route("reference")
         try:
             instruction = f"""
 Analyze these {len(images)} reference images and the user's specific instructions for each:
@@ -81,17 +156,16 @@ Analyze these {len(images)} reference images and the user's specific instruction
 
 Overall Goal: {main_prompt}
 
-TASK:
-Generate a single, highly detailed Stable Diffusion / Imagen prompt in English. 
 Coherently combine the elements from the references (e.g., character from photo 1, style from photo 2, lighting from photo 3) as specified.
-The resulting prompt should be cinematic, professional, and visually rich.
-Output ONLY the resulting prompt string. No explanations.
 """
             inputs = [instruction] + images
-            response: GenerateContentResponse = await self.vision_model.generate_content_async(inputs)
+            async with model_limiter(task_route.model).acquire():
+                response: GenerateContentResponse = await self._model_for(task_route).generate_content_async(inputs)
             return response.text.strip()
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error synthesizing reference prompt: {e}")
+            logger.error("Error synthesizing reference prompt: %s", e)
             return None
 
     async def generate_image(self, prompt: str, aspect_ratio: str = "1:1") -> Optional[bytes]:
@@ -107,9 +181,10 @@ Output ONLY the resulting prompt string. No explanations.
             
             # Append aspect ratio to prompt for better adherence
             full_prompt = f"{prompt}, aspect ratio {aspect_ratio}"
-            logger.info(f"Generating image with {model_name} for prompt: {full_prompt}")
+            logger.info("Generating image with %s", model_name, extra={"prompt": full_prompt})
             
-            response = await image_model.generate_content_async(full_prompt)
+            async with model_limiter(model_name).acquire():
+                response = await image_model.generate_content_async(full_prompt)
             
             if response.parts:
                 for part in response.parts:
@@ -119,14 +194,35 @@ Output ONLY the resulting prompt string. No explanations.
             logger.warning("No image data found in response.")
             return None
             
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error generating image with Gemini: {e}")
+            if is_quota_error(e):
+                # The image router cools this backend down and fails over
+                raise
+            logger.error("Error generating image with Gemini: %s", e)
             return None
 
+    async def generate_images(self, prompt: str, aspect_ratio: str = "1:1", n: int = 1) -> List[bytes]:
+        """
+        Generates `n` variants. The Gemini image model returns one image per call,
+        so the variants are requested in parallel.
+        """
+        results = await asyncio.gather(
+            *(self.generate_image(prompt, aspect_ratio=aspect_ratio) for _ in range(n)),
+            return_exceptions=True,
+        )
+        images = [r for r in results if isinstance(r, bytes)]
+        if not images:
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
+        return images
+
     async def generate_image_with_references(
         self, 
         prompt: str, 
-        reference_images: List[Image.Image],
+        reference_images: List["Image.Image"],
         aspect_ratio: str = "9:16",
         resolution: str = "1K"
     ) -> Optional[bytes]:
@@ -146,36 +242,47 @@ Output ONLY the resulting prompt string. No explanations.
             contents = [prompt] + reference_images
             
             logger.info(
-                f"Generating image with references: {len(reference_images)} images, "
-                f"aspect_ratio={aspect_ratio}, resolution={resolution}"
+                "Generating image with references: %d images, aspect_ratio=%s, resolution=%s",
+                len(reference_images), aspect_ratio, resolution
             )
             
-            # Generate with config
-            response = client.models.generate_content(
-                model="gemini-3-pro-image-preview",
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE'],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                        image_size=resolution
+            # Generate with config (async client, so the event loop is not blocked)
+            model_name = "gemini-3-pro-image-preview"
+            async with model_limiter(model_name).acquire():
+                response = await client.aio.models.generate_content(
+                    model=model_name,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        response_modalities=['TEXT', 'IMAGE'],
+                        image_config=types.ImageConfig(
+                            aspect_ratio=aspect_ratio,
+                            image_size=resolution
+                        )
                     )
                 )
-            )
             
             # Extract image from response
             for part in response.parts:
                 if part.text is not None:
-                    logger.info(f"Model response text: {part.text[:100]}...")
+                    logger.info("Model response text: %.100s", part.text)
                 elif hasattr(part, 'inline_data') and part.inline_data is not None:
                     return part.inline_data.data
             
             logger.warning("No image data found in response.")
             return None
             
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error generating image with references: {e}")
+            if is_quota_error(e):
+                raise
+            logger.error("Error generating image with references: %s", e)
             return None
 
 
-gemini_service = GeminiService()
+def __getattr__(name: str):
+    # gemini_service is built on first use by the service container (services/container.py)
+    if name == "gemini_service":
+        from services.container import container
+        return container.get("gemini")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
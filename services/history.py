@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from database.db import async_session_factory
+from database.models import Generation
+
+logger = logging.getLogger(__name__)
+
+# History writes scheduled after delivery; held so they are not garbage collected
+_record_tasks: Set[asyncio.Task] = set()
+
+
+def prompt_hash(prompt: Optional[str]) -> str:
+    return hashlib.sha256((prompt or "").encode()).hexdigest()
+
+
+async def record_generations(
+    user_id: int,
+    action_type: str,
+    prompt: Optional[str],
+    params: Optional[Dict[str, Any]],
+    model: Optional[str],
+    artifacts: List[Dict[str, Optional[str]]],
+    queue_ms: Optional[int] = None,
+    generation_ms: Optional[int] = None,
+) -> List[int]:
+    """
+    Stores one Generation row per delivered artifact ({"artifact_id", "thumbnail_id"}).
+    History is best effort: failures are logged and never break delivery.
+    """
+    try:
+        async with async_session_factory() as session:
+            rows = [
+                Generation(
+                    user_id=user_id,
+                    type=action_type,
+                    prompt=prompt,
+                    prompt_hash=prompt_hash(prompt),
+                    params=params or {},
+                    model=model,
+                    artifact_id=artifact.get("artifact_id"),
+                    thumbnail_id=artifact.get("thumbnail_id"),
+                    queue_ms=queue_ms,
+                    generation_ms=generation_ms,
+                )
+                for artifact in artifacts
+            ]
+            session.add_all(rows)
+            await session.commit()
+            return [row.id for row in rows]
+    except Exception as e:
+        logger.error("Failed to record generation history for user %s: %s", user_id, e)
+        return []
+
+
+def record_generations_later(*args, **kwargs):
+    """
+    Runs record_generations in the background, off the delivery path.
+    Call it after the result has been sent.
+    """
+    task = asyncio.create_task(record_generations(*args, **kwargs))
+    _record_tasks.add(task)
+    task.add_done_callback(_record_tasks.discard)
+
+
+async def drain_history(timeout: float):
+    """
+    Waits for pending history writes before shutdown.
+    """
+    if not _record_tasks:
+        return
+    logger.info("Waiting for %s pending history writes", len(_record_tasks))
+    _, pending = await asyncio.wait(set(_record_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.limits import Overloaded, is_quota_error, model_limiter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImageRequest:
+    prompt: str
+    aspect_ratio: str = "1:1"
+    n: int = 1
+    references: List[Any] = field(default_factory=list)  # PIL images
+    resolution: str = "1K"
+
+
+@dataclass
+class ImageResult:
+    images: List[bytes]
+    backend: Optional[str] = None
+    model: Optional[str] = None
+
+
+class ImageBackend(ABC):
+    """
+    One upstream image model with its capabilities.
+    """
+
+    name = ""
+    aspect_ratios: Tuple[str, ...] = ()
+    supports_references = False
+
+    @property
+    @abstractmethod
+    def model(self) -> str:
+        ...
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, request: ImageRequest) -> bool:
+        if request.references and not self.supports_references:
+            return False
+        return request.aspect_ratio in self.aspect_ratios
+
+    @abstractmethod
+    async def generate(self, request: ImageRequest) -> List[bytes]:
+        ...
+
+
+class GeminiImageBackend(ImageBackend):
+    name = "gemini"
+    aspect_ratios = ("1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9")
+    supports_references = True
+
+    @property
+    def model(self) -> str:
+        return settings.MODELS["image"]
+
+    async def generate(self, request: ImageRequest) -> List[bytes]:
+        from services.container import container
+        gemini_service = await container.aget("gemini")
+        if not request.references:
+            return await gemini_service.generate_images(request.prompt, aspect_ratio=request.aspect_ratio, n=request.n)
+
+        results = await asyncio.gather(
+            *(
+                gemini_service.generate_image_with_references(
+                    prompt=request.prompt,
+                    reference_images=request.references,
+                    aspect_ratio=request.aspect_ratio,
+                    resolution=request.resolution,
+                )
+                for _ in range(request.n)
+            ),
+            return_exceptions=True,
+        )
+        images = [r for r in results if isinstance(r, bytes)]
+        if not images:
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
+        return images
+
+
+class ImagenBackend(ImageBackend):
+    name = "imagen"
+    aspect_ratios = ("1:1", "3:4", "4:3", "9:16", "16:9")
+
+    @property
+    def model(self) -> str:
+        return settings.MODELS["imagen"]
+
+    def available(self) -> bool:
+        # Building the Vertex client blocks on network calls: never do it on the
+        # request path. Until warm-up has built it, requests go to other backends.
+        from services.container import container
+        if container.ready("vertex_image"):
+            return container.get("vertex_image").model is not None
+        if not container.failed("vertex_image"):
+            container.start_warm_up(["vertex_image"])
+        return False
+
+    async def generate(self, request: ImageRequest) -> List[bytes]:
+        from services.container import container
+        return await (await container.aget("vertex_image")).generate_images(request.prompt, aspect_ratio=request.aspect_ratio, n=request.n)
+
+
+class BackendStats:
+    """
+    Rolling latency and error statistics of one backend.
+    """
+
+    def __init__(self, window: int = 50):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+
+    def score(self) -> float:
+        """
+        Expected cost of a request, lower is better. Backends without samples score 0
+        so they are tried and measured.
+        """
+        p95 = self.p95()
+        if p95 is None:
+            return 0.0
+        return p95 * (1 + 4 * self.error_rate())
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+
+class ImageRouter:
+    """
+    Sends each image request to the healthiest, fastest backend that supports it
+    and fails over to the next one on errors, empty results or quota exhaustion.
+    A backend that fails repeatedly or hits its quota is skipped for a cooldown.
+    A small share of requests explores other backends to keep their stats fresh.
+    """
+
+    def __init__(self, backends: List[ImageBackend], explore: float, cooldown: float, failure_threshold: int = 3):
+        self.backends = backends
+        self.explore = explore
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.stats: Dict[str, BackendStats] = {backend.name: BackendStats() for backend in backends}
+
+    def candidates(self, request: ImageRequest) -> List[ImageBackend]:
+        eligible = [b for b in self.backends if b.supports(request) and b.available()]
+        healthy = [b for b in eligible if self.stats[b.name].healthy()]
+        # All matching backends cooling down: still try them rather than fail outright
+        ordered = sorted(healthy or eligible, key=lambda b: self.stats[b.name].score())
+        if len(ordered) > 1 and random.random() < self.explore:
+            ordered.insert(0, ordered.pop(random.randrange(1, len(ordered))))
+        return ordered
+
+    def check(self, request: ImageRequest):
+        """
+        Fast admission: raises Overloaded only if every matching backend is saturated.
+        """
+        error: Optional[Overloaded] = None
+        for backend in self.candidates(request):
+            try:
+                model_limiter(backend.model).check()
+                return
+            except Overloaded as e:
+                error = e
+        if error:
+            raise error
+
+    async def generate(self, request: ImageRequest) -> ImageResult:
+        candidates = self.candidates(request)
+        if not candidates:
+            logger.error("No image backend supports aspect ratio %s (references: %s)", request.aspect_ratio, bool(request.references))
+            return ImageResult([])
+
+        overloaded: Optional[Overloaded] = None
+        for backend in candidates:
+            stats = self.stats[backend.name]
+            started = time.monotonic()
+            try:
+                images = await backend.generate(request)
+            except Overloaded as e:
+                overloaded = e
+                stats.cooldown_until = time.monotonic() + max(e.retry_after, 1)
+                logger.warning("Image backend %s overloaded, failing over", backend.name)
+                continue
+            except Exception as e:
+                images = []
+                if is_quota_error(e):
+                    # Quota exhaustion doesn't clear up within seconds: skip this backend now
+                    stats.cooldown_until = time.monotonic() + self.cooldown
+                    logger.warning("Image backend %s quota exhausted, cooling down for %.0fs", backend.name, self.cooldown)
+                else:
+                    logger.error("Image backend %s failed: %s", backend.name, e)
+
+            latency = time.monotonic() - started
+            stats.record(latency, bool(images))
+            if images:
+                logger.info("Image backend %s: %d image(s) in %.1fs", backend.name, len(images), latency)
+                return ImageResult(images, backend=backend.name, model=backend.model)
+
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown_until = time.monotonic() + self.cooldown
+                logger.warning("Image backend %s cooling down after %s failures", backend.name, stats.consecutive_failures)
+
+        if overloaded:
+            raise overloaded
+        return ImageResult([])
+
+
+_BACKENDS = {
+    "gemini": GeminiImageBackend,
+    "imagen": ImagenBackend,
+}
+
+image_router = ImageRouter(
+    [_BACKENDS[name]() for name in settings.IMAGE_BACKENDS],
+    explore=settings.IMAGE_ROUTER_EXPLORE,
+    cooldown=settings.IMAGE_BACKEND_COOLDOWN,
+)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    """
+    Everything needed to run an image generation again: the final prompt (already
+    compiled or synthesized) and the preprocessed references as blob ids.
+    """
+    user_id: int
+    type: str  # image / reference
+    prompt: str
+    aspect_ratio: str = "1:1"
+    resolution: str = "1K"
+    n: int = 1
+    reference_ids: List[str] = field(default_factory=list)
+    output_ids: List[str] = field(default_factory=list)  # delivered originals, for variations
+    variation: bool = False  # `prompt` stays the original; the variation instruction is added per call
+    id: str = ""
+    created_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "JobSpec":
+        return cls(**json.loads(raw))
+
+
+class SpecStore(ABC):
+    """
+    Job specs behind the buttons under delivered results, kept for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def get(self, spec_id: str) -> Optional[JobSpec]:
+        ...
+
+    @abstractmethod
+    async def put(self, spec: JobSpec):
+        ...
+
+
+class MemorySpecStore(SpecStore):
+    """
+    In-process stand-in for a single bot/API process.
+    """
+
+    def __init__(self, ttl: int, max_entries: int = 10000):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._specs: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, spec_id: str) -> Optional[JobSpec]:
+        entry = self._specs.get(spec_id)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at <= time.time():
+            del self._specs[spec_id]
+            return None
+        return JobSpec.from_json(raw)
+
+    async def put(self, spec: JobSpec):
+        self._specs[spec.id] = (time.time() + self.ttl, spec.to_json())
+        # Insertion order equals expiry order: drop from the front
+        while len(self._specs) > self.max_entries:
+            self._specs.popitem(last=False)
+
+
+class RedisSpecStore(SpecStore):
+    """
+    One JSON value per spec, so buttons work in whichever process receives the callback.
+    """
+
+    def __init__(self, ttl: int, prefix: str = "rm:spec"):
+        super().__init__(ttl)
+        self.prefix = prefix
+
+    def _key(self, spec_id: str) -> str:
+        return f"{self.prefix}:{spec_id}"
+
+    async def get(self, spec_id: str) -> Optional[JobSpec]:
+        from database.redis import get_redis
+        raw = await get_redis().get(self._key(spec_id))
+        return JobSpec.from_json(raw) if raw else None
+
+    async def put(self, spec: JobSpec):
+        from database.redis import get_redis
+        await get_redis().set(self._key(spec.id), spec.to_json(), ex=self.ttl)
+
+
+class ArtifactCache:
+    """
+    Small TTL + LRU cache of expensive intermediate artifacts (decoded images).
+    Values are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class JobSpecs:
+    """
+    Stores the spec of each delivered image job so "🔁 Повторить" and "🎲 Вариация"
+    go straight to the generation call: references are downloaded and normalized
+    once, kept in the blob store, and their decoded images are cached per process.
+    """
+
+    def __init__(self, store: SpecStore, artifacts: ArtifactCache):
+        self.store = store
+        self.artifacts = artifacts
+
+    async def save(self, spec: JobSpec) -> JobSpec:
+        spec.id = spec.id or uuid.uuid4().hex
+        await self.store.put(spec)
+        return spec
+
+    async def get(self, spec_id: str) -> Optional[JobSpec]:
+        return await self.store.get(spec_id)
+
+    async def store_references(self, originals: List[bytes]) -> Tuple[List[str], List[Any]]:
+        """
+        Normalizes downloaded references, stores them and returns (blob ids, decoded images).
+        """
+        from services.media import decode_image, preprocess_reference
+        from services.storage import blob_store
+
+        ids, images = [], []
+        for data in originals:
+            try:
+                prepared = await preprocess_reference(data)
+            except Exception as e:
+                logger.error("Skipping undecodable reference: %s", e)
+                continue
+            blob_id = await blob_store.put(prepared, "jpg")
+            image = self.artifacts.get(blob_id)
+            if image is None:
+                image = await asyncio.to_thread(decode_image, prepared)
+                self.artifacts.put(blob_id, image)
+            ids.append(blob_id)
+            images.append(image)
+        return ids, images
+
+    async def references(self, blob_ids: List[str]) -> List[Any]:
+        """
+        Decoded images for stored blob ids; cache misses are read back from the blob store.
+        """
+        from services.media import decode_image
+        from services.storage import blob_store
+
+        images = []
+        for blob_id in blob_ids:
+            image = self.artifacts.get(blob_id)
+            if image is None:
+                data = await asyncio.to_thread(blob_store.read, blob_id)
+                if data is None:
+                    logger.warning("Reference %s is no longer stored", blob_id)
+                    continue
+                image = await asyncio.to_thread(decode_image, data)
+                self.artifacts.put(blob_id, image)
+            images.append(image)
+        return images
+
+
+def _create_store() -> SpecStore:
+    backend = settings.JOB_SPEC_STORE
+    if backend == "redis":
+        return RedisSpecStore(settings.JOB_SPEC_TTL)
+    if backend == "memory":
+        return MemorySpecStore(settings.JOB_SPEC_TTL)
+    raise ValueError(f"Unknown JOB_SPEC_STORE backend: {backend}")
+
+
+job_specs = JobSpecs(
+    _create_store(),
+    ArtifactCache(settings.ARTIFACT_CACHE_SIZE, settings.ARTIFACT_CACHE_TTL),
+)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Stage transitions of a generation job, in order. There is no reference-fetching
+# stage: reference generations only come through the bot (WebApp sendData), which
+# reports progress in the chat; API jobs are image/video from a prompt.
+STAGES = ("queued", "generating", "uploading", "done")
+TERMINAL_STAGES = ("done", "failed")
+
+
+@dataclass
+class Job:
+    id: str
+    user_id: int
+    type: str
+    stage: str = "queued"
+    message: Optional[str] = None
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    version: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "Job":
+        return cls(**json.loads(raw))
+
+
+class JobRegistry(ABC):
+    """
+    Short-lived state of generation jobs for status polling and progress streams.
+    Every update bumps `version`, so clients can wait for "anything newer than N".
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    async def create(self, user_id: int, job_type: str) -> Job:
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, type=job_type)
+        await self._save(job)
+        return job
+
+    async def update(self, job_id: str, stage: Optional[str] = None, **fields) -> Optional[Job]:
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        if stage:
+            job.stage = stage
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.version += 1
+        job.updated_at = time.time()
+        await self._save(job)
+        return job
+
+    async def fail(self, job_id: str, error: str) -> Optional[Job]:
+        return await self.update(job_id, stage="failed", error=error)
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    async def wait(self, job_id: str, after_version: int, timeout: float) -> Optional[Job]:
+        """
+        Long-poll: returns the job as soon as its version exceeds `after_version`
+        (or it is finished), or its current state after `timeout` seconds.
+        """
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[Job]]:
+        """
+        Yields the job on every change until it finishes; yields None every
+        `heartbeat` seconds without changes so streams can send keep-alives.
+        """
+        version = -1
+        while True:
+            job = await self.wait(job_id, version, timeout=heartbeat)
+            if job is None:
+                return
+            if job.version > version:
+                version = job.version
+                yield job
+                if job.finished:
+                    return
+            else:
+                yield None
+
+    @abstractmethod
+    async def _save(self, job: Job):
+        ...
+
+
+class MemoryJobRegistry(JobRegistry):
+    """
+    In-process registry for a single API process and development.
+    """
+
+    def __init__(self, ttl: int):
+        super().__init__(ttl)
+        self._jobs: Dict[str, Job] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job and job.updated_at + self.ttl < time.time():
+            self._forget(job_id)
+            return None
+        return job
+
+    async def wait(self, job_id: str, after_version: int, timeout: float) -> Optional[Job]:
+        job = await self.get(job_id)
+        if job is None or job.version > after_version or job.finished:
+            return job
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def _save(self, job: Job):
+        self._purge()
+        # Store a copy so callers can't mutate registry state in place
+        self._jobs[job.id] = Job.from_json(job.to_json())
+        event = self._changed.pop(job.id, None)
+        if event:
+            event.set()
+
+    def _purge(self):
+        expired = time.time() - self.ttl
+        for job_id in [k for k, job in self._jobs.items() if job.updated_at < expired]:
+            self._forget(job_id)
+
+    def _forget(self, job_id: str):
+        self._jobs.pop(job_id, None)
+        event = self._changed.pop(job_id, None)
+        if event:
+            event.set()
+
+
+class RedisJobRegistry(JobRegistry):
+    """
+    Jobs as JSON values with a TTL; updates are announced on a per-job channel,
+    so any API replica can serve long-polls and streams for any job.
+    """
+
+    def __init__(self, ttl: int, prefix: str = "rm:job"):
+        super().__init__(ttl)
+        self.prefix = prefix
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _channel(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}:events"
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        from database.redis import get_redis
+        raw = await get_redis().get(self._key(job_id))
+        return Job.from_json(raw) if raw else None
+
+    async def wait(self, job_id: str, after_version: int, timeout: float) -> Optional[Job]:
+        from database.redis import get_redis
+        pubsub = get_redis().pubsub()
+        try:
+            # Subscribe before reading, so an update in between is not missed
+            await pubsub.subscribe(self._channel(job_id))
+            job = await self.get(job_id)
+            if job is None or job.version > after_version or job.finished:
+                return job
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is not None:
+                    break
+            return await self.get(job_id)
+        finally:
+            await pubsub.aclose()
+
+    async def _save(self, job: Job):
+        from database.redis import get_redis
+        redis = get_redis()
+        await redis.set(self._key(job.id), job.to_json(), ex=self.ttl)
+        await redis.publish(self._channel(job.id), job.version)
+
+
+_registry: Optional[JobRegistry] = None
+
+
+def get_job_registry() -> JobRegistry:
+    """
+    Returns the configured job registry (JOB_REGISTRY: "memory" or "redis").
+    """
+    global _registry
+    if _registry is None:
+        if settings.JOB_REGISTRY == "redis":
+            _registry = RedisJobRegistry(settings.JOB_TTL)
+        elif settings.JOB_REGISTRY == "memory":
+            _registry = MemoryJobRegistry(settings.JOB_TTL)
+        else:
+            raise ValueError(f"Unknown JOB_REGISTRY backend: {settings.JOB_REGISTRY}")
+    return _registry
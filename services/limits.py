@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """
+    Raised when a model's queue is too long to admit another request.
+    """
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Model {model} is overloaded, retry after {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """
+    Detects 429 / RESOURCE_EXHAUSTED errors across the old and new Google SDKs.
+    """
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code == 429:
+        return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for one upstream model.
+    The limit grows by ~1 per window of successful calls and is halved on quota
+    errors (at most once per cooldown, so a burst of 429s counts as one signal).
+    Requests that would wait longer than `max_wait` are rejected with Overloaded.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int, max_wait: float):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latency: Optional[float] = None  # EWMA of call duration, seconds
+        self._blocked_until = 0.0
+        self._cooldown = 1.0
+
+    def estimated_wait(self) -> float:
+        now = time.monotonic()
+        wait = max(self._blocked_until - now, 0.0)
+        if self.in_flight >= int(self.limit) or self._waiters:
+            wait += (len(self._waiters) + 1) / max(int(self.limit), 1) * (self._latency or 0.0)
+        return wait
+
+    def check(self):
+        """
+        Fast admission check: raises Overloaded if a new request would wait too long.
+        """
+        wait = self.estimated_wait()
+        if wait > self.max_wait:
+            raise Overloaded(self.name, math.ceil(wait))
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.check()
+
+        blocked = self._blocked_until - time.monotonic()
+        if blocked > 0:
+            await asyncio.sleep(blocked)
+
+        if self.in_flight >= int(self.limit) or self._waiters:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Slot handed over right before cancellation: pass it on
+                    self.in_flight -= 1
+                    self._wake()
+                raise
+        else:
+            self.in_flight += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_quota_error(e):
+                self._on_quota_error()
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+        finally:
+            self.in_flight -= 1
+            self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, elapsed: float):
+        self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._cooldown = 1.0
+
+    def _on_quota_error(self):
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return
+        self.limit = max(self.min_limit, self.limit / 2)
+        self._blocked_until = now + self._cooldown
+        self._cooldown = min(self._cooldown * 2, 60.0)
+        logger.warning("Quota error on %s: concurrency limit cut to %s", self.name, int(self.limit))
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def model_limiter(model: str) -> AdaptiveLimiter:
+    """
+    Returns the shared limiter for a model name.
+    """
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = _limiters[model] = AdaptiveLimiter(
+            model,
+            initial=settings.MODEL_CONCURRENCY_INITIAL,
+            min_limit=settings.MODEL_CONCURRENCY_MIN,
+            max_limit=settings.MODEL_CONCURRENCY_MAX,
+            max_wait=settings.MODEL_MAX_QUEUE_WAIT,
+        )
+    return limiter
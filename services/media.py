@@ -0,0 +1,148 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from config.settings import settings
+from services.storage import blob_store
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Pillow releases the GIL while resampling and encoding, so a thread pool
+# gives real parallelism without pickling image bytes between processes.
+_executor: Optional[ThreadPoolExecutor] = None
+
+_ORIGINAL_EXT = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+
+
+@dataclass
+class DeliveryImage:
+    photo: bytes           # Optimized JPEG/WebP for send_photo
+    photo_filename: str
+    thumbnail: bytes       # Small WebP preview for WebApp galleries
+    original_id: str       # Lossless original in the blob store
+    thumbnail_id: str
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_WORKERS, thread_name_prefix="media")
+    return _executor
+
+
+def _encode(original: bytes) -> Tuple[bytes, str, bytes, str]:
+    """
+    Decodes the original once and produces the chat photo and the thumbnail.
+    Runs inside the worker pool.
+    """
+    from PIL import Image
+    img = Image.open(io.BytesIO(original))
+    img.load()
+    original_ext = _ORIGINAL_EXT.get(img.format, "png")
+
+    if img.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel: flatten onto white
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        rgba = img.convert("RGBA")
+        background.paste(rgba, mask=rgba.split()[-1])
+        img = background
+
+    photo = img
+    max_side = settings.IMAGE_DELIVERY_MAX_SIDE
+    if max(photo.size) > max_side:
+        photo = photo.copy()
+        photo.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    if settings.IMAGE_DELIVERY_FORMAT == "webp":
+        photo.save(buf, format="WEBP", quality=settings.IMAGE_DELIVERY_QUALITY, method=4)
+        photo_ext = "webp"
+    else:
+        photo.save(buf, format="JPEG", quality=settings.IMAGE_DELIVERY_QUALITY, optimize=True, progressive=True)
+        photo_ext = "jpg"
+
+    thumb = img.copy()
+    thumb.thumbnail((settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE), Image.LANCZOS)
+    thumb_buf = io.BytesIO()
+    thumb.save(thumb_buf, format="WEBP", quality=70, method=4)
+
+    return buf.getvalue(), photo_ext, thumb_buf.getvalue(), original_ext
+
+
+async def prepare_image(original: bytes, name: str = "generated") -> DeliveryImage:
+    """
+    Delivery stage for generated images: encodes an optimized chat photo and a thumbnail
+    in the worker pool and keeps the lossless original in the blob store.
+    """
+    loop = asyncio.get_running_loop()
+    photo, photo_ext, thumbnail, original_ext = await loop.run_in_executor(_get_executor(), _encode, original)
+
+    original_id = await blob_store.put(original, original_ext)
+    thumbnail_id = await blob_store.put(thumbnail, "webp")
+
+    logger.info("Prepared image for delivery: original %d bytes -> photo %d bytes", len(original), len(photo))
+    return DeliveryImage(
+        photo=photo,
+        photo_filename=f"{name}.{photo_ext}",
+        thumbnail=thumbnail,
+        original_id=original_id,
+        thumbnail_id=thumbnail_id,
+    )
+
+
+def _preprocess_reference(data: bytes) -> bytes:
+    """
+    Normalizes a downloaded reference: RGB, at most REFERENCE_MAX_SIDE, high-quality JPEG.
+    Runs inside the worker pool.
+    """
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    max_side = settings.REFERENCE_MAX_SIDE
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+async def preprocess_reference(data: bytes) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _preprocess_reference, data)
+
+
+def decode_image(data: bytes) -> "Image.Image":
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def variant_count(value) -> int:
+    """
+    Requested number of image variants, clamped to 1..IMAGE_MAX_VARIANTS.
+    """
+    try:
+        count = int(value or 1)
+    except (TypeError, ValueError):
+        count = 1
+    return max(1, min(count, settings.IMAGE_MAX_VARIANTS))
+
+
+async def prepare_images(originals: List[bytes], name: str = "generated") -> List[DeliveryImage]:
+    """
+    prepare_image for several variants at once; encoding runs in parallel in the pool.
+    """
+    if len(originals) == 1:
+        return [await prepare_image(originals[0], name=name)]
+    return list(await asyncio.gather(
+        *(prepare_image(original, name=f"{name}_{i}") for i, original in enumerate(originals, 1))
+    ))
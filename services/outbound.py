@@ -0,0 +1,314 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower value = sent first when capacity is scarce
+PRIORITY_RESULT = 0
+PRIORITY_STATUS = 1
+
+SendCall = Callable[[], Awaitable[Any]]
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, up to `capacity` stored.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """
+        Seconds until one token is available.
+        """
+        now = now or time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def penalize(self, seconds: float):
+        """
+        Blocks the bucket for `seconds` (used for Telegram's retry_after).
+        """
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 1) - seconds * self.rate - 1e-9
+
+
+@dataclass
+class _Job:
+    seq: int
+    priority: int
+    call: SendCall
+    future: asyncio.Future
+    coalesce_key: Optional[str] = None
+    attempts: int = 0
+
+
+@dataclass
+class _Chat:
+    bucket: TokenBucket
+    jobs: Deque[_Job] = field(default_factory=deque)
+    busy: bool = False  # Queued in ready/waiting heap or currently sending
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        logger.error("Failed to deliver status message: %s", future.exception())
+
+
+class OutboundScheduler:
+    """
+    Shared scheduler for outgoing Telegram calls.
+    Keeps a global and a per-chat token bucket, preserves order within a chat,
+    prefers final results over progress messages across chats, honors retry_after
+    and merges pending status updates that carry the same coalesce key.
+    The global bucket is per process: with several sending processes (API workers,
+    shard workers) TG_GLOBAL_RATE must be Telegram's limit divided among them.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        max_retries: int = 5,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._chats: Dict[int, _Chat] = {}
+        self._ready: List[Tuple[int, int, int]] = []    # (priority, seq, chat_id)
+        self._waiting: List[Tuple[float, int]] = []     # (ready_at, chat_id)
+        self._seq = itertools.count()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+
+    # --- Public API ---
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run(), name="outbound-scheduler")
+
+    def enqueue(
+        self,
+        chat_id: int,
+        call: SendCall,
+        priority: int = PRIORITY_RESULT,
+        coalesce_key: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Queues `call` (a zero-argument coroutine factory) and returns a future with its result.
+        The factory may be invoked again on retry, so it must not be a bare coroutine.
+        """
+        self.start()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(bucket=TokenBucket(self.chat_rate, self.chat_burst))
+
+        if coalesce_key:
+            for job in chat.jobs:
+                if job.coalesce_key == coalesce_key and job.attempts == 0:
+                    # Newer status supersedes the pending one and keeps its place in line
+                    job.call = call
+                    return job.future
+
+        job = _Job(
+            seq=next(self._seq),
+            priority=priority,
+            call=call,
+            future=asyncio.get_running_loop().create_future(),
+            coalesce_key=coalesce_key,
+        )
+        chat.jobs.append(job)
+        if not chat.busy:
+            self._schedule(chat_id, chat)
+        return job.future
+
+    async def submit(
+        self,
+        chat_id: int,
+        call: SendCall,
+        priority: int = PRIORITY_RESULT,
+        coalesce_key: Optional[str] = None,
+    ) -> Any:
+        """
+        Queues `call` and waits until it has been delivered.
+        """
+        return await asyncio.shield(self.enqueue(chat_id, call, priority, coalesce_key))
+
+    async def result(self, chat_id: int, call: SendCall) -> Any:
+        return await self.submit(chat_id, call, priority=PRIORITY_RESULT)
+
+    async def status(self, chat_id: int, call: SendCall, key: Optional[str] = None):
+        """
+        Queues a progress message without waiting for delivery.
+        Pending statuses with the same `key` are merged into the latest one; use one
+        key per job, so concurrent jobs in a chat don't drop each other's statuses.
+        """
+        future = self.enqueue(chat_id, call, priority=PRIORITY_STATUS, coalesce_key=key)
+        future.add_done_callback(_log_failure)
+
+    def pending(self) -> int:
+        return sum(len(c.jobs) for c in self._chats.values()) + len(self._in_flight)
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Drains queued and in-flight sends (up to `timeout`) and stops the worker.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        self._closing = True
+        if self._worker:
+            self._wakeup.set()
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Outbound scheduler stopped"))
+            chat.jobs.clear()
+        if self.pending():
+            logger.warning("Outbound scheduler stopped with %s sends in flight", len(self._in_flight))
+
+    # --- Internals ---
+
+    def _schedule(self, chat_id: int, chat: _Chat):
+        if not chat.jobs:
+            chat.busy = False
+            if not chat.bucket.delay() and chat.bucket.tokens >= chat.bucket.capacity:
+                # Idle chat with a full bucket carries no state worth keeping
+                self._chats.pop(chat_id, None)
+            return
+
+        chat.busy = True
+        delay = chat.bucket.delay()
+        if delay > 0:
+            heapq.heappush(self._waiting, (time.monotonic() + delay, chat_id))
+        else:
+            head = chat.jobs[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _sweep(self):
+        """
+        Forgets idle chats whose buckets have refilled.
+        """
+        for chat_id, chat in list(self._chats.items()):
+            if not chat.busy and not chat.jobs:
+                chat.bucket.delay()
+                if chat.bucket.tokens >= chat.bucket.capacity:
+                    del self._chats[chat_id]
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, chat_id = heapq.heappop(self._waiting)
+                chat = self._chats.get(chat_id)
+                if chat and chat.jobs:
+                    head = chat.jobs[0]
+                    heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+            if not self._ready:
+                if not self._waiting:
+                    self._sweep()
+                self._wakeup.clear()
+                timeout = self._waiting[0][0] - now if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+                continue
+
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats[chat_id]
+            job = chat.jobs.popleft()
+            self.global_bucket.consume()
+            chat.bucket.consume()
+
+            task = asyncio.create_task(self._send(chat_id, chat, job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, chat_id: int, chat: _Chat, job: _Job):
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            chat.bucket.penalize(e.retry_after)
+            if getattr(e.method, "chat_id", None) is None:
+                # Not scoped to a chat (e.g. answerCallbackQuery): the whole bot is limited
+                self.global_bucket.penalize(e.retry_after)
+                logger.warning("Bot-wide flood limit: retry after %ss", e.retry_after)
+            else:
+                logger.warning("Flood limit for chat %s: retry after %ss", chat_id, e.retry_after)
+            self._retry(chat, job, e)
+        except TelegramNetworkError as e:
+            chat.bucket.penalize(min(2 ** job.attempts, 30))
+            self._retry(chat, job, e)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if not self._closing:
+                self._schedule(chat_id, chat)
+
+    def _retry(self, chat: _Chat, job: _Job, error: Exception):
+        if job.attempts >= self.max_retries:
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+        # Retry before anything else queued for this chat to keep ordering
+        chat.jobs.appendleft(job)
+
+
+outbound = OutboundScheduler(
+    global_rate=settings.TG_GLOBAL_RATE,
+    chat_rate=settings.TG_CHAT_RATE,
+    chat_burst=settings.TG_CHAT_BURST,
+)
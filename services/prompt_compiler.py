@@ -0,0 +1,124 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config.prompt_templates import (
+    FIELD_TEMPLATES,
+    FIELD_TRANSLATIONS,
+    NEGATIVE_FIELDS,
+    OPTION_TRANSLATIONS,
+    QUALITY_SUFFIX,
+)
+from config.ui_config import UI_CONFIG
+
+_CYRILLIC = re.compile(r"[А-Яа-яЁё]")
+_PARENS = re.compile(r"^(.*?)\s*\((.*)\)\s*$")
+
+
+def _is_english(text: str) -> bool:
+    return bool(text.strip()) and not _CYRILLIC.search(text)
+
+
+def auto_translate(option: str) -> Optional[str]:
+    """
+    English for "Русский (English)" or "English (Русский)" options, else None.
+    """
+    match = _PARENS.match(option)
+    if not match:
+        return option if _is_english(option) else None
+    outside, inside = match.group(1), match.group(2)
+    if _is_english(inside):
+        return inside.strip()
+    if _is_english(outside):
+        return outside.strip()
+    return None
+
+
+@dataclass
+class CompiledPrompt:
+    prompt: str
+    negative_prompt: str = ""
+    # Free-typed values that could not be translated locally (passed through as is)
+    untranslated: List[str] = field(default_factory=list)
+
+    def text(self) -> str:
+        if self.negative_prompt:
+            return f"{self.prompt}. Avoid: {self.negative_prompt}"
+        return self.prompt
+
+
+class PromptCompiler:
+    """
+    Turns UI_CONFIG selections into an English generation prompt without a model
+    call. Every option's phrase is rendered once at construction; construction
+    fails if a field has no template or an option has no English translation.
+    """
+
+    def __init__(self, ui_config: Dict[str, Any]):
+        self._phrases: Dict[str, Dict[str, str]] = {}
+        self._negative: Dict[str, str] = {}
+        errors = []
+
+        for block in ui_config["blocks"]:
+            for ui_field in block["fields"]:
+                field_id = ui_field["id"]
+                is_negative = field_id in NEGATIVE_FIELDS
+                template = FIELD_TEMPLATES.get(field_id)
+                if template is None and not is_negative:
+                    errors.append(f"{field_id}: no template")
+                    continue
+
+                overrides = FIELD_TRANSLATIONS.get(field_id, {})
+                phrases = {}
+                for option in ui_field.get("options", []):
+                    english = overrides.get(option) or OPTION_TRANSLATIONS.get(option) or auto_translate(option)
+                    if not english or not _is_english(english):
+                        errors.append(f"{field_id}: no translation for {option!r}")
+                        continue
+                    phrases[option] = english if is_negative else template.format(english)
+
+                if is_negative:
+                    self._negative.update(phrases)
+                else:
+                    self._phrases[field_id] = phrases
+
+        if errors:
+            raise ValueError("Prompt compiler does not cover UI_CONFIG:\n" + "\n".join(errors))
+
+    def compile(self, fields: Dict[str, Any]) -> CompiledPrompt:
+        """
+        `fields` maps UI_CONFIG field ids to a selected option, free text, or a list of options.
+        """
+        parts, untranslated = [], []
+        for field_id, template in FIELD_TEMPLATES.items():
+            for value in _values(fields.get(field_id)):
+                phrase = self._phrases.get(field_id, {}).get(value)
+                if phrase is None:
+                    # Typed by the user
+                    if not _is_english(value):
+                        untranslated.append(value)
+                    phrase = template.format(value)
+                parts.append(phrase)
+        parts.append(QUALITY_SUFFIX)
+
+        negative = []
+        for field_id in NEGATIVE_FIELDS:
+            for value in _values(fields.get(field_id)):
+                negative.append(self._negative.get(value, value))
+
+        return CompiledPrompt(
+            prompt=", ".join(parts),
+            negative_prompt=", ".join(negative),
+            untranslated=untranslated,
+        )
+
+
+def _values(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [str(value).strip()] if str(value).strip() else []
+
+
+prompt_compiler = PromptCompiler(UI_CONFIG)
@@ -0,0 +1,165 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config.settings import settings
+from services.outbound import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Token bucket in one Redis hash, refilled and charged atomically. Uses the Redis
+# clock, so all API workers agree on time. Returns the wait in seconds (0 = allowed).
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+@dataclass
+class RateRule:
+    method: Optional[str]  # None matches every method
+    prefix: str
+    rate: float  # requests per second
+    burst: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.method or '*'} {self.prefix}"
+
+
+def parse_rules(config: Dict[str, Dict[str, float]]) -> List[RateRule]:
+    """
+    RATE_LIMITS keys are "METHOD /prefix" or "/prefix"; longer prefixes match first.
+    """
+    rules = []
+    for key, value in config.items():
+        method, _, prefix = key.strip().rpartition(" ")
+        rules.append(RateRule(method.upper() or None, prefix, float(value["rate"]), float(value["burst"])))
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+class LocalBuckets:
+    """
+    Per-process token buckets (bounded, least recently used dropped):
+    the fallback when Redis is unavailable, or the only backend for one worker.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def hit(self, key: str, rule: RateRule) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rule.rate, rule.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.delay()
+        if wait == 0:
+            bucket.consume()
+        return wait
+
+
+class RateLimiter:
+    """
+    Per-client, per-endpoint token buckets shared by all API workers through an
+    atomic Redis script. On Redis errors, or answers slower than `redis_timeout`,
+    it falls back to local buckets (limits then apply per worker) and retries
+    Redis after `redis_backoff` seconds.
+
+    The timeout is a socket timeout on a dedicated client rather than a
+    cancellation: redis-py drops the timed-out connection instead of returning it
+    half-read to the pool shared with sessions and jobs.
+    """
+
+    def __init__(
+        self,
+        rules: List[RateRule],
+        backend: str,
+        redis_timeout: float,
+        redis_backoff: float = 5.0,
+        prefix: str = "rm:rl",
+    ):
+        self.rules = rules
+        self.backend = backend
+        self.redis_timeout = redis_timeout
+        self.redis_backoff = redis_backoff
+        self.prefix = prefix
+        self.local = LocalBuckets()
+        self._redis = None
+        self._script = None
+        self._redis_retry_at = 0.0
+
+    def match(self, method: str, path: str) -> Optional[RateRule]:
+        for rule in self.rules:
+            if (rule.method is None or rule.method == method) and path.startswith(rule.prefix):
+                return rule
+        return None
+
+    async def hit(self, rule: RateRule, client: str) -> float:
+        """
+        Charges one request of `client` against `rule`. Returns 0 if allowed,
+        otherwise the seconds until the next request would be.
+        """
+        key = f"{self.prefix}:{rule.name}:{client}"
+        if self.backend == "redis" and time.monotonic() >= self._redis_retry_at:
+            try:
+                # Every request passes through here: a stalled Redis must not stall the API
+                return await self._hit_redis(key, rule)
+            except Exception as e:
+                self._redis_retry_at = time.monotonic() + self.redis_backoff
+                logger.warning("Rate limiter falling back to local buckets: %r", e)
+        return self.local.hit(key, rule)
+
+    async def _hit_redis(self, key: str, rule: RateRule) -> float:
+        if self._script is None:
+            from redis.asyncio import Redis
+            self._redis = Redis.from_url(
+                settings.redis_url,
+                socket_timeout=self.redis_timeout,
+                socket_connect_timeout=self.redis_timeout,
+            )
+            self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        wait = await self._script(keys=[key], args=[rule.rate, rule.burst])
+        return float(wait)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._script = None
+
+
+def client_key(user: Optional[dict], host: Optional[str]) -> str:
+    """
+    Users are limited by their Telegram id, unauthenticated callers by address.
+    """
+    if user and user.get("id"):
+        return f"u{user['id']}"
+    return f"ip{host or 'unknown'}"
+
+
+rate_limiter = RateLimiter(
+    parse_rules(settings.RATE_LIMITS),
+    backend=settings.RATE_LIMIT_BACKEND,
+    redis_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+)
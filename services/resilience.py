@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from config.settings import settings
+from services.limits import Overloaded, is_quota_error
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRYABLE_NAMES = {
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+    "BadGateway", "ServerError", "ResourceExhausted", "TooManyRequests",
+}
+
+
+class CircuitOpen(Overloaded):
+    """
+    Raised while a model's circuit breaker is open.
+    Subclasses Overloaded so the API answers 503 with Retry-After.
+    """
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, Overloaded):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in _RETRYABLE_NAMES or is_quota_error(exc):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return isinstance(code, int) and code >= 500
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `reset_timeout` lets one
+    probe through (half-open) and closes again on its success.
+    """
+
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    def allow(self) -> bool:
+        """
+        Raises CircuitOpen unless a call may go through.
+        Returns True if the call is the half-open probe; the caller must then
+        end it with record_success, record_failure or end_probe.
+        """
+        if self.opened_at is None:
+            return False
+        elapsed = time.monotonic() - self.opened_at
+        if elapsed < self.reset_timeout or self._probing:
+            raise CircuitOpen(self.name, math.ceil(max(self.reset_timeout - elapsed, 1)))
+        self._probing = True
+        return True
+
+    def end_probe(self):
+        """
+        Frees the probe slot after an inconclusive probe (neutral error, cancellation),
+        so the next call may probe again instead of the circuit staying open.
+        """
+        self._probing = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit for %s closed", self.name)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            if self.opened_at is None or self._probing:
+                logger.warning("Circuit for %s opened after %s failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies for percentile-based hedging delays.
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def _hedged(call: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    Starts `call`; if it hasn't finished after `delay`, starts a second copy and
+    returns whichever succeeds first. The loser is cancelled.
+    """
+    pending = {asyncio.ensure_future(call())}
+    hedged = False
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            timeout = None if hedged else delay
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info("Hedging request after %.1fs", delay)
+                hedged = True
+                pending.add(asyncio.ensure_future(call()))
+                continue
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not hedged:
+                # Failed before the hedge delay: let the retry policy decide
+                break
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class ResilientCaller:
+    """
+    Deadline + jittered retries + circuit breaker + optional hedging for one model.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name, settings.BREAKER_FAILURES, settings.BREAKER_RESET_TIMEOUT)
+        self.latency = LatencyTracker()
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency.quantile(0.95)
+        return max(p95 or settings.HEDGE_DEFAULT_DELAY, 0.1)
+
+    async def call(
+        self,
+        call: Callable[[], Awaitable[T]],
+        deadline: float,
+        retries: int,
+        hedge: bool = False,
+    ) -> T:
+        expires = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Deadline exceeded for {self.name}")
+            probe = self.breaker.allow()
+
+            started = time.monotonic()
+            try:
+                if hedge:
+                    result = await asyncio.wait_for(_hedged(call, self.hedge_delay()), remaining)
+                else:
+                    result = await asyncio.wait_for(call(), remaining)
+            except Exception as e:
+                # Non-retryable errors (invalid argument, a bug in our code, local
+                # overload) say nothing about upstream health: neutral for the breaker
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                    probe = False
+                if not retryable or attempt >= retries:
+                    raise
+                backoff = min(settings.RETRY_MAX_BACKOFF, settings.RETRY_BASE_BACKOFF * 2 ** attempt)
+                backoff *= random.uniform(0.5, 1.0)
+                attempt += 1
+                logger.warning("%s attempt %s failed (%s); retrying in %.1fs", self.name, attempt, e, backoff)
+                await asyncio.sleep(min(backoff, max(expires - time.monotonic(), 0)))
+            else:
+                self.breaker.record_success()
+                self.latency.add(time.monotonic() - started)
+                return result
+            finally:
+                # Neutral or cancelled: the probe proved nothing, let the next call retry it
+                if probe:
+                    self.breaker.end_probe()
+
+
+_callers: Dict[str, ResilientCaller] = {}
+
+
+def resilient(name: str) -> ResilientCaller:
+    """
+    Returns the shared resilience wrapper for a model name.
+    """
+    caller = _callers.get(name)
+    if caller is None:
+        caller = _callers[name] = ResilientCaller(name)
+    return caller
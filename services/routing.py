@@ -0,0 +1,37 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from config.prompts import SYSTEM_INSTRUCTIONS
+from config.settings import settings
+
+# Keys of a route spec that are not generation config
+_ROUTE_KEYS = {"model", "instruction"}
+
+
+@dataclass(frozen=True)
+class TaskRoute:
+    task: str
+    model: str
+    system_instruction: Optional[str]
+    generation_config: Dict[str, Any] = field(default_factory=dict)
+
+
+def route(task: str) -> TaskRoute:
+    """
+    Resolves a text task (chat, enhance, reference, multimodal, ...) from Settings.MODELS.
+    A plain string entry means "this model, no instruction, default config";
+    unknown tasks fall back to the "text" model with the persona.
+    """
+    spec = settings.MODELS.get(task)
+    if spec is None:
+        spec = {"model": settings.MODELS["text"], "instruction": "persona"}
+    elif isinstance(spec, str):
+        spec = {"model": spec}
+
+    instruction_name = spec.get("instruction")
+    return TaskRoute(
+        task=task,
+        model=spec["model"],
+        system_instruction=SYSTEM_INSTRUCTIONS[instruction_name] if instruction_name else None,
+        generation_config={k: v for k, v in spec.items() if k not in _ROUTE_KEYS},
+    )
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from services.limits import Overloaded
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    In-memory matrix of L2-normalized vectors with cosine top-k search.
+    Rows are preallocated up to `capacity`; when full, the least recently used
+    row is overwritten.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.vectors: Optional[np.ndarray] = None  # (capacity, dim) float32
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.hits = np.zeros(capacity, dtype=np.int64)
+        self.confirmed = np.zeros(capacity, dtype=bool)
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def search(self, queries: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (indices, scores), each (len(queries), k), best match first.
+        Queries must be normalized. Missing results have index -1 and score -inf.
+        """
+        queries = np.atleast_2d(queries)
+        result_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if self.size == 0:
+            return result_idx, result_scores
+
+        scores = queries @ self.vectors[:self.size].T  # (queries, size)
+        k_eff = min(k, self.size)
+        if k_eff < self.size:
+            top = np.argpartition(-scores, k_eff - 1, axis=1)[:, :k_eff]
+        else:
+            top = np.broadcast_to(np.arange(self.size), (len(queries), self.size))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        result_idx[:, :k_eff] = np.take_along_axis(top, order, axis=1)
+        result_scores[:, :k_eff] = np.take_along_axis(top_scores, order, axis=1)
+        return result_idx, result_scores
+
+    def add(self, question: str, vector: np.ndarray, answer: str) -> int:
+        vector = self.normalize(vector)[0]
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+        if self.size < self.capacity:
+            row = self.size
+            self.size += 1
+            self.questions.append(question)
+            self.answers.append(answer)
+        else:
+            row = int(np.argmin(self.last_used[:self.size]))
+            self.questions[row] = question
+            self.answers[row] = answer
+
+        self.vectors[row] = vector
+        self.last_used[row] = time.time()
+        self.hits[row] = 0
+        self.confirmed[row] = False
+        return row
+
+    def touch(self, row: int):
+        self.last_used[row] = time.time()
+        self.hits[row] += 1
+
+
+@dataclass
+class FaqMatch:
+    question: str
+    vector: Optional[np.ndarray]
+    answer: Optional[str] = None
+    score: float = 0.0
+    row: int = -1  # matching entry, also when it is not confirmed yet
+
+
+class SemanticCache:
+    """
+    Answers repeated first-turn questions from previously generated answers.
+    Questions are embedded and matched by cosine similarity against the index;
+    a match above `threshold` returns the stored answer without a model call.
+    A stored answer is served only once `min_confirmations` distinct users have
+    asked the question, so one user's answer is never published to everyone.
+    The index is persisted to `path` and discarded when the chat route (model or
+    persona) changes, so stale answers are not served.
+    """
+
+    def __init__(self, capacity: int, threshold: float, min_confirmations: int, path: Optional[str], fingerprint: str):
+        self.index = VectorIndex(capacity)
+        self.threshold = threshold
+        self.min_confirmations = min_confirmations
+        self.path = path
+        self.fingerprint = fingerprint
+        self.lookups = 0
+        self.hit_count = 0
+        self._dirty = 0
+        # Distinct askers of entries not confirmed yet (row -> user ids); not persisted
+        self._askers: Dict[int, Set[int]] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hit_count / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": self.index.size,
+            "confirmed": int(self.index.confirmed[:self.index.size].sum()),
+            "lookups": self.lookups,
+            "hits": self.hit_count,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+    def eligible(self, question: str) -> bool:
+        # Long messages are specific requests, not FAQ
+        return 0 < len(question.strip()) <= settings.FAQ_MAX_QUESTION_CHARS
+
+    async def lookup(self, question: str, user_id: int) -> FaqMatch:
+        """
+        Returns a match with `answer` set on a hit. The embedding is kept on the
+        match so a miss can be remembered without embedding the question again.
+        A near-duplicate of an unconfirmed entry counts `user_id` towards its
+        confirmation and is still a miss.
+        """
+        await self._ensure_loaded()
+        from services.container import container
+        gemini_service = await container.aget("gemini")
+        try:
+            vectors = await gemini_service.embed([question])
+        except Overloaded:
+            # The cache is an optimization: fall through to the chat model
+            vectors = None
+        if vectors is None:
+            return FaqMatch(question, None)
+
+        vector = self.index.normalize(vectors)[0]
+        idx, scores = self.index.search(vector, k=1)
+        row, score = int(idx[0, 0]), float(scores[0, 0])
+
+        self.lookups += 1
+        match = FaqMatch(question, vector, score=score)
+        if row >= 0 and score >= self.threshold:
+            match.row = row
+            if not self.index.confirmed[row]:
+                self._confirm(row, user_id)
+            if self.index.confirmed[row]:
+                self.index.touch(row)
+                self.hit_count += 1
+                match.answer = self.index.answers[row]
+            else:
+                self.index.last_used[row] = time.time()
+        if self.lookups % 100 == 0:
+            logger.info("FAQ cache: %s", self.stats())
+        return match
+
+    def _confirm(self, row: int, user_id: int):
+        askers = self._askers.setdefault(row, set())
+        askers.add(user_id)
+        if len(askers) >= self.min_confirmations:
+            self.index.confirmed[row] = True
+            del self._askers[row]
+            self._dirty += 1
+
+    async def remember(self, match: FaqMatch, answer: str, user_id: int):
+        # A near-duplicate is already stored and waiting for confirmations
+        if match.vector is None or not answer or match.row >= 0:
+            return
+        row = self.index.add(match.question, match.vector, answer)
+        self._askers.pop(row, None)
+        self._confirm(row, user_id)
+        self._dirty += 1
+        if self._dirty >= settings.FAQ_SAVE_EVERY:
+            await self.save()
+
+    async def save(self):
+        if not self.path or not self._dirty or self.index.vectors is None:
+            return
+        self._dirty = 0
+        try:
+            await asyncio.to_thread(self._save_sync)
+        except Exception as e:
+            logger.error("Failed to save FAQ cache: %s", e)
+
+    def _save_sync(self):
+        index = self.index
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                fingerprint=np.array(self.fingerprint),
+                vectors=index.vectors[:index.size],
+                last_used=index.last_used[:index.size],
+                hits=index.hits[:index.size],
+                confirmed=index.confirmed[:index.size],
+                questions=np.array(index.questions, dtype=str),
+                answers=np.array(index.answers, dtype=str),
+            )
+        os.replace(tmp, self.path)
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    await asyncio.to_thread(self._load_sync)
+                except Exception as e:
+                    logger.error("Failed to load FAQ cache: %s", e)
+            self._loaded = True
+
+    def _load_sync(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            if str(data["fingerprint"]) != self.fingerprint:
+                logger.info("FAQ cache discarded: chat model or persona changed")
+                return
+            vectors = data["vectors"]
+            # Keep the most recently used entries if the capacity shrank
+            keep = np.argsort(-data["last_used"])[:self.index.capacity]
+            index = self.index
+            index.vectors = np.zeros((index.capacity, vectors.shape[1]), dtype=np.float32)
+            index.size = len(keep)
+            index.vectors[:index.size] = vectors[keep]
+            index.last_used[:index.size] = data["last_used"][keep]
+            index.hits[:index.size] = data["hits"][keep]
+            if "confirmed" in data.files:
+                index.confirmed[:index.size] = data["confirmed"][keep]
+            index.questions = [str(q) for q in data["questions"][keep]]
+            index.answers = [str(a) for a in data["answers"][keep]]
+        logger.info("Loaded %s FAQ cache entries", self.index.size)
+
+
+def _fingerprint() -> str:
+    from services.routing import route
+    chat = route("chat")
+    payload = f"{settings.EMBEDDING_MODEL}|{chat.model}|{chat.system_instruction}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+faq_cache = SemanticCache(
+    capacity=settings.FAQ_CACHE_SIZE,
+    threshold=settings.FAQ_SIMILARITY_THRESHOLD,
+    min_confirmations=settings.FAQ_MIN_CONFIRMATIONS,
+    path=settings.FAQ_CACHE_PATH,
+    fingerprint=_fingerprint(),
+)
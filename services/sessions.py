@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import settings
+from services.context_cache import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Roles accepted from client-supplied history, mapped to Gemini roles
+_ROLES = {"user": "user", "model": "model", "assistant": "model", "bot": "model"}
+
+
+@dataclass
+class ChatSession:
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)  # {"role": "user"|"model", "text": ...}
+
+    def to_json(self) -> str:
+        return json.dumps({"summary": self.summary, "turns": self.turns}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "ChatSession":
+        data = json.loads(raw)
+        return cls(summary=data.get("summary", ""), turns=data.get("turns", []))
+
+
+class SessionStore(ABC):
+    """
+    Per-user chat sessions that expire after `ttl` seconds without activity.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @abstractmethod
+    async def load(self, user_id: int) -> Optional[ChatSession]:
+        ...
+
+    @abstractmethod
+    async def save(self, user_id: int, session: ChatSession):
+        ...
+
+    @abstractmethod
+    async def clear(self, user_id: int):
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process stand-in for a single bot/API process and tests.
+    """
+
+    def __init__(self, ttl: int):
+        super().__init__(ttl)
+        self._sessions: Dict[int, Tuple[float, str]] = {}
+
+    async def load(self, user_id: int) -> Optional[ChatSession]:
+        entry = self._sessions.get(user_id)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at <= time.time():
+            del self._sessions[user_id]
+            return None
+        return ChatSession.from_json(raw)
+
+    async def save(self, user_id: int, session: ChatSession):
+        now = time.time()
+        if len(self._sessions) > 10000:
+            for key in [k for k, (expires_at, _) in self._sessions.items() if expires_at <= now]:
+                del self._sessions[key]
+        self._sessions[user_id] = (now + self.ttl, session.to_json())
+
+    async def clear(self, user_id: int):
+        self._sessions.pop(user_id, None)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    One JSON value per user; Redis expires idle sessions.
+    """
+
+    def __init__(self, ttl: int, prefix: str = "rm:chat"):
+        super().__init__(ttl)
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def load(self, user_id: int) -> Optional[ChatSession]:
+        from database.redis import get_redis
+        raw = await get_redis().get(self._key(user_id))
+        return ChatSession.from_json(raw) if raw else None
+
+    async def save(self, user_id: int, session: ChatSession):
+        from database.redis import get_redis
+        await get_redis().set(self._key(user_id), session.to_json(), ex=self.ttl)
+
+    async def clear(self, user_id: int):
+        from database.redis import get_redis
+        await get_redis().delete(self._key(user_id))
+
+
+def _turn_tokens(turns: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(turn["text"]) for turn in turns)
+
+
+class ChatSessions:
+    """
+    Server-side multi-turn chat. Each message is sent with the summary of older
+    turns plus the most recent turns that fit CHAT_CONTEXT_BUDGET, so request size
+    stays flat as the conversation grows. When the stored turns exceed the budget,
+    the oldest ones are folded into the summary (down to half the budget, so this
+    happens every few turns rather than on each one).
+    """
+
+    def __init__(self, store: SessionStore, budget: int, max_turns: int):
+        self.store = store
+        self.budget = budget
+        self.max_turns = max_turns
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # Background summary folds, at most one per user; held until done
+        self._folding: Set[int] = set()
+        self._fold_tasks: Set[asyncio.Task] = set()
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            if len(self._locks) > 10000:
+                for key in [k for k, existing in self._locks.items() if not existing.locked()]:
+                    del self._locks[key]
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def context(self, user_id: int, seed: Optional[List[dict]] = None) -> Tuple[List[dict], List[dict]]:
+        """
+        Returns (prefix, history) contents for the next message of `user_id`.
+        `prefix` carries the summary and is stable between folds (cacheable);
+        `history` holds the recent turns within the token budget.
+        `seed` (client-supplied history) is only used when no session exists.
+        """
+        session = await self.store.load(user_id)
+        if session is None:
+            session = ChatSession()
+            if seed:
+                session.turns = _normalize(seed)[-self.max_turns:]
+                await self.store.save(user_id, session)
+
+        prefix = []
+        if session.summary:
+            prefix = [
+                {"role": "user", "parts": [f"Summary of our earlier conversation:\n{session.summary}"]},
+                {"role": "model", "parts": ["Understood."]},
+            ]
+
+        history, used = [], 0
+        for turn in reversed(session.turns):
+            used += estimate_tokens(turn["text"])
+            if used > self.budget:
+                break
+            history.append({"role": turn["role"], "parts": [turn["text"]]})
+        history.reverse()
+        # Truncation may cut an exchange in half; turns must alternate after the
+        # prefix's model turn, so history has to start with a user turn
+        while history and history[0]["role"] == "model":
+            history.pop(0)
+        return prefix, history
+
+    async def record(self, user_id: int, message: str, reply: str):
+        """
+        Appends a completed exchange. Folding old turns into the summary (an LLM
+        call) runs in the background, so the user's next message doesn't wait on it.
+        """
+        async with self._lock(user_id):
+            session = await self.store.load(user_id) or ChatSession()
+            session.turns.append({"role": "user", "text": message})
+            session.turns.append({"role": "model", "text": reply})
+            if len(session.turns) > self.max_turns:
+                session.turns = session.turns[-self.max_turns:]
+            await self.store.save(user_id, session)
+
+        if _turn_tokens(session.turns) > self.budget and user_id not in self._folding:
+            self._folding.add(user_id)
+            task = asyncio.create_task(self._fold(user_id))
+            self._fold_tasks.add(task)
+            task.add_done_callback(self._fold_tasks.discard)
+
+    async def reset(self, user_id: int):
+        await self.store.clear(user_id)
+
+    async def _fold(self, user_id: int):
+        try:
+            async with self._lock(user_id):
+                session = await self.store.load(user_id)
+                if session is None:
+                    return
+                folded = []
+                turns = list(session.turns)
+                while turns and _turn_tokens(turns) > self.budget // 2:
+                    folded.append(turns.pop(0))
+                # Keep user/model pairs together
+                if turns and turns[0]["role"] == "model":
+                    folded.append(turns.pop(0))
+                previous_summary = session.summary
+            if not folded:
+                return
+
+            # The summary call runs outside the lock: new exchanges keep being recorded
+            from services.container import container
+            gemini_service = await container.aget("gemini")
+            transcript = "\n".join(f"{turn['role']}: {turn['text']}" for turn in folded)
+            prompt = f"Current summary:\n{previous_summary or '(empty)'}\n\nNew turns:\n{transcript}"
+            summary = await gemini_service.generate_text(prompt, task="summary")
+            if not summary:
+                # Keep the turns; the context window still only sends the budgeted tail
+                return
+
+            async with self._lock(user_id):
+                session = await self.store.load(user_id)
+                # Reset, trimmed or folded meanwhile: the summary no longer matches
+                if session is None or session.summary != previous_summary or session.turns[:len(folded)] != folded:
+                    return
+                session.summary = summary.strip()
+                session.turns = session.turns[len(folded):]
+                await self.store.save(user_id, session)
+            logger.info("Folded %d turns into the summary for user %s", len(folded), user_id)
+        except Exception:
+            logger.exception("Failed to fold the chat history of user %s", user_id)
+        finally:
+            self._folding.discard(user_id)
+
+
+def _normalize(history: List[dict]) -> List[Dict[str, str]]:
+    turns = []
+    for item in history:
+        role = _ROLES.get(str(item.get("role", "")).lower())
+        text = item.get("text") or item.get("content") or item.get("message")
+        if role and isinstance(text, str) and text:
+            turns.append({"role": role, "text": text})
+    return turns
+
+
+def _create_store() -> SessionStore:
+    backend = settings.CHAT_SESSION_STORE
+    if backend == "redis":
+        return RedisSessionStore(settings.CHAT_SESSION_IDLE_TTL)
+    if backend == "memory":
+        return MemorySessionStore(settings.CHAT_SESSION_IDLE_TTL)
+    raise ValueError(f"Unknown CHAT_SESSION_STORE backend: {backend}")
+
+
+chat_sessions = ChatSessions(
+    _create_store(),
+    budget=settings.CHAT_CONTEXT_BUDGET,
+    max_turns=settings.CHAT_SESSION_MAX_TURNS,
+)
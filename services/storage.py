@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+}
+
+# Blob id format: "<sha256 hex>.<ext>"
+BLOB_ID_RE = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]{1,5})$")
+# Short id fits into Telegram callback data (64 bytes): "<base64url sha256>.<ext>"
+SHORT_ID_RE = re.compile(r"^([A-Za-z0-9_-]{43})\.([a-z0-9]{1,5})$")
+# Buttons sent before short ids became reversible: "<first 32 hex>.<ext>"
+LEGACY_SHORT_ID_RE = re.compile(r"^([0-9a-f]{32})\.([a-z0-9]{1,5})$")
+
+
+class BlobStore:
+    """
+    Content-addressed storage for generated artifacts.
+    Files live under MEDIA_ROOT/<first two hex chars>/<sha256>.<ext>,
+    so identical results are stored only once.
+    """
+
+    def __init__(self, root: str, secret: Optional[str] = None):
+        self.root = root
+        # Fall back to a key derived from the bot token so links work out of the box
+        key_source = secret or f"media:{settings.BOT_TOKEN}"
+        self._secret = hashlib.sha256(key_source.encode()).digest()
+
+    def _file_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext}")
+
+    def put_sync(self, data: bytes, ext: str) -> str:
+        """
+        Stores bytes and returns the blob id. Writes are atomic (temp file + rename).
+        """
+        if ext not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported blob extension: {ext}")
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._file_path(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            logger.info("Stored blob %.12s.%s (%d bytes)", digest, ext, len(data))
+        return f"{digest}.{ext}"
+
+    async def put(self, data: bytes, ext: str) -> str:
+        return await asyncio.to_thread(self.put_sync, data, ext)
+
+    def path(self, blob_id: str) -> Optional[str]:
+        """
+        Returns the file path for a blob id, or None if the id is malformed or missing.
+        """
+        match = BLOB_ID_RE.match(blob_id)
+        if not match:
+            return None
+        path = self._file_path(match.group(1), match.group(2))
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def short_id(blob_id: str) -> str:
+        digest, ext = blob_id.split(".", 1)
+        encoded = base64.urlsafe_b64encode(bytes.fromhex(digest)).rstrip(b"=").decode()
+        return f"{encoded}.{ext}"
+
+    def resolve(self, short_id: str) -> Optional[str]:
+        """
+        Maps a short id back to the full blob id (decoded, no disk access).
+        Legacy hex-prefix ids are looked up in the blob's directory.
+        """
+        match = SHORT_ID_RE.match(short_id)
+        if match:
+            encoded, ext = match.groups()
+            try:
+                digest = base64.urlsafe_b64decode(encoded + "=").hex()
+            except (binascii.Error, ValueError):
+                return None
+            return f"{digest}.{ext}"
+
+        match = LEGACY_SHORT_ID_RE.match(short_id)
+        if not match:
+            return None
+        prefix, ext = match.groups()
+        directory = os.path.join(self.root, prefix[:2])
+        if not os.path.isdir(directory):
+            return None
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith(f".{ext}"):
+                return name
+        return None
+
+    def read(self, blob_id: str) -> Optional[bytes]:
+        path = self.path(blob_id)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def content_type(blob_id: str) -> str:
+        ext = blob_id.rsplit(".", 1)[-1]
+        return CONTENT_TYPES.get(ext, "application/octet-stream")
+
+    @staticmethod
+    def etag(blob_id: str) -> str:
+        # The content hash is a natural strong validator
+        return f'"{blob_id.split(".", 1)[0]}"'
+
+    def _signature(self, blob_id: str, expires: int) -> str:
+        msg = f"{blob_id}:{expires}".encode()
+        return hmac.new(self._secret, msg, hashlib.sha256).hexdigest()[:32]
+
+    def sign(self, blob_id: str, ttl: Optional[int] = None) -> Tuple[int, str]:
+        expires = int(time.time()) + (ttl or settings.MEDIA_URL_TTL)
+        return expires, self._signature(blob_id, expires)
+
+    def verify(self, blob_id: str, expires: int, sig: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(blob_id, expires), sig)
+
+    def signed_url(self, blob_id: str, ttl: Optional[int] = None) -> str:
+        """
+        Builds a short-lived link to the media endpoint.
+        """
+        expires, sig = self.sign(blob_id, ttl)
+        base = (settings.PUBLIC_API_URL or "").rstrip("/")
+        return f"{base}/api/media/{blob_id}?expires={expires}&sig={sig}"
+
+
+blob_store = BlobStore(settings.MEDIA_ROOT, settings.MEDIA_URL_SECRET)
@@ -1,24 +1,24 @@
 import logging
 import asyncio
-from google import genai
-from google.genai import types
 from config.settings import settings
+from services.limits import Overloaded, model_limiter
 
 logger = logging.getLogger(__name__)
 
 class VeoService:
     def __init__(self):
+        self.model_name = settings.MODELS["video"]
         # We now use the standard API key approach as suggested by the user
         self.api_key = settings.GEMINI_API_KEY # Or a dedicated VEO_API_KEY if we want to separate
         self.client = None
-        self.model_name = "veo-3.1-fast-generate-preview" # Confirmed working ID
         
         if self.api_key:
             try:
+                from google import genai
                 self.client = genai.Client(api_key=self.api_key)
                 logger.info("VeoService initialized with google-genai SDK.")
             except Exception as e:
-                logger.error(f"Failed to initialize google-genai client: {e}")
+                logger.error("Failed to initialize google-genai client: %s", e)
 
     async def generate_video(self, prompt: str) -> bytes:
         """
@@ -30,27 +30,34 @@ class VeoService:
             return None
 
         try:
-            logger.info(f"Generating video for prompt: {prompt}")
+            logger.info("Generating video with %s", self.model_name, extra={"prompt": prompt})
             
             # Start generation (Async operation)
             # We run it in a thread or hope the SDK's generate_videos is non-blocking 
             # (but usually it's better to use wrap for long operations)
             
-            operation = await asyncio.to_thread(
-                self.client.models.generate_videos,
-                model=self.model_name,
-                prompt=prompt,
-                config=types.GenerateVideosConfig(
-                    aspect_ratio="16:9",
+            from google.genai import types
+
+            # The slot is held for the whole operation, not just the submit call: running
+            # operations count against Veo's concurrency quota, and the limiter's latency
+            # estimate (used to reject requests that would wait too long) is then the real
+            # render time rather than the near-instant submit
+            async with model_limiter(self.model_name).acquire():
+                operation = await asyncio.to_thread(
+                    self.client.models.generate_videos,
+                    model=self.model_name,
+                    prompt=prompt,
+                    config=types.GenerateVideosConfig(
+                        aspect_ratio="16:9",
+                    )
                 )
-            )
-            
-            logger.info(f"Veo operation started: {operation.name}")
-            
-            # Polling for result
-            while not operation.done:
-                await asyncio.sleep(10)
-                operation = await asyncio.to_thread(self.client.operations.get, operation.name)
+                
+                logger.info("Veo operation started: %s", operation.name)
+                
+                # Polling for result
+                while not operation.done:
+                    await asyncio.sleep(10)
+                    operation = await asyncio.to_thread(self.client.operations.get, operation.name)
             
             if operation.result and operation.result.generated_videos:
                 video = operation.result.generated_videos[0]
@@ -61,8 +68,21 @@ class VeoService:
             logger.warning("Video generation finished but no bytes found.")
             return None
 
+        except asyncio.CancelledError:
+            # Caller went away: stop polling and free the slot. A thread already running
+            # an SDK call finishes on its own and its result is discarded.
+            logger.info("Veo generation cancelled by caller")
+            raise
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error in Veo generate_video: {e}")
+            logger.error("Error in Veo generate_video: %s", e)
             return None
 
-veo_service = VeoService()
+
+def __getattr__(name: str):
+    # veo_service is built on first use by the service container (services/container.py)
+    if name == "veo_service":
+        from services.container import container
+        return container.get("veo")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,8 @@
 import os
 import logging
-import vertexai
-from vertexai.vision_models import ImageGenerationModel
+from typing import List
 from config.settings import settings
+from services.limits import Overloaded, is_quota_error, model_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -11,16 +11,17 @@ class VertexImageService:
         self.project_id = settings.VERTEX_PROJECT_ID
         self.location = settings.VERTEX_LOCATION
         self.key_file = settings.VERTEX_CREDENTIALS_PATH
-        self.model_name = settings.MODELS.get("image", "imagen-3.0-generate-001")
+        self.model_name = settings.MODELS.get("imagen", "imagen-3.0-generate-001")
         
         self._setup_credentials()
         self._init_vertexai()
         
         try:
+            from vertexai.vision_models import ImageGenerationModel
             self.model = ImageGenerationModel.from_pretrained(self.model_name)
-            logger.info(f"Vertex Image model {self.model_name} initialized.")
+            logger.info("Vertex Image model %s initialized.", self.model_name)
         except Exception as e:
-            logger.error(f"Failed to initialize Vertex Image model: {e}")
+            logger.error("Failed to initialize Vertex Image model: %s", e)
             self.model = None
 
     def _setup_credentials(self):
@@ -28,28 +29,38 @@ class VertexImageService:
         if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ:
             if os.path.exists(self.key_file):
                 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self.key_file
-                logger.info(f"Set GOOGLE_APPLICATION_CREDENTIALS to {self.key_file}")
+                logger.info("Set GOOGLE_APPLICATION_CREDENTIALS to %s", self.key_file)
             else:
-                logger.warning(f"Key file {self.key_file} not found and GOOGLE_APPLICATION_CREDENTIALS not set.")
+                logger.warning("Key file %s not found and GOOGLE_APPLICATION_CREDENTIALS not set.", self.key_file)
 
     def _init_vertexai(self):
         """Initializes Vertex AI."""
         try:
+            import vertexai
             vertexai.init(project=self.project_id, location=self.location)
         except Exception as e:
-            logger.error(f"Failed to init vertexai: {e}")
+            logger.error("Failed to init vertexai: %s", e)
 
     async def generate_image(self, prompt: str, aspect_ratio: str = "1:1") -> bytes:
         """
         Generates an image from a text prompt.
         Returns the image bytes.
         """
+        images = await self.generate_images(prompt, aspect_ratio=aspect_ratio, n=1)
+        return images[0] if images else None
+
+    async def generate_images(self, prompt: str, aspect_ratio: str = "1:1", n: int = 1) -> List[bytes]:
+        """
+        Generates `n` variants in a single Imagen call.
+        Returns the image bytes of every variant that passed the safety filter.
+        Quota errors (429) are raised, so the image router can fail over.
+        """
         if not self.model:
             logger.error("Vertex Image model is not initialized.")
-            return None
+            return []
 
         try:
-            logger.info(f"Generating image for prompt: {prompt} with AR: {aspect_ratio}")
+            logger.info("Generating %s image(s) with AR %s", n, aspect_ratio, extra={"prompt": prompt})
             
             # Run blocking generation in thread executor if needed, but SDK might be sync.
             # ImageGenerationModel.generate_images is synchronous.
@@ -59,24 +70,35 @@ class VertexImageService:
             # Vertex AI Imagen supports: "1:1", "16:9", "9:16", "3:4", "4:3"
             # Our UI sends: "1:1", "16:9", "9:16", "4:3". All compatible.
             
-            response = await asyncio.to_thread(
-                self.model.generate_images,
-                prompt=prompt,
-                number_of_images=1,
-                aspect_ratio=aspect_ratio,
-                safety_filter_level="block_some",
-                person_generation="allow_adult"
-            )
+            async with model_limiter(self.model_name).acquire():
+                response = await asyncio.to_thread(
+                    self.model.generate_images,
+                    prompt=prompt,
+                    number_of_images=n,
+                    aspect_ratio=aspect_ratio,
+                    safety_filter_level="block_some",
+                    person_generation="allow_adult"
+                )
             
             if response and response.images:
-                # Get the first image
-                return response.images[0]._image_bytes
+                return [image._image_bytes for image in response.images]
             else:
                 logger.warning("No images returned from Vertex AI.")
-                return None
+                return []
             
+        except Overloaded:
+            raise
         except Exception as e:
-            logger.error(f"Error generating image: {e}")
-            return None
+            if is_quota_error(e):
+                # The image router cools this backend down and fails over
+                raise
+            logger.error("Error generating image: %s", e)
+            return []
+
 
-vertex_image_service = VertexImageService()
+def __getattr__(name: str):
+    # vertex_image_service is built on first use by the service container (services/container.py)
+    if name == "vertex_image_service":
+        from services.container import container
+        return container.get("vertex_image")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
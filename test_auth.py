@@ -0,0 +1,87 @@
+"""
+InitDataVerifier: hash check, expiry, tampered fields and the verification cache.
+
+    python -m pytest test_auth.py
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:auth-test")
+
+from api.auth import InitDataVerifier
+
+BOT_TOKEN = "123456:auth-test-token"
+USER = {"id": 42, "first_name": "Ann"}
+
+
+def _init_data(fields: dict, bot_token: str = BOT_TOKEN) -> str:
+    """
+    Signs `fields` the way Telegram does and returns the query string.
+    """
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    signature = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": signature})
+
+
+def _fields(auth_date: float) -> dict:
+    return {"auth_date": str(int(auth_date)), "query_id": "AAE1", "user": json.dumps(USER)}
+
+
+def _verifier(max_age: int = 3600) -> InitDataVerifier:
+    return InitDataVerifier(BOT_TOKEN, max_age=max_age, cache_size=2, cache_ttl=300)
+
+
+def test_valid_init_data_is_verified_and_cached():
+    verifier = _verifier()
+    init_data = _init_data(_fields(time.time()))
+
+    user = verifier.verify(init_data)
+    assert user == USER
+    # The second call is served from the cache
+    assert verifier.verify(init_data) is user
+    assert len(verifier._cache) == 1
+
+    # Bounded: the least recently used entry is dropped
+    for offset in (1, 2):
+        assert verifier.verify(_init_data(_fields(time.time() - offset))) == USER
+    assert len(verifier._cache) == 2
+
+
+def test_tampered_or_foreign_init_data_is_rejected():
+    verifier = _verifier()
+    fields = _fields(time.time())
+    init_data = _init_data(fields)
+
+    tampered = init_data.replace("%22id%22%3A+42", "%22id%22%3A+43")
+    assert tampered != init_data
+    assert verifier.verify(tampered) is None
+    assert verifier.verify(init_data.replace("query_id=AAE1", "query_id=AAE2")) is None
+    assert verifier.verify(urlencode(fields)) is None
+    assert verifier.verify(_init_data(fields, bot_token="654321:other-bot")) is None
+    assert verifier.verify("") is None
+    assert InitDataVerifier("", max_age=0, cache_size=2, cache_ttl=300).verify(init_data) is None
+    assert not verifier._cache
+
+
+def test_expired_init_data_is_rejected():
+    verifier = _verifier(max_age=60)
+    assert verifier.verify(_init_data(_fields(time.time() - 120))) is None
+
+    # Fresh data is cached no longer than it stays valid
+    auth_date = int(time.time()) - 30
+    assert verifier.verify(_init_data(_fields(auth_date))) == USER
+    (expires_at, _), = verifier._cache.values()
+    assert expires_at <= auth_date + 60
+
+
+if __name__ == "__main__":
+    test_valid_init_data_is_verified_and_cached()
+    test_tampered_or_foreign_init_data_is_rejected()
+    test_expired_init_data_is_rejected()
+    print("✅ InitDataVerifier")
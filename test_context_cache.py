@@ -0,0 +1,101 @@
+"""
+ContextCache with the local FakeCacheProvider: creation on first use, reuse,
+refresh and expiry, and the minimum-size fallback.
+
+    python -m pytest test_context_cache.py
+"""
+import asyncio
+import os
+import time
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:context-cache-test")
+
+from config.settings import settings
+from services.context_cache import ContextCache, FakeCacheProvider, estimate_tokens
+from services.routing import route
+
+MODEL = "test-model"
+INSTRUCTION = "You are a helpful assistant."
+# A session summary prefix well above the minimum size
+LONG_PREFIX = [
+    {"role": "user", "parts": ["Summary of our earlier conversation:\n" + "details " * 800]},
+    {"role": "model", "parts": ["Understood."]},
+]
+
+
+def _cache(ttl: int = 3600, min_tokens: int = 1024):
+    provider = FakeCacheProvider()
+    return provider, ContextCache(provider, ttl=ttl, min_tokens=min_tokens)
+
+
+def test_created_on_first_use_then_reused():
+    async def scenario():
+        provider, cache = _cache()
+        first = await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX)
+        assert first is not None
+        assert first.content.contents == LONG_PREFIX
+        second = await cache.get("chat:2", MODEL, INSTRUCTION, LONG_PREFIX)
+        assert second is first
+        assert len(provider.created) == 1
+
+    asyncio.run(scenario())
+
+
+def test_refreshed_near_expiry_and_recreated_after_it():
+    async def scenario():
+        provider, cache = _cache(ttl=600)
+        handle = await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX)
+
+        handle.expires_at = time.time() + 10  # inside the refresh margin
+        assert await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX) is handle
+        assert provider.refreshed == [handle.name]
+
+        handle.expires_at = time.time() - 1  # expired upstream
+        renewed = await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX)
+        assert renewed is not handle
+        assert len(provider.created) == 2
+
+    asyncio.run(scenario())
+
+
+def test_new_prefix_in_a_slot_deletes_the_old_cache():
+    async def scenario():
+        provider, cache = _cache()
+        old = await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX)
+        await cache.get("chat:1", MODEL, INSTRUCTION, LONG_PREFIX + [{"role": "user", "parts": ["more"]}])
+        assert provider.deleted == [old.name]
+
+    asyncio.run(scenario())
+
+
+def test_small_prefixes_fall_back_to_uncached_calls():
+    async def scenario():
+        provider, cache = _cache(min_tokens=1024)
+        assert await cache.get("enhance", MODEL, INSTRUCTION, [{"role": "user", "parts": ["hi"]}]) is None
+        assert provider.created == []
+
+    asyncio.run(scenario())
+
+
+def test_persona_alone_is_below_the_minimum():
+    # Only long session prefixes are cached: the persona by itself is too small
+    # for upstream caching, so first turns are sent uncached
+    chat = route("chat")
+    assert estimate_tokens(chat.system_instruction) < settings.CONTEXT_CACHE_MIN_TOKENS
+
+    async def scenario():
+        provider, cache = _cache(min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS)
+        assert await cache.get("chat", chat.model, chat.system_instruction) is None
+        assert provider.created == []
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_created_on_first_use_then_reused()
+    test_refreshed_near_expiry_and_recreated_after_it()
+    test_new_prefix_in_a_slot_deletes_the_old_cache()
+    test_small_prefixes_fall_back_to_uncached_calls()
+    test_persona_alone_is_below_the_minimum()
+    print("✅ ContextCache")
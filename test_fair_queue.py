@@ -0,0 +1,112 @@
+"""
+FairScheduler: start-tag ordering across users, queue positions and cancellation.
+
+    python -m pytest test_fair_queue.py
+"""
+import asyncio
+import os
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:fair-queue-test")
+
+from services.fair_queue import FairScheduler
+
+
+async def _job(scheduler: FairScheduler, user_id: int, name: str, order: list, positions: dict):
+    async def on_queued(position: int):
+        positions[name] = position
+
+    async with scheduler.slot(user_id, on_queued=on_queued):
+        order.append(name)
+        await asyncio.sleep(0)
+
+
+def test_jobs_interleave_by_start_tag():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1, per_user=10)
+        order, positions = [], {}
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        # User 1 queues a burst first; user 2 arrives afterwards and still isn't starved
+        tasks = [asyncio.create_task(_job(scheduler, 1, f"a{i}", order, positions)) for i in range(3)]
+        tasks += [asyncio.create_task(_job(scheduler, 2, f"b{i}", order, positions)) for i in range(2)]
+        await asyncio.sleep(0)
+
+        # Positions as reported when each job queued: b0 (tag 0) goes ahead of the whole burst
+        assert positions == {"a0": 1, "a1": 2, "a2": 3, "b0": 1, "b1": 3}
+        release.set()
+        await asyncio.gather(running, *tasks)
+        assert order == ["b0", "a0", "b1", "a1", "a2"]
+
+    asyncio.run(scenario())
+
+
+def test_per_user_cap():
+    async def scenario():
+        scheduler = FairScheduler(capacity=3, per_user=1)
+        order, positions = [], {}
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        # A free slot exists, but user 1 is at their cap; user 2 starts right away
+        queued = asyncio.create_task(_job(scheduler, 1, "a", order, positions))
+        other = asyncio.create_task(_job(scheduler, 2, "b", order, positions))
+        await asyncio.sleep(0.01)
+        assert order == ["b"]
+        assert "a" in positions
+
+        release.set()
+        await asyncio.gather(running, queued, other)
+        assert order == ["b", "a"]
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1, per_user=10)
+        order, positions = [], {}
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        running = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(_job(scheduler, 2, "cancelled", order, positions))
+        waiting = asyncio.create_task(_job(scheduler, 3, "waiting", order, positions))
+        await asyncio.sleep(0)
+        assert positions == {"cancelled": 1, "waiting": 2}
+
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert len(scheduler._waiting) == 1
+
+        release.set()
+        await asyncio.gather(running, waiting)
+        assert order == ["waiting"]
+        # Every slot was returned and the idle scheduler reset its virtual time
+        assert scheduler._running_total == 0
+        assert not scheduler._running and not scheduler._waiting
+        assert scheduler._virtual_time == 0.0
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_jobs_interleave_by_start_tag()
+    test_per_user_cap()
+    test_cancelled_waiter_leaves_the_queue()
+    print("✅ FairScheduler")
@@ -0,0 +1,76 @@
+"""
+ImageRouter failover: quota errors cool a backend down on the first 429.
+
+    python -m pytest test_image_router.py
+"""
+import asyncio
+import os
+from typing import List, Optional
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:image-router-test")
+
+from services.image_router import ImageBackend, ImageRequest, ImageRouter
+
+
+class ResourceExhausted(Exception):
+    code = 429
+
+
+class FakeBackend(ImageBackend):
+    aspect_ratios = ("1:1",)
+
+    def __init__(self, name: str, error: Optional[Exception] = None, images: Optional[List[bytes]] = None):
+        self.name = name
+        self.error = error
+        self.images = [b"image"] if images is None else images
+        self.calls = 0
+
+    @property
+    def model(self) -> str:
+        return f"fake-{self.name}"
+
+    async def generate(self, request):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.images
+
+
+def test_quota_error_fails_over_and_cools_down():
+    async def scenario():
+        limited = FakeBackend("limited", error=ResourceExhausted("429 RESOURCE_EXHAUSTED"))
+        healthy = FakeBackend("healthy")
+        router = ImageRouter([limited, healthy], explore=0.0, cooldown=60.0)
+
+        result = await router.generate(ImageRequest("a cat"))
+        assert result.backend == "healthy"
+        assert limited.calls == 1
+        assert not router.stats["limited"].healthy()
+
+        # Cooling down: the next request goes straight to the healthy backend
+        result = await router.generate(ImageRequest("a cat"))
+        assert result.backend == "healthy"
+        assert limited.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_empty_results_cool_down_after_threshold():
+    async def scenario():
+        flaky = FakeBackend("flaky", images=[])
+        router = ImageRouter([flaky], explore=0.0, cooldown=60.0, failure_threshold=3)
+
+        for attempt in range(3):
+            assert router.stats["flaky"].healthy(), f"cooled down after {attempt} failures"
+            result = await router.generate(ImageRequest("a cat"))
+            assert result.images == []
+        assert not router.stats["flaky"].healthy()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_quota_error_fails_over_and_cools_down()
+    test_empty_results_cool_down_after_threshold()
+    print("✅ ImageRouter")
@@ -0,0 +1,82 @@
+"""
+Import-time budget for the process entry points.
+
+Each entry module is imported in a fresh interpreter; it must not load provider
+SDKs, which are built lazily by services/container.py. Timing is compared with
+a bare `import aiogram` measured the same way, so the budgets hold on slow
+machines as well as fast ones.
+
+    python test_import_time.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Multiples of the `import aiogram` baseline: room for our own modules and
+# FastAPI/SQLAlchemy, far below what an eager SDK import costs
+BASELINE_MODULE = "aiogram"
+BUDGETS = {
+    "bot.dispatcher": 2.0,
+    "api.main": 3.5,
+}
+
+# Must only be imported on first use / during background warm-up
+HEAVY_MODULES = ("google.generativeai", "google.genai", "vertexai", "numpy", "PIL.Image")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    env = dict(os.environ)
+    # Settings require a token; the value is irrelevant for importing
+    env.setdefault("BOT_TOKEN", "123456:import-time-probe")
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_budget():
+    baseline = measure(BASELINE_MODULE)["elapsed"]
+    for module, factor in BUDGETS.items():
+        stats = measure(module)
+        assert not stats["loaded"], f"{module} imports provider SDKs eagerly: {stats['loaded']}"
+        assert stats["elapsed"] <= baseline * factor, (
+            f"{module} took {stats['elapsed']:.2f}s, budget {factor}x {BASELINE_MODULE} ({baseline * factor:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    failed = False
+    try:
+        baseline = measure(BASELINE_MODULE)["elapsed"]
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"import {BASELINE_MODULE}: {baseline:.2f}s")
+    for module, factor in BUDGETS.items():
+        try:
+            stats = measure(module)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            failed = True
+            continue
+        ok = not stats["loaded"] and stats["elapsed"] <= baseline * factor
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {module}: {stats['elapsed']:.2f}s (budget {factor}x = {baseline * factor:.2f}s)"
+              + (f", eager imports: {', '.join(stats['loaded'])}" if stats["loaded"] else ""))
+    sys.exit(1 if failed else 0)
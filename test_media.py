@@ -0,0 +1,105 @@
+"""
+Media endpoint: Range parsing, If-Range, 416 and signed-URL verification.
+
+    python -m pytest test_media.py
+"""
+import os
+import tempfile
+import time
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:media-test")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routers import media
+from services.storage import BlobStore
+
+DATA = bytes(range(256)) * 4  # 1024 bytes
+
+
+def test_parse_range():
+    assert media.parse_range("bytes=0-99", 1024) == (0, 99)
+    assert media.parse_range("bytes=1000-", 1024) == (1000, 1023)
+    # The end is clamped to the file, suffix ranges count from the end
+    assert media.parse_range("bytes=1000-5000", 1024) == (1000, 1023)
+    assert media.parse_range("bytes=-100", 1024) == (924, 1023)
+    assert media.parse_range("bytes=-5000", 1024) == (0, 1023)
+    # Ignored: multiple ranges and foreign units
+    assert media.parse_range("bytes=0-1,5-6", 1024) is None
+    assert media.parse_range("items=0-1", 1024) is None
+
+    for header in ("bytes=1024-", "bytes=5-1", "bytes=-0", "bytes=a-b", "bytes=-"):
+        try:
+            media.parse_range(header, 1024)
+        except ValueError:
+            continue
+        raise AssertionError(f"{header} should not be satisfiable")
+
+
+def test_signed_url_verification():
+    store = BlobStore(tempfile.mkdtemp(), secret="media-test")
+    blob_id = store.put_sync(DATA, "png")
+
+    expires, sig = store.sign(blob_id, ttl=60)
+    assert store.verify(blob_id, expires, sig)
+    # Tampered id, expiry or signature, and links signed with another secret
+    assert not store.verify(blob_id.replace(".png", ".jpg"), expires, sig)
+    assert not store.verify(blob_id, expires + 1, sig)
+    assert not store.verify(blob_id, expires, "0" * len(sig))
+    assert not BlobStore(store.root, secret="other").verify(blob_id, expires, sig)
+
+    expires, sig = store.sign(blob_id, ttl=-1)
+    assert expires < time.time()
+    assert not store.verify(blob_id, expires, sig)
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(media.router, prefix="/api/media")
+    return TestClient(app)
+
+
+def test_range_if_range_and_416():
+    store = BlobStore(tempfile.mkdtemp(), secret="media-test")
+    blob_id = store.put_sync(DATA, "png")
+    expires, sig = store.sign(blob_id, ttl=60)
+    url = f"/api/media/{blob_id}?expires={expires}&sig={sig}"
+    etag = store.etag(blob_id)
+
+    blob_store = media.blob_store
+    media.blob_store = store
+    try:
+        client = _client()
+
+        response = client.get(url, headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == "bytes 100-199/1024"
+        assert response.content == DATA[100:200]
+
+        # If-Range with the current ETag honours the range, a stale one gets the full body
+        response = client.get(url, headers={"Range": "bytes=100-199", "If-Range": etag})
+        assert response.status_code == 206
+        response = client.get(url, headers={"Range": "bytes=100-199", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.content == DATA
+
+        response = client.get(url, headers={"Range": "bytes=2048-"})
+        assert response.status_code == 416
+        assert response.headers["Content-Range"] == "bytes */1024"
+
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        response = client.get(f"/api/media/{blob_id}?expires={expires}&sig={'0' * len(sig)}")
+        assert response.status_code == 403
+    finally:
+        media.blob_store = blob_store
+
+
+if __name__ == "__main__":
+    test_parse_range()
+    test_signed_url_verification()
+    test_range_if_range_and_416()
+    print("✅ Media endpoint")
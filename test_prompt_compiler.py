@@ -0,0 +1,57 @@
+"""
+PromptCompiler: UI_CONFIG coverage is validated up front; selections compile
+to an English prompt in template order without a model call.
+
+    python -m pytest test_prompt_compiler.py
+"""
+from services.prompt_compiler import PromptCompiler, auto_translate, prompt_compiler
+
+
+def test_auto_translate():
+    assert auto_translate("Рассвет (Dawn)") == "Dawn"
+    assert auto_translate("Teal & Orange (Кино-блокбастер)") == "Teal & Orange"
+    assert auto_translate("Soft light") == "Soft light"
+    assert auto_translate("Фотореализм") is None
+    assert auto_translate("Синий (Голубой)") is None
+
+
+def test_compiles_selections_in_template_order():
+    compiled = prompt_compiler.compile({
+        "style": "Киберпанк",
+        "subject": "Кот в костюме",
+        "time_of_day": "Закат (Sunset)",
+        "negative_prompt": ["Без текста (Убрать водяные знаки, подписи, логотипы)"],
+    })
+    assert compiled.prompt == "a cat wearing a suit, at sunset, cyberpunk style, high quality, highly detailed"
+    assert compiled.negative_prompt == "text, watermark, signature, logo"
+    assert compiled.text() == f"{compiled.prompt}. Avoid: {compiled.negative_prompt}"
+    assert compiled.untranslated == []
+
+
+def test_typed_values_pass_through():
+    compiled = prompt_compiler.compile({"subject": "a red fox", "environment": "в лесу", "lighting": ""})
+    assert compiled.prompt == "a red fox, в лесу, high quality, highly detailed"
+    assert compiled.untranslated == ["в лесу"]
+    assert compiled.text() == compiled.prompt
+
+
+def test_uncovered_ui_config_is_rejected():
+    ui_config = {"blocks": [{"fields": [
+        {"id": "subject", "options": ["Кот в костюме", "Неизвестный вариант"]},
+        {"id": "mood", "options": ["Calm"]},
+    ]}]}
+    try:
+        PromptCompiler(ui_config)
+    except ValueError as e:
+        assert "subject: no translation for 'Неизвестный вариант'" in str(e)
+        assert "mood: no template" in str(e)
+    else:
+        raise AssertionError("An uncovered UI_CONFIG must fail validation")
+
+
+if __name__ == "__main__":
+    test_auto_translate()
+    test_compiles_selections_in_template_order()
+    test_typed_values_pass_through()
+    test_uncovered_ui_config_is_rejected()
+    print("✅ PromptCompiler")
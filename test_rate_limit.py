@@ -0,0 +1,83 @@
+"""
+RateLimiter: rule parsing and matching, local buckets, and the fallback to
+them when Redis fails.
+
+    python -m pytest test_rate_limit.py
+"""
+import asyncio
+import os
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:rate-limit-test")
+
+from services.rate_limit import RateLimiter, client_key, parse_rules
+
+RULES = {
+    "/api": {"rate": 10, "burst": 20},
+    "POST /api/generate": {"rate": 0.5, "burst": 2},
+    "/api/generate/status": {"rate": 5, "burst": 10},
+}
+
+
+def test_parse_rules_and_match():
+    rules = parse_rules(RULES)
+    assert [rule.name for rule in rules] == ["* /api/generate/status", "POST /api/generate", "* /api"]
+    assert (rules[1].rate, rules[1].burst) == (0.5, 2.0)
+
+    limiter = RateLimiter(rules, backend="memory", redis_timeout=0.05)
+    # Longest prefix first; method-specific rules only match their method
+    assert limiter.match("GET", "/api/generate/status/abc").name == "* /api/generate/status"
+    assert limiter.match("POST", "/api/generate/image").name == "POST /api/generate"
+    assert limiter.match("GET", "/api/generate/image").name == "* /api"
+    assert limiter.match("GET", "/health") is None
+
+
+def test_local_buckets_limit_per_client():
+    async def scenario():
+        limiter = RateLimiter(parse_rules(RULES), backend="memory", redis_timeout=0.05)
+        rule = limiter.match("POST", "/api/generate/image")
+
+        assert await limiter.hit(rule, "u1") == 0
+        assert await limiter.hit(rule, "u1") == 0
+        # Burst spent: the wait is about one token at 0.5/s
+        wait = await limiter.hit(rule, "u1")
+        assert 1.5 < wait <= 2.0
+        # Other clients have their own bucket
+        assert await limiter.hit(rule, "u2") == 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_failure_falls_back_to_local_buckets():
+    async def scenario():
+        calls = []
+
+        async def failing_script(keys, args):
+            calls.append(keys[0])
+            raise ConnectionError("Redis is down")
+
+        limiter = RateLimiter(parse_rules(RULES), backend="redis", redis_timeout=0.05, redis_backoff=60)
+        limiter._script = failing_script
+        rule = limiter.match("POST", "/api/generate/image")
+
+        assert await limiter.hit(rule, "u1") == 0
+        assert await limiter.hit(rule, "u1") == 0
+        assert await limiter.hit(rule, "u1") > 0
+        # Redis is not retried until the backoff has passed
+        assert calls == ["rm:rl:POST /api/generate:u1"]
+
+    asyncio.run(scenario())
+
+
+def test_client_key():
+    assert client_key({"id": 42}, "10.0.0.1") == "u42"
+    assert client_key(None, "10.0.0.1") == "ip10.0.0.1"
+    assert client_key({}, None) == "ipunknown"
+
+
+if __name__ == "__main__":
+    test_parse_rules_and_match()
+    test_local_buckets_limit_per_client()
+    test_redis_failure_falls_back_to_local_buckets()
+    test_client_key()
+    print("✅ RateLimiter")
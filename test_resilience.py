@@ -0,0 +1,92 @@
+"""
+ResilientCaller / CircuitBreaker: what opens, closes and frees the circuit.
+
+    python -m pytest test_resilience.py
+"""
+import asyncio
+import os
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:resilience-test")
+
+from services.limits import Overloaded
+from services.resilience import CircuitBreaker, CircuitOpen, ResilientCaller
+
+
+def _caller(threshold: int = 1, reset_timeout: float = 0.0) -> ResilientCaller:
+    caller = ResilientCaller("test-model")
+    caller.breaker = CircuitBreaker("test-model", threshold, reset_timeout)
+    return caller
+
+
+async def _ok():
+    return "ok"
+
+
+async def _unavailable():
+    raise ConnectionError("upstream down")
+
+
+async def _invalid():
+    raise ValueError("invalid argument")
+
+
+async def _overloaded():
+    raise Overloaded("test-model", 1)
+
+
+async def _expect(caller: ResilientCaller, call, error: type):
+    try:
+        await caller.call(call, deadline=5, retries=0)
+    except error:
+        return
+    raise AssertionError(f"expected {error.__name__}")
+
+
+def test_retryable_failures_open_the_circuit():
+    async def scenario():
+        caller = _caller(threshold=1, reset_timeout=60.0)
+        await _expect(caller, _unavailable, ConnectionError)
+        assert caller.breaker.opened_at is not None
+        # Fast-fail while open; CircuitOpen is an Overloaded, so it maps to 503 / "try later"
+        await _expect(caller, _ok, CircuitOpen)
+        assert issubclass(CircuitOpen, Overloaded)
+
+    asyncio.run(scenario())
+
+
+def test_non_retryable_errors_are_neutral():
+    async def scenario():
+        caller = _caller(threshold=2)
+        await _expect(caller, _unavailable, ConnectionError)
+        assert caller.breaker.failures == 1
+        # A bug or a rejected argument neither resets nor adds to the failure streak
+        await _expect(caller, _invalid, ValueError)
+        assert caller.breaker.failures == 1
+        await _expect(caller, _unavailable, ConnectionError)
+        assert caller.breaker.opened_at is not None
+
+    asyncio.run(scenario())
+
+
+def test_inconclusive_probe_frees_the_slot():
+    async def scenario():
+        caller = _caller(threshold=1, reset_timeout=0.0)
+        await _expect(caller, _unavailable, ConnectionError)
+
+        # Half-open probes that prove nothing must not leave the circuit stuck
+        await _expect(caller, _overloaded, Overloaded)
+        await _expect(caller, _invalid, ValueError)
+        assert not caller.breaker._probing
+
+        assert await caller.call(_ok, deadline=5, retries=0) == "ok"
+        assert caller.breaker.opened_at is None
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_retryable_failures_open_the_circuit()
+    test_non_retryable_errors_are_neutral()
+    test_inconclusive_probe_frees_the_slot()
+    print("✅ ResilientCaller")
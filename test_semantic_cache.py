@@ -0,0 +1,101 @@
+"""
+SemanticCache: answers are served only after distinct users confirm them;
+the least recently used entry is evicted when the index is full.
+
+    python -m pytest test_semantic_cache.py
+"""
+import asyncio
+import os
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:semantic-cache-test")
+
+from services.container import container
+from services.semantic_cache import SemanticCache
+
+VECTORS = {
+    "how do I pay?": [1.0, 0.0, 0.0],
+    "how can I pay?": [0.99, 0.1, 0.0],
+    "what can you draw?": [0.0, 1.0, 0.0],
+    "do you make videos?": [0.0, 0.0, 1.0],
+}
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        return [VECTORS[text] for text in texts]
+
+
+def _run(scenario):
+    embedder = FakeEmbedder()
+    previous = container._instances.get("gemini")
+    container._instances["gemini"] = embedder
+    try:
+        asyncio.run(scenario(embedder))
+    finally:
+        if previous is None:
+            container._instances.pop("gemini", None)
+        else:
+            container._instances["gemini"] = previous
+
+
+def _cache(capacity: int = 10, min_confirmations: int = 2) -> SemanticCache:
+    return SemanticCache(capacity, threshold=0.95, min_confirmations=min_confirmations, path=None, fingerprint="test")
+
+
+def test_answer_is_served_after_distinct_users_confirm_it():
+    async def scenario(embedder):
+        cache = _cache(min_confirmations=2)
+
+        match = await cache.lookup("how do I pay?", user_id=1)
+        assert match.answer is None and match.row == -1
+        await cache.remember(match, "Use /buy", user_id=1)
+
+        # The same user asking again does not confirm their own answer
+        match = await cache.lookup("how can I pay?", user_id=1)
+        assert match.answer is None and match.row == 0
+        # A near-duplicate miss is not stored a second time
+        await cache.remember(match, "Another answer", user_id=1)
+        assert cache.index.size == 1
+
+        match = await cache.lookup("how can I pay?", user_id=2)
+        assert match.answer == "Use /buy"
+        assert cache.stats()["confirmed"] == 1
+
+        # Unrelated questions stay misses
+        match = await cache.lookup("what can you draw?", user_id=3)
+        assert match.answer is None and match.row == -1
+        assert embedder.calls == 4
+
+    _run(scenario)
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario(embedder):
+        cache = _cache(capacity=2, min_confirmations=1)
+
+        for question in ("how do I pay?", "what can you draw?"):
+            await cache.remember(await cache.lookup(question, user_id=1), f"answer: {question}", user_id=1)
+            await asyncio.sleep(0.01)
+
+        # A hit refreshes "how do I pay?", so "what can you draw?" is the oldest
+        assert (await cache.lookup("how do I pay?", user_id=2)).answer == "answer: how do I pay?"
+        await asyncio.sleep(0.01)
+        await cache.remember(await cache.lookup("do you make videos?", user_id=1), "answer: videos", user_id=1)
+
+        assert cache.index.size == 2
+        assert sorted(cache.index.questions) == ["do you make videos?", "how do I pay?"]
+        assert (await cache.lookup("what can you draw?", user_id=2)).answer is None
+        assert (await cache.lookup("do you make videos?", user_id=2)).answer == "answer: videos"
+
+    _run(scenario)
+
+
+if __name__ == "__main__":
+    test_answer_is_served_after_distinct_users_confirm_it()
+    test_least_recently_used_entry_is_evicted()
+    print("✅ SemanticCache")
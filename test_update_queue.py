@@ -0,0 +1,114 @@
+"""
+MemoryUpdateQueue: per-chat ordering and exclusive shard ownership;
+ShardWorker: no acks once the shard is released.
+
+    python -m pytest test_update_queue.py
+"""
+import asyncio
+import os
+
+# Settings require a token; the value is irrelevant here
+os.environ.setdefault("BOT_TOKEN", "123456:update-queue-test")
+
+from bot.update_queue import MemoryUpdateQueue
+from bot.worker import ShardWorker
+from config.settings import settings
+
+
+def _message(update_id: int, chat_id: int) -> dict:
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}}}
+
+
+async def _drain(queue: MemoryUpdateQueue, shard: int) -> list:
+    updates = []
+    while True:
+        item = await queue.get(shard, timeout=0.01)
+        if item is None:
+            return updates
+        updates.append(item[0])
+
+
+def test_per_chat_order_is_kept():
+    async def scenario():
+        queue = MemoryUpdateQueue(shards=3)
+        chats = (101, -202, 303, 404)
+        for update_id in range(40):
+            await queue.publish(_message(update_id, chats[update_id % len(chats)]))
+
+        received = {}
+        for shard in range(queue.shards):
+            for update in await _drain(queue, shard):
+                chat_id = update["message"]["chat"]["id"]
+                assert queue.shard_for(update) == shard
+                received.setdefault(chat_id, []).append(update["update_id"])
+
+        for index, chat_id in enumerate(chats):
+            assert received[chat_id] == list(range(index, 40, len(chats)))
+
+    asyncio.run(scenario())
+
+
+def test_shard_is_owned_by_one_worker():
+    async def scenario():
+        queue = MemoryUpdateQueue(shards=2)
+        assert await queue.acquire(0)
+        assert not await queue.acquire(0)
+        assert await queue.acquire(1)
+        await queue.release(0)
+        assert await queue.acquire(0)
+
+    asyncio.run(scenario())
+
+
+class _LeaseLostQueue(MemoryUpdateQueue):
+    """
+    Records acks and releases; the lease is lost on the first renewal.
+    """
+
+    def __init__(self, shards: int):
+        super().__init__(shards)
+        self.events = []
+
+    async def get(self, shard: int, timeout: float = 5.0):
+        item = await super().get(shard, timeout)
+        return (item[0], item[0]["update_id"]) if item else None
+
+    async def ack(self, shard, receipt):
+        self.events.append(("ack", receipt))
+
+    async def renew(self, shard: int) -> bool:
+        return False
+
+    async def release(self, shard: int):
+        self.events.append(("release", shard))
+        await super().release(shard)
+
+
+class _SlowDispatcher:
+    async def feed_raw_update(self, bot, update: dict):
+        await asyncio.sleep(0 if update["update_id"] == 1 else 60)
+
+
+def test_lost_lease_stops_lanes_before_release():
+    async def scenario():
+        queue = _LeaseLostQueue(shards=1)
+        await queue.publish(_message(1, 101))
+        await queue.publish(_message(2, 202))
+        worker = ShardWorker(None, _SlowDispatcher(), queue, 0)
+        await asyncio.wait_for(worker.run(), timeout=5)
+        # The slow update is cancelled unacknowledged, and nothing is acked after release
+        assert queue.events == [("ack", 1), ("release", 0)]
+
+    lease_ttl = settings.WORKER_LEASE_TTL
+    settings.WORKER_LEASE_TTL = 0.3  # first renewal after 0.1s
+    try:
+        asyncio.run(scenario())
+    finally:
+        settings.WORKER_LEASE_TTL = lease_ttl
+
+
+if __name__ == "__main__":
+    test_per_chat_order_is_kept()
+    test_shard_is_owned_by_one_worker()
+    test_lost_lease_stops_lanes_before_release()
+    print("✅ MemoryUpdateQueue")
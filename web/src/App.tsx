@@ -197,7 +197,20 @@ function App() {
             mainPrompt += `, high quality, ${resolution}`
 
             payload.prompt = mainPrompt
-            payload.params = { aspectRatio: formData['aspectRatio'] || '1:1', resolution: formData['resolution'] || '1K' }
+            // Raw selections: the bot compiles them into an English prompt locally
+            const fields: Record<string, string | string[]> = {}
+            config?.blocks.forEach((block: Block) => {
+                block.fields.forEach((field: Field) => {
+                    if (d[field.id]) fields[field.id] = d[field.id]
+                })
+            })
+
+            payload.params = {
+                aspectRatio: formData['aspectRatio'] || '1:1',
+                resolution: formData['resolution'] || '1K',
+                variants: Number(formData['variants'] || '1'),
+                fields
+            }
 
         } else if (type === 'video') {
             if (!videoPrompt.trim()) {
@@ -473,6 +486,19 @@ function App() {
                                         <option value="4K">4K (Ultra)</option>
                                     </select>
                                 </div>
+                                <div>
+                                    <label className="text-xs text-purple-300 font-bold ml-1 mb-1 block">Варианты</label>
+                                    <select
+                                        value={formData['variants'] || '1'}
+                                        onChange={(e) => handleInputChange('variants', e.target.value)}
+                                        className="w-full bg-black/30 border border-white/10 rounded-xl px-3 py-2 text-sm focus:outline-none focus:border-neon-purple/50"
+                                    >
+                                        <option value="1">1</option>
+                                        <option value="2">2</option>
+                                        <option value="3">3</option>
+                                        <option value="4">4</option>
+                                    </select>
+                                </div>
                             </div>
 
                             <button